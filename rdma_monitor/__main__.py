@@ -2,12 +2,53 @@
 
 Usage:
     python -m rdma_monitor [--config /path/to/config.yaml]
+    python -m rdma_monitor query performance --device mlx5_2/1 \\
+        --metric rp_cnp_handled --start 02:00 --end 03:00 [--step 60]
 """
 
 import argparse
+import csv
+import json
+import math
 import sys
+import time
+from datetime import datetime
 
+from rdma_monitor.exporters.snapshot_query import AGGREGATES, parse_time, query
 from rdma_monitor.monitor import RDMAMonitor
+from rdma_monitor.utils.config_loader import load_config
+
+
+def _query(args: argparse.Namespace) -> None:
+    """Print the series of a time-range query over stored snapshots."""
+    snapshot_dir = args.snapshot_dir
+    if snapshot_dir is None:
+        cfg = load_config(args.config)
+        snapshot_dir = cfg.get("general", {}).get("snapshot_dir", "./snapshots")
+    now = time.time()
+    try:
+        start = parse_time(args.start, now)
+        end = parse_time(args.end, now) if args.end else now
+    except ValueError as exc:
+        sys.exit(str(exc))
+
+    result = query(snapshot_dir, args.collector, start, end,
+                   devices=args.device, metrics=args.metric,
+                   step=args.step, agg=args.agg)
+
+    if args.format == "json":
+        json.dump(result.to_dict(), sys.stdout)
+        sys.stdout.write("\n")
+        return
+    keys = list(result.series)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["time"] + [f"{device}:{metric}" for device, metric in keys])
+    for i, ts in enumerate(result.timestamps):
+        row = [datetime.fromtimestamp(ts).isoformat(timespec="seconds")]
+        for key in keys:
+            value = result.series[key][i]
+            row.append("" if math.isnan(value) else f"{value:.15g}")
+        writer.writerow(row)
 
 
 def main() -> None:
@@ -21,8 +62,37 @@ def main() -> None:
         help="Path to YAML configuration file "
              "(default: auto-detect from standard locations)",
     )
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    q = commands.add_parser(
+        "query", help="Print per-port series from the stored snapshots",
+        description="Print per-port series of one collector between two times "
+                    "from the stored snapshots.",
+    )
+    q.add_argument("collector", help="Collector name, e.g. performance")
+    q.add_argument("-d", "--device", action="append",
+                   help="Port, e.g. mlx5_2/1 (repeatable; default: all)")
+    q.add_argument("-m", "--metric", action="append",
+                   help="Dotted metric path or its trailing part, e.g. "
+                        "counters.rp_cnp_handled or rp_cnp_handled "
+                        "(repeatable; default: all)")
+    q.add_argument("-s", "--start", default="-1h",
+                   help="Epoch, ISO time, HH:MM (today) or offset like -30m "
+                        "(default: -1h)")
+    q.add_argument("-e", "--end", default=None, help="Same formats (default: now)")
+    q.add_argument("--step", type=float, default=0,
+                   help="Downsample into buckets of this many seconds")
+    q.add_argument("--agg", choices=AGGREGATES, default="last",
+                   help="Bucket aggregate (default: last)")
+    q.add_argument("--format", choices=("csv", "json"), default="csv")
+    q.add_argument("--snapshot-dir", default=None,
+                   help="Snapshot directory (default: general.snapshot_dir)")
     args = parser.parse_args()
 
+    if args.command == "query":
+        _query(args)
+        return
+
     monitor = RDMAMonitor(config_path=args.config)
     try:
         monitor.start()
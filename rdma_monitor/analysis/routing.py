@@ -0,0 +1,352 @@
+"""Fabric routing analysis from switch linear forwarding tables.
+
+Uneven LFTs on a fat tree make some up-links carry far more host-to-host
+routes than their siblings, which caps all-to-all bandwidth well below
+what the cabling allows.  :func:`analyze_routes` walks the LFTs
+(``dump_lfts.sh`` / ``ibroute`` output) over a :class:`FabricGraph` for
+every pair of HCA ports at once, hop by hop on NumPy arrays, and counts
+the routes crossing each link in each direction.  :func:`routing_report`
+turns the counts into per-link hot-spot scores and per-switch up-link
+oversubscription.
+"""
+
+import mmap
+import re
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from rdma_monitor.utils.fabric_graph import NODE_CA, NODE_SWITCH, FabricGraph
+
+_LFT_HEADER = b"Unicast lids "
+_GUID_RE = re.compile(rb"\bguid 0x([0-9a-fA-F]+)")
+
+# ASCII -> hex digit value (-1 if not a hex digit)
+_HEX = np.full(256, -1, dtype=np.int8)
+for _i, _c in enumerate(b"0123456789abcdef"):
+    _HEX[_c] = _i
+    _HEX[bytes([_c]).upper()[0]] = _i
+
+# Per-lane data rate in Gb/s, indexed like fabric_graph.SPEEDS
+_LANE_GBPS = np.array([0, 2.5, 5, 10, 10, 14, 25, 50, 100, 200], dtype=np.float64)
+
+# Source-switch x destination pairs walked per vectorized batch
+_BATCH_PAIRS = 1 << 20
+
+_NO_PORT = 255
+
+# Bytes of an LFT dump decoded per vectorized block
+_PARSE_BLOCK = 64 << 20
+
+
+def _decode_entries(buf: np.ndarray, lo: int, hi: int
+                    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """LFT entries on the lines that start after a newline in ``buf[lo:hi]``.
+
+    Returns:
+        (line start offsets, LIDs, ports) of the entry lines.
+    """
+    starts = np.flatnonzero(buf[lo:hi] == ord("\n")) + (lo + 1)
+    starts = starts[starts + 10 <= buf.size]
+    starts = starts[(buf[starts] == ord("0")) & (buf[starts + 1] == ord("x"))
+                    & (buf[starts + 6] == ord(" "))]
+    lids = np.zeros(starts.size, dtype=np.int32)
+    ports = np.zeros(starts.size, dtype=np.int16)
+    valid = np.ones(starts.size, dtype=bool)
+    for k in range(2, 6):
+        d = _HEX[buf[starts + k]]
+        valid &= d >= 0
+        lids = lids * 16 + d
+    for k in range(7, 10):
+        d = _HEX[buf[starts + k]]
+        valid &= (d >= 0) & (d < 10)
+        ports = ports * 10 + d
+    return starts[valid], lids[valid], ports[valid]
+
+
+def parse_lfts(data: str | bytes | bytearray | memoryview | mmap.mmap,
+               block: int = _PARSE_BLOCK) -> dict[int, tuple[np.ndarray, np.ndarray]]:
+    """Parse ``dump_lfts.sh`` or concatenated ``ibroute`` output.
+
+    LFT entries are printed as ``0x%04x %03u : ...``; a dump holds one
+    line per (switch, LID), so the entries are decoded column-wise on the
+    raw bytes rather than line by line.  *data* may be any bytes-like
+    buffer (e.g. an ``mmap`` of the dump) and is never copied; it is
+    decoded *block* bytes at a time so temporaries stay bounded.
+
+    Returns:
+        switch GUID -> (destination LIDs, output ports), both arrays.
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    size = len(data)
+    headers: list[tuple[int, int]] = []
+    pos = data.find(_LFT_HEADER)
+    while pos >= 0:
+        eol = data.find(b"\n", pos)
+        m = _GUID_RE.search(data, pos, eol if eol >= 0 else size)
+        if m is not None:
+            headers.append((pos, int(m.group(1), 16)))
+        pos = data.find(_LFT_HEADER, pos + 1)
+    if not headers:
+        return {}
+
+    buf = np.frombuffer(data, dtype=np.uint8)
+    header_pos = np.array([pos for pos, _ in headers], dtype=np.int64)
+    owners: list[np.ndarray] = []
+    all_lids: list[np.ndarray] = []
+    all_ports: list[np.ndarray] = []
+    for lo in range(0, size, block):
+        starts, lids, ports = _decode_entries(buf, lo, min(lo + block, size))
+        # Entries belong to the closest header above them
+        owner = np.searchsorted(header_pos, starts) - 1
+        keep = owner >= 0
+        owners.append(owner[keep].astype(np.int32))
+        all_lids.append(lids[keep])
+        all_ports.append(ports[keep])
+        del starts
+    owner = np.concatenate(owners)
+    lids = np.concatenate(all_lids)
+    ports = np.concatenate(all_ports)
+    bounds = np.searchsorted(owner, np.arange(len(headers) + 1))
+    tables: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+    for i, (_, guid) in enumerate(headers):
+        lo, hi = bounds[i], bounds[i + 1]
+        if hi > lo:
+            tables[guid] = (lids[lo:hi], ports[lo:hi])
+    return tables
+
+
+@dataclass
+class RouteLoad:
+    """Routes per link direction for all HCA-port pairs."""
+    routes: np.ndarray         # float64 [n_links, 2]: a->b, b->a
+    pairs: int                 # source/destination pairs evaluated
+    unrouted: int              # pairs hitting a missing LFT entry or port
+    misrouted: int             # pairs delivered to the wrong HCA
+    looped: int                # pairs still in flight after max_hops
+
+
+def analyze_routes(graph: FabricGraph,
+                   lfts: dict[int, tuple[np.ndarray, np.ndarray]],
+                   max_hops: int = 16) -> RouteLoad:
+    """Count the routes every link carries between all pairs of HCA ports.
+
+    Pairs are grouped by ingress switch, so each (ingress switch,
+    destination LID) path is walked once and weighted by the number of
+    HCA ports behind that switch.
+    """
+    n_links = graph.num_links
+    routes = np.zeros(n_links * 2, dtype=np.float64)
+    is_switch = graph.node_type == NODE_SWITCH
+    sw_nodes = np.flatnonzero(is_switch)
+    sw_row = np.full(graph.num_nodes, -1, dtype=np.int64)
+    sw_row[sw_nodes] = np.arange(sw_nodes.size)
+
+    # Destinations: LIDs of HCA ports
+    is_ca_lid = graph.node_type[graph.lid_node] == NODE_CA
+    order = np.argsort(graph.lids[is_ca_lid])
+    dst_lid = graph.lids[is_ca_lid][order].astype(np.int64)
+    dst_node = graph.lid_node[is_ca_lid][order].astype(np.int64)
+    dst_port = graph.lid_port[is_ca_lid][order].astype(np.int64)
+    n_dst = dst_lid.size
+
+    # Switch port -> (peer node, link, direction); direction 0 is a->b
+    max_port = int(max(graph.port_a.max(initial=0), graph.port_b.max(initial=0))) + 1
+    peer = np.full((sw_nodes.size, max_port), -1, dtype=np.int64)
+    plink = np.full((sw_nodes.size, max_port), -1, dtype=np.int64)
+    pdir = np.zeros((sw_nodes.size, max_port), dtype=np.int64)
+    for src, sport, dst, d in ((graph.link_a, graph.port_a, graph.link_b, 0),
+                               (graph.link_b, graph.port_b, graph.link_a, 1)):
+        sel = is_switch[src]
+        rows, ports = sw_row[src[sel]], sport[sel].astype(np.int64)
+        peer[rows, ports] = dst[sel]
+        plink[rows, ports] = np.flatnonzero(sel)
+        pdir[rows, ports] = d
+
+    # Forwarding tables restricted to the destination LIDs
+    lft = np.full((sw_nodes.size, max(n_dst, 1)), _NO_PORT, dtype=np.uint8)
+    for guid, (lids, ports) in lfts.items():
+        node = graph.node_index(guid)
+        if node is None or sw_row[node] < 0 or n_dst == 0:
+            continue
+        col = np.searchsorted(dst_lid, lids)
+        ok = (col < n_dst) & (dst_lid[np.minimum(col, n_dst - 1)] == lids) \
+            & (ports < max_port)
+        lft[sw_row[node], col[ok]] = ports[ok]
+
+    # Ingress switch and link of every HCA port that has a destination LID
+    a_is_ca = graph.node_type[graph.link_a] == NODE_CA
+    b_is_ca = graph.node_type[graph.link_b] == NODE_CA
+    host_links = np.flatnonzero((a_is_ca & is_switch[graph.link_b])
+                                | (b_is_ca & is_switch[graph.link_a]))
+    ha = a_is_ca[host_links]
+    h_node = np.where(ha, graph.link_a[host_links], graph.link_b[host_links])
+    h_port = np.where(ha, graph.port_a[host_links], graph.port_b[host_links])
+    h_switch = np.where(ha, graph.link_b[host_links], graph.link_a[host_links])
+    h_key = h_node.astype(np.int64) * 256 + h_port
+    d_key = dst_node * 256 + dst_port
+    is_src = np.isin(h_key, d_key)
+    host_links, ha, h_switch, h_key = (host_links[is_src], ha[is_src],
+                                       h_switch[is_src], h_key[is_src])
+    n_src = host_links.size
+
+    # First hop: every source sends to every other destination
+    np.add.at(routes, host_links * 2 + np.where(ha, 0, 1), max(n_dst - 1, 0))
+
+    # Sources per ingress switch; a destination behind the same switch is
+    # not its own source
+    ingress, per_switch = np.unique(sw_row[h_switch], return_counts=True)
+    dst_ingress = np.full(n_dst, -1, dtype=np.int64)
+    d_order = np.argsort(d_key)
+    dst_ingress[d_order[np.searchsorted(d_key, h_key, sorter=d_order)]] = sw_row[h_switch]
+
+    unrouted = misrouted = looped = 0
+    per_batch = max(1, _BATCH_PAIRS // max(n_dst, 1))
+    dst_idx = np.arange(n_dst)
+    for start in range(0, ingress.size, per_batch):
+        rows = ingress[start:start + per_batch]
+        counts = per_switch[start:start + per_batch]
+        cur = np.repeat(rows, n_dst)
+        col = np.tile(dst_idx, rows.size)
+        weight = (np.repeat(counts, n_dst)
+                  - (dst_ingress[col] == cur)).astype(np.float64)
+        live = weight > 0
+        cur, col, weight = cur[live], col[live], weight[live]
+        for _ in range(max_hops):
+            if cur.size == 0:
+                break
+            out = lft[cur, col].astype(np.int64)
+            nxt = np.where(out < _NO_PORT, peer[cur, np.minimum(out, max_port - 1)], -1)
+            bad = (out == _NO_PORT) | (out == 0) | (nxt < 0)
+            unrouted += int(weight[bad].sum())
+            cur, col, weight, out, nxt = (cur[~bad], col[~bad], weight[~bad],
+                                          out[~bad], nxt[~bad])
+            link = plink[cur, out]
+            routes += np.bincount(link * 2 + pdir[cur, out], weights=weight,
+                                  minlength=n_links * 2)
+            arrived = ~is_switch[nxt]
+            misrouted += int(weight[arrived & (nxt != dst_node[col])].sum())
+            keep = ~arrived
+            cur, col, weight = sw_row[nxt[keep]], col[keep], weight[keep]
+        looped += int(weight.sum())
+
+    return RouteLoad(
+        routes=routes.reshape(n_links, 2),
+        pairs=int(n_src * n_dst - np.count_nonzero(dst_ingress >= 0)),
+        unrouted=unrouted,
+        misrouted=misrouted,
+        looped=looped,
+    )
+
+
+def switch_levels(graph: FabricGraph) -> np.ndarray:
+    """Hop distance of every node from the nearest HCA (HCAs are level 0)."""
+    indptr, neighbor, _, _ = graph.adjacency()
+    level = np.full(graph.num_nodes, -1, dtype=np.int64)
+    frontier = np.flatnonzero(graph.node_type == NODE_CA)
+    level[frontier] = 0
+    depth = 0
+    while frontier.size:
+        depth += 1
+        starts, ends = indptr[frontier], indptr[frontier + 1]
+        lengths = ends - starts
+        idx = np.repeat(ends - lengths.cumsum(), lengths) + np.arange(lengths.sum())
+        nxt = np.unique(neighbor[idx])
+        nxt = nxt[level[nxt] < 0]
+        level[nxt] = depth
+        frontier = nxt
+    return level
+
+
+def routing_report(graph: FabricGraph, load: RouteLoad,
+                   max_links: int = 200) -> dict[str, Any]:
+    """Summarize a :class:`RouteLoad` for the exporters.
+
+    Each directed switch-to-switch link gets a hot-spot score: its route
+    count divided by the mean of the links leaving the same switch in the
+    same direction (up or down), so 1.0 is perfectly balanced.  Each
+    switch gets its capacity oversubscription (down-link bandwidth over
+    up-link bandwidth) and route imbalance (busiest up-link over mean).
+
+    Returns:
+        Fabric-wide figures plus a ``devices`` dict holding the
+        *max_links* hottest links and the switches with up-links.
+    """
+    level = switch_levels(graph)
+    gbps = graph.width.astype(np.float64) * _LANE_GBPS[graph.speed]
+    sw = graph.switch_links()
+
+    # Directed switch-to-switch traversals: (link, direction, source node)
+    links = np.flatnonzero(sw)
+    d_link = np.concatenate([links, links])
+    d_dir = np.concatenate([np.zeros_like(links), np.ones_like(links)])
+    d_src = np.where(d_dir == 0, graph.link_a[d_link], graph.link_b[d_link])
+    d_dst = np.where(d_dir == 0, graph.link_b[d_link], graph.link_a[d_link])
+    d_sport = np.where(d_dir == 0, graph.port_a[d_link], graph.port_b[d_link])
+    d_dport = np.where(d_dir == 0, graph.port_b[d_link], graph.port_a[d_link])
+    d_routes = load.routes[d_link, d_dir]
+    d_up = level[d_dst] > level[d_src]
+
+    # Mean routes per (source switch, up/down) group
+    group = d_src.astype(np.int64) * 2 + d_up
+    uniq, inv, size = np.unique(group, return_inverse=True, return_counts=True)
+    mean = np.bincount(inv, weights=d_routes, minlength=uniq.size) / size
+    score = np.divide(d_routes, mean[inv], out=np.zeros_like(d_routes),
+                      where=mean[inv] > 0)
+
+    # Per switch: capacity oversubscription and up-link route imbalance
+    all_src = np.concatenate([graph.link_a, graph.link_b])
+    all_dst = np.concatenate([graph.link_b, graph.link_a])
+    all_gbps = np.concatenate([gbps, gbps])
+    from_sw = graph.node_type[all_src] == NODE_SWITCH
+    up = from_sw & (level[all_dst] > level[all_src])
+    down = from_sw & (level[all_dst] < level[all_src])
+    up_bw = np.bincount(all_src[up], weights=all_gbps[up], minlength=graph.num_nodes)
+    down_bw = np.bincount(all_src[down], weights=all_gbps[down],
+                          minlength=graph.num_nodes)
+    up_max = np.zeros(graph.num_nodes)
+    np.maximum.at(up_max, d_src[d_up], d_routes[d_up])
+    up_sum = np.bincount(d_src[d_up], weights=d_routes[d_up], minlength=graph.num_nodes)
+    up_cnt = np.bincount(d_src[d_up], minlength=graph.num_nodes)
+
+    has_up = np.flatnonzero(up_bw > 0)
+    oversub = down_bw[has_up] / up_bw[has_up]
+    up_mean = np.divide(up_sum[has_up], up_cnt[has_up],
+                        out=np.zeros(has_up.size), where=up_cnt[has_up] > 0)
+    imbalance = np.divide(up_max[has_up], up_mean, out=np.zeros(has_up.size),
+                          where=up_mean > 0)
+
+    up_routes = d_routes[d_up]
+    report: dict[str, Any] = {
+        "pairs": load.pairs,
+        "unrouted_pairs": load.unrouted,
+        "misrouted_pairs": load.misrouted,
+        "looped_pairs": load.looped,
+        "max_hotspot_score": round(float(score.max(initial=0.0)), 3),
+        "uplink_route_cv": round(
+            float(up_routes.std() / up_routes.mean()) if up_routes.size
+            and up_routes.mean() > 0 else 0.0, 4),
+        "max_oversubscription": round(float(oversub.max(initial=0.0)), 3),
+        "max_uplink_imbalance": round(float(imbalance.max(initial=0.0)), 3),
+    }
+
+    devices: dict[str, dict[str, Any]] = {}
+    for i in np.argsort(-score, kind="stable")[:max_links]:
+        label = (graph.port_label(int(d_src[i]), int(d_sport[i])) + "->"
+                 + graph.port_label(int(d_dst[i]), int(d_dport[i])))
+        devices[label] = {
+            "routes": int(d_routes[i]),
+            "hotspot_score": round(float(score[i]), 3),
+            "uplink": bool(d_up[i]),
+        }
+    for k, node in enumerate(has_up):
+        devices[graph.names[node] or f"0x{int(graph.guids[node]):016x}"] = {
+            "level": int(level[node]),
+            "oversubscription": round(float(oversub[k]), 3),
+            "uplink_imbalance": round(float(imbalance[k]), 3),
+        }
+    report["devices"] = devices
+    return report
+
@@ -0,0 +1 @@
+"""Micro-benchmarks, run as ``python -m rdma_monitor.benchmarks.<name>``."""
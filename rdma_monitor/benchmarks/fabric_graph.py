@@ -0,0 +1,142 @@
+"""Benchmark fabric graph parsing and diffing on synthetic fabrics.
+
+Generates an ``ibnetdiscover`` dump of a two-level fat tree (default about
+10k nodes), then times :func:`parse_ibnetdiscover`, reports the graph's
+memory, and diffs it against a second sweep with a few links removed,
+added and degraded.
+
+    python -m rdma_monitor.benchmarks.fabric_graph [--hosts 9360]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from rdma_monitor.utils.fabric_graph import diff_graphs, parse_ibnetdiscover
+
+_RADIX = 36
+
+
+def leaf_guid(i: int) -> int:
+    return 0x248A070300000000 + i
+
+
+def spine_guid(i: int) -> int:
+    return 0x248A070301000000 + i
+
+
+def host_guid(i: int) -> int:
+    return 0x0002C90300000000 + i * 2
+
+
+def synthetic_ibnetdiscover(hosts: int, degraded: set[int] = frozenset(),
+                            removed: set[int] = frozenset(),
+                            radix: int = _RADIX) -> str:
+    """Dump of a fat tree with *hosts* single-port HCAs.
+
+    Leaves use half of their *radix* ports for hosts and half for
+    up-links, one to each spine group.  Host numbers in *degraded* come up
+    1xEDR; those in *removed* are missing from the dump.  The tree is a
+    full fat tree up to ``radix * radix / 2`` hosts.
+    """
+    down = radix // 2
+    leaves = -(-hosts // down)
+    # Up-link u of every leaf goes to spine group u; a group has one spine
+    # per *radix* leaves.
+    group = -(-leaves // radix)
+    spines = down * group
+    lid = iter(range(1, 1 << 16))
+    leaf_lid = {i: next(lid) for i in range(leaves)}
+    spine_lid = {i: next(lid) for i in range(spines)}
+    host_lid = {h: next(lid) for h in range(hosts)}
+
+    def spine_of(leaf: int, u: int) -> tuple[int, int]:
+        """(spine index, spine port) of up-link *u* of *leaf*."""
+        return u * group + leaf // radix, leaf % radix + 1
+
+    def rate(h: int) -> str:
+        return "1xEDR" if h in degraded else "4xEDR"
+
+    def sw_header(guid: int, name: str, swlid: int) -> list[str]:
+        return [
+            "vendid=0x2c9", "devid=0xcf08", f"sysimgguid=0x{guid:x}",
+            f"switchguid=0x{guid:x}({guid:x})",
+            f'Switch\t{radix} "S-{guid:016x}"\t\t# "{name}" enhanced port 0 lid {swlid} lmc 0',
+        ]
+
+    lines: list[str] = ["#", "# Topology file: generated", "#", ""]
+    for s in range(spines):
+        u, g = divmod(s, group)
+        lines += sw_header(spine_guid(s), f"spine-{s}", spine_lid[s])
+        for p in range(1, radix + 1):
+            leaf = g * radix + p - 1
+            if leaf < leaves:
+                lines.append(f'[{p}]\t"S-{leaf_guid(leaf):016x}"[{down + 1 + u}]\t\t'
+                             f'# "leaf-{leaf}" lid {leaf_lid[leaf]} 4xEDR')
+        lines.append("")
+    for leaf in range(leaves):
+        g = leaf_guid(leaf)
+        lines += sw_header(g, f"leaf-{leaf}", leaf_lid[leaf])
+        for p in range(1, down + 1):
+            h = leaf * down + p - 1
+            if h >= hosts or h in removed:
+                continue
+            lines.append(f'[{p}]\t"H-{host_guid(h):016x}"[1]({host_guid(h) + 1:x})\t\t'
+                         f'# "host-{h} mlx5_0" lid {host_lid[h]} {rate(h)}')
+        for u in range(down):
+            s, sp = spine_of(leaf, u)
+            lines.append(f'[{down + 1 + u}]\t"S-{spine_guid(s):016x}"[{sp}]\t\t'
+                         f'# "spine-{s}" lid {spine_lid[s]} 4xEDR')
+        lines.append("")
+    for h in range(hosts):
+        if h in removed:
+            continue
+        g = host_guid(h)
+        leaf = h // down
+        lines += [
+            "vendid=0x2c9", "devid=0x1017", f"sysimgguid=0x{g:x}", f"caguid=0x{g:x}",
+            f'Ca\t1 "H-{g:016x}"\t\t# "host-{h} mlx5_0"',
+            f'[1]({g + 1:x}) \t"S-{leaf_guid(leaf):016x}"[{h % down + 1}]\t\t'
+            f'# lid {host_lid[h]} lmc 0 "leaf-{leaf}" lid {leaf_lid[leaf]} {rate(h)}',
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=9360)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    base = synthetic_ibnetdiscover(args.hosts)
+    changed = synthetic_ibnetdiscover(args.hosts, degraded={1, 2, 3},
+                                      removed={10, 11})
+    print(f"dump: {len(base) / 1e6:.1f} MB, {base.count(chr(10))} lines")
+
+    best = float("inf")
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        graph = parse_ibnetdiscover(base)
+        best = min(best, time.perf_counter() - t0)
+    print(f"parse: {best * 1000:.0f} ms  {graph.summary()}")
+
+    tracemalloc.start()
+    graph = parse_ibnetdiscover(base)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"graph: {graph.nbytes() / 1e6:.2f} MB held, "
+          f"{peak / 1e6:.1f} MB peak while parsing")
+
+    new = parse_ibnetdiscover(changed)
+    t0 = time.perf_counter()
+    diff = diff_graphs(graph, new)
+    elapsed = time.perf_counter() - t0
+    print(f"diff: {elapsed * 1000:.1f} ms  {diff.counts()}")
+    for rec in diff.records(graph, new, limit=5):
+        print(f"  {rec['change']:9s} {rec['a']} <-> {rec['b']} "
+              f"{rec['width']}{rec['speed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark snapshot saves: per-file indented JSON vs NDJSON segments.
+
+Saves the same synthetic collector cycles with the previous scheme (one
+``indent=2`` file per snapshot plus a second full dump into
+``latest.json``) and with :class:`JsonExporter` segments in every
+available compression, with keyframes only and with deltas between them,
+and reports CPU per save and bytes on disk.
+
+    python -m rdma_monitor.benchmarks.json_snapshots [--ports 8 --saves 60]
+"""
+
+import argparse
+import json
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from rdma_monitor.benchmarks.prometheus_export import synthetic_cycle
+from rdma_monitor.exporters.json_exporter import JsonExporter, iter_segment, zstandard
+
+
+def _save_per_file(directory: Path, data: dict) -> None:
+    """The previous JsonExporter.save."""
+    ts = datetime.now(timezone.utc)
+    snapshot = {"timestamp": ts.isoformat(), "epoch": time.time(), "data": data}
+    name = f"rdma_snapshot_{ts.strftime('%Y%m%dT%H%M%S%fZ')}.json"
+    with open(directory / name, "w") as fh:
+        json.dump(snapshot, fh, indent=2, default=str)
+    with open(directory / "latest.json", "w") as fh:
+        json.dump(snapshot, fh, indent=2, default=str)
+
+
+def _du(directory: Path) -> int:
+    return sum(p.stat().st_size for p in directory.iterdir() if p.is_file())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ports", type=int, default=8)
+    parser.add_argument("--queues", type=int, default=64)
+    parser.add_argument("--saves", type=int, default=60)
+    parser.add_argument("--keyframe-interval", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    cycles = [synthetic_cycle(args.ports, args.queues, rng) for _ in range(args.saves)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp) / "per_file"
+        base.mkdir()
+        t0 = time.process_time()
+        for data in cycles:
+            _save_per_file(base, data)
+        before_cpu = (time.process_time() - t0) / len(cycles)
+        before_bytes = _du(base)
+        print(f"per-file indent=2:         {before_cpu * 1000:7.1f} ms CPU/save  "
+              f"{before_bytes / 1e6:8.1f} MB")
+
+        for compression in ("none", "gzip", "zstd"):
+            if compression == "zstd" and zstandard is None:
+                print("segments zstd           : skipped (zstandard not installed)")
+                continue
+            for interval in (1, args.keyframe_interval):
+                directory = Path(tmp) / f"{compression}_{interval}"
+                exporter = JsonExporter(str(directory), compression=compression,
+                                        keyframe_interval=interval)
+                t0 = time.process_time()
+                for data in cycles:
+                    exporter.save(data)
+                cpu = (time.process_time() - t0) / len(cycles)
+                exporter.close()
+                size = _du(directory)
+                records = sum(1 for seg in exporter.segments() for _ in iter_segment(seg))
+                assert records == len(cycles)
+                mode = "keyframes" if interval == 1 else "deltas   "
+                print(f"segments {compression:5s} {mode}: {cpu * 1000:7.1f} ms CPU/save  "
+                      f"{size / 1e6:8.1f} MB  ({before_cpu / cpu:.1f}x CPU, "
+                      f"{before_bytes / size:.1f}x bytes)")
+
+
+if __name__ == "__main__":
+    main()
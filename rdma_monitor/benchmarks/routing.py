@@ -0,0 +1,94 @@
+"""Benchmark LFT parsing and route analysis on a synthetic fat tree.
+
+Builds a two-level fat tree (default 2048 HCAs on 64-port switches), a
+D-mod-K style LFT dump for it, and times :func:`parse_lfts`,
+:func:`analyze_routes` and :func:`routing_report`.  ``--skew`` routes a
+fraction of the destinations through the first up-link of every leaf to
+show the hot-spot scores reacting.
+
+    python -m rdma_monitor.benchmarks.routing [--hosts 2048] [--skew 0.1]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from rdma_monitor.analysis.routing import (
+    analyze_routes, parse_lfts, routing_report, switch_levels,
+)
+from rdma_monitor.benchmarks.fabric_graph import synthetic_ibnetdiscover
+from rdma_monitor.utils.fabric_graph import (
+    NODE_CA, NODE_SWITCH, FabricGraph, parse_ibnetdiscover,
+)
+
+
+def synthetic_lfts(graph: FabricGraph, skew: float = 0.0) -> str:
+    """``dump_lfts.sh`` output routing every HCA LID over *graph*.
+
+    Leaves spread destinations over their up-links by LID (D-mod-K);
+    spines forward straight down.  A *skew* fraction of the LIDs is sent
+    over each leaf's first up-link instead.
+    """
+    level = switch_levels(graph)
+    indptr, neighbor, local_port, _ = graph.adjacency()
+    ca = graph.node_type[graph.lid_node] == NODE_CA
+    lids = graph.lids[ca].astype(np.int64)
+    hosts = graph.lid_node[ca]
+    host_leaf = neighbor[indptr[hosts]]
+    skewed = (lids % 1000) < skew * 1000
+
+    out: list[str] = []
+    for sw in np.flatnonzero(graph.node_type == NODE_SWITCH):
+        nbr = neighbor[indptr[sw]:indptr[sw + 1]]
+        ports = local_port[indptr[sw]:indptr[sw + 1]]
+        port_to = np.full(graph.num_nodes, 0, dtype=np.int64)
+        port_to[nbr] = ports
+        up = np.sort(ports[level[nbr] > level[sw]])
+        if level[sw] == 1:
+            via_up = up[np.where(skewed, 0, lids % max(up.size, 1))] if up.size \
+                else np.zeros(lids.size, dtype=np.int64)
+            egress = np.where(host_leaf == sw, port_to[hosts], via_up)
+        else:
+            egress = port_to[host_leaf]
+        out.append(f"Unicast lids [0x0-0x{int(lids.max()):x}] of switch DR path "
+                   f"slid 0; dlid 0; 0 guid 0x{int(graph.guids[sw]):016x} "
+                   f"({graph.names[sw]}):")
+        out.append("  Lid  Out   Destination")
+        out.append("       Port     Info ")
+        out += [f"0x{lid:04x} {port:03d} : (Channel Adapter portguid 0x0: 'x')"
+                for lid, port in zip(lids.tolist(), egress.tolist()) if port]
+        out.append(f"{lids.size} valid lids dumped ")
+    return "\n".join(out)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=2048)
+    parser.add_argument("--radix", type=int, default=64)
+    parser.add_argument("--skew", type=float, default=0.0)
+    args = parser.parse_args()
+
+    graph = parse_ibnetdiscover(synthetic_ibnetdiscover(args.hosts, radix=args.radix))
+    dump = synthetic_lfts(graph, args.skew)
+    print(f"fabric: {graph.summary()}")
+    print(f"lft dump: {len(dump) / 1e6:.1f} MB")
+
+    t0 = time.perf_counter()
+    lfts = parse_lfts(dump)
+    t1 = time.perf_counter()
+    load = analyze_routes(graph, lfts)
+    t2 = time.perf_counter()
+    report = routing_report(graph, load, max_links=5)
+    t3 = time.perf_counter()
+    print(f"parse_lfts: {(t1 - t0) * 1000:.0f} ms, analyze_routes: "
+          f"{(t2 - t1) * 1000:.0f} ms, routing_report: {(t3 - t2) * 1000:.0f} ms")
+
+    devices = report.pop("devices")
+    print(report)
+    for name, entry in list(devices.items())[:5]:
+        print(f"  {name}: {entry}")
+
+
+if __name__ == "__main__":
+    main()
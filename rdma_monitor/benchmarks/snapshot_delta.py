@@ -0,0 +1,132 @@
+"""Benchmark delta-encoded snapshot history against full snapshots.
+
+Generates a series of realistic snapshots for one host: static topology,
+GID tables, firmware, mlxconfig, kernel module and cable sections, plus
+port counters that grow and rates that move every save.  The series is
+saved with keyframes only (``keyframe_interval=1``) and with deltas in
+between, uncompressed and gzip-compressed.  The benchmark reports bytes
+on disk, CPU per save and the time to rebuild a random point.
+
+    python -m rdma_monitor.benchmarks.snapshot_delta [--ports 8 --saves 120]
+"""
+
+import argparse
+import copy
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Iterator
+
+from rdma_monitor.exporters.json_exporter import JsonExporter, iter_segment
+
+_COUNTERS = ("port_xmit_data", "port_rcv_data", "port_xmit_packets",
+             "port_rcv_packets", "port_xmit_wait", "np_cnp_sent",
+             "np_ecn_marked_roce_packets", "rp_cnp_handled")
+_ERRORS = ("symbol_error", "link_downed", "port_rcv_errors",
+           "port_xmit_discards", "out_of_sequence", "local_ack_timeout_err")
+_ETHTOOL_BUSY = 60      # ethtool counters that move every save
+_ETHTOOL_IDLE = 240     # ... and those that stay at their value
+
+
+def _static_port(rng: random.Random, p: int) -> dict[str, Any]:
+    return {
+        "gid_table": {str(i): f"fe80::{rng.getrandbits(64):x}" for i in range(16)},
+        "pkeys": ["0xffff", "0x7fff"],
+        "firmware": {"fw_ver": "28.39.1002", "board_id": "MT_0000000838",
+                     "hca_type": "MT4129", "node_guid": f"{rng.getrandbits(64):016x}"},
+        "mlxconfig": {f"PARAM_{i}": rng.choice(["True(1)", "False(0)", str(i)])
+                      for i in range(150)},
+        "cable": {"vendor": "Mellanox", "part_number": "MCP1650-H002E26",
+                  "serial": f"MT{rng.getrandbits(40):x}", "length_m": 2,
+                  "temperature_c": 41, "rx_power_dbm": [-1.2, -1.1, -1.3, -1.0]},
+        "netdev": f"eth{p}",
+    }
+
+
+def realistic_snapshots(ports: int, saves: int, seed: int = 0
+                        ) -> Iterator[dict[str, Any]]:
+    """*saves* consecutive monitor snapshots of a host with *ports* ports."""
+    rng = random.Random(seed)
+    static = {f"mlx5_{p}/1": _static_port(rng, p) for p in range(ports)}
+    modules = {m: {f"param_{i}": str(rng.randrange(100)) for i in range(40)}
+               for m in ("mlx5_core", "mlx5_ib", "ib_core", "rdma_cm", "ib_uverbs")}
+    counters = {port: {c: rng.randrange(1 << 40) for c in _COUNTERS + _ERRORS}
+                for port in static}
+    ethtool = {port: {f"stat_{i}": rng.randrange(1 << 32)
+                      for i in range(_ETHTOOL_BUSY + _ETHTOOL_IDLE)}
+               for port in static}
+
+    for _ in range(saves):
+        perf: dict[str, Any] = {}
+        for port in static:
+            rates = {}
+            for c in _COUNTERS:
+                inc = rng.randrange(1 << 30)
+                counters[port][c] += inc
+                rates[f"{c}_per_sec"] = round(inc / 30.0, 2)
+            for i in range(_ETHTOOL_BUSY):
+                ethtool[port][f"stat_{i}"] += rng.randrange(1 << 20)
+            if rng.random() < 0.01:
+                counters[port]["symbol_error"] += 1
+            perf[port] = {"counters": dict(counters[port]), "rates": rates,
+                          "ethtool_stats": dict(ethtool[port])}
+        yield copy.deepcopy({
+            "performance": {"devices": perf},
+            "topology": {"devices": {p: {"gid_table": s["gid_table"],
+                                         "pkeys": s["pkeys"]}
+                                     for p, s in static.items()},
+                         "ib_fabric": {"nodes": 2048, "switches": 96}},
+            "configuration": {"kernel_modules": modules,
+                              "devices": {p: {"firmware": s["firmware"],
+                                              "mlxconfig": s["mlxconfig"]}
+                                          for p, s in static.items()}},
+            "link_status": {"devices": {p: {"state": "ACTIVE", "cable_info": s["cable"],
+                                            "flap_count": 0}
+                                        for p, s in static.items()}},
+        })
+
+
+def _size(directory: Path) -> int:
+    return sum(p.stat().st_size for p in directory.glob("rdma_segment_*"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ports", type=int, default=8)
+    parser.add_argument("--saves", type=int, default=120)
+    parser.add_argument("--keyframe-interval", type=int, default=20)
+    args = parser.parse_args()
+
+    snapshots = list(realistic_snapshots(args.ports, args.saves))
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for compression in ("none", "gzip"):
+            for interval in (1, args.keyframe_interval):
+                directory = Path(tmp) / f"{compression}_{interval}"
+                exporter = JsonExporter(str(directory), compression=compression,
+                                        keyframe_interval=interval)
+                t0 = time.process_time()
+                for data in snapshots:
+                    exporter.save(data)
+                cpu = (time.process_time() - t0) / len(snapshots)
+                exporter.close()
+
+                first = next(iter_segment(exporter.segments()[0]))["epoch"]
+                t0 = time.perf_counter()
+                for _ in range(10):
+                    record = exporter.get_at(rng.uniform(first, time.time()))
+                    assert record is not None
+                read_ms = (time.perf_counter() - t0) / 10 * 1000
+                size = _size(directory)
+                results[(compression, interval)] = size
+                print(f"{compression:4s} keyframe every {interval:3d}: "
+                      f"{size / 1e6:7.2f} MB  {cpu * 1000:6.1f} ms CPU/save  "
+                      f"{read_ms:6.1f} ms per point read")
+            full, delta = results[(compression, 1)], results[(compression, args.keyframe_interval)]
+            print(f"  {compression}: deltas store {full / delta:.1f}x less")
+
+
+if __name__ == "__main__":
+    main()
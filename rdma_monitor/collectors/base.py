@@ -5,6 +5,7 @@ import logging
 import time
 from typing import Any
 
+from rdma_monitor.utils.acquisition import Acquisition, get_acquisition
 from rdma_monitor.utils.network_detector import RDMADevice
 
 logger = logging.getLogger(__name__)
@@ -15,12 +16,16 @@ class BaseCollector(abc.ABC):
 
     Subclasses must implement ``collect()`` which returns a dict of metrics.
     The dict is later serialized to JSON and exported to Prometheus.
+    Sysfs files and command output should be read through ``self.acq`` so
+    that sources shared with other collectors are fetched once per cycle.
     """
 
     name: str = "base"
 
-    def __init__(self, devices: list[RDMADevice]):
+    def __init__(self, devices: list[RDMADevice],
+                 acq: Acquisition | None = None):
         self.devices = devices
+        self.acq = acq or get_acquisition()
 
     @abc.abstractmethod
     def collect(self) -> dict[str, Any]:
@@ -32,7 +37,8 @@ class BaseCollector(abc.ABC):
         whole monitor loop."""
         try:
             start = time.monotonic()
-            data = self.collect()
+            with self.acq.cycle_scope():
+                data = self.collect()
             elapsed = time.monotonic() - start
             data["_collector"] = self.name
             data["_collect_time_ms"] = round(elapsed * 1000, 2)
@@ -1,61 +1,136 @@
 """Configuration collector for RDMA devices.
 
 Reads device parameters, firmware info, and kernel module settings.
+
+Configuration rarely changes, so every section is fingerprinted and the
+full data is only emitted on the first run, every ``full_interval``
+seconds and on request.  Other runs emit the fingerprints plus one drift
+record per value that changed.  ``mlxconfig`` (seconds per device) only
+runs at startup, on request and every ``mlxconfig_interval`` seconds.
+
+A tool that fails (times out or prints nothing) is not drift: the
+section keeps its previous data and fingerprint, and the failure is
+reported under ``errors`` instead.
 """
 
+import hashlib
+import json
 import logging
+import os
 import re
-import subprocess
-from pathlib import Path
+import time
 from typing import Any
 
 from rdma_monitor.collectors.base import BaseCollector
+from rdma_monitor.utils.acquisition import Acquisition
+from rdma_monitor.utils.counter_reader import port_dir
 from rdma_monitor.utils.network_detector import RDMADevice, NetworkType
 
 logger = logging.getLogger(__name__)
 
 
-def _run(cmd: list[str], timeout: int = 10) -> str:
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-        return result.stdout.strip()
-    except Exception:
-        return ""
+_ETHTOOL_SECTIONS = [("-g", "ring"), ("-c", "coalesce"), ("-k", "offload")]
+_ETHTOOL_FLAGS = {section: flag for flag, section in _ETHTOOL_SECTIONS}
+
+# Port attributes that follow the link, not the configuration
+_VOLATILE_ATTRS = {"state", "phys_state", "rate"}
+
+
+def fingerprint(data: Any) -> str:
+    """Short stable hash of a JSON-serializable section."""
+    blob = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+
+def _flatten(data: Any, prefix: str = "") -> dict[str, Any]:
+    if not isinstance(data, dict):
+        return {prefix: data}
+    flat: dict[str, Any] = {}
+    for key, value in data.items():
+        flat.update(_flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+
+def drift_records(section: str, old: Any, new: Any, ts: float) -> list[dict[str, Any]]:
+    """One record per leaf value of *section* that was added, removed or changed."""
+    before, after = _flatten(old), _flatten(new)
+    records: list[dict[str, Any]] = []
+    for key in sorted(before.keys() | after.keys()):
+        if before.get(key) != after.get(key):
+            records.append({
+                "section": section,
+                "key": key,
+                "old": before.get(key),
+                "new": after.get(key),
+                "timestamp": ts,
+            })
+    return records
 
 
 class ConfigurationCollector(BaseCollector):
+    """Firmware, device and kernel configuration with drift detection.
+
+    Args:
+        devices: Ports to inspect.
+        acq: Shared acquisition layer.
+        full_interval: Seconds between runs that emit full section data.
+        mlxconfig_interval: Seconds between ``mlxconfig`` queries after the
+                            first one; 0 queries only at startup and on
+                            request.
+    """
+
     name = "configuration"
 
+    def __init__(self, devices: list[RDMADevice],
+                 acq: Acquisition | None = None,
+                 full_interval: float = 86400,
+                 mlxconfig_interval: float = 0):
+        super().__init__(devices, acq)
+        self.full_interval = full_interval
+        self.mlxconfig_interval = mlxconfig_interval
+        # Last seen data and fingerprint per section path
+        self._sections: dict[str, Any] = {}
+        self._hashes: dict[str, str] = {}
+        self._mlxconfig_data: dict[str, dict[str, str]] = {}
+        self._mlxconfig_at = 0.0
+        self._full_at = 0.0
+        self._full_requested = True
+        self._drift_total = 0
+
+    def request_full(self) -> None:
+        """Re-run mlxconfig and emit full data on the next run."""
+        self._full_requested = True
+
     def _read_fw_info(self, dev: RDMADevice) -> dict[str, str]:
         """Read firmware version and board ID from sysfs."""
         info: dict[str, str] = {}
-        base = Path(f"/sys/class/infiniband/{dev.name}")
+        base = f"/sys/class/infiniband/{dev.name}"
         for attr in ("fw_ver", "board_id", "hca_type", "hw_rev", "node_guid",
                       "sys_image_guid", "node_desc"):
-            p = base / attr
-            try:
-                info[attr] = p.read_text().strip()
-            except (FileNotFoundError, PermissionError):
-                pass
+            val = self.acq.read_text(f"{base}/{attr}")
+            if val is not None:
+                info[attr] = val
         return info
 
     def _read_port_attrs(self, dev: RDMADevice) -> dict[str, str]:
         """Read per-port attributes from sysfs."""
         attrs: dict[str, str] = {}
-        base = Path(f"/sys/class/infiniband/{dev.name}/ports/{dev.port}")
+        base = port_dir(dev.name, dev.port)
         for attr in ("state", "phys_state", "rate", "link_layer", "cap_mask"):
-            p = base / attr
-            try:
-                attrs[attr] = p.read_text().strip()
-            except (FileNotFoundError, PermissionError):
-                pass
+            val = self.acq.read_text(f"{base}/{attr}")
+            if val is not None:
+                attrs[attr] = val
         return attrs
 
-    def _mlxconfig(self, dev: RDMADevice) -> dict[str, str]:
-        """Read Mellanox device configuration via mlxconfig."""
-        output = _run(["mlxconfig", "-d", dev.name, "query"])
+    @staticmethod
+    def _mlxconfig_cmd(dev: RDMADevice) -> list[str]:
+        return ["mlxconfig", "-d", dev.name, "query"]
+
+    def _mlxconfig(self, dev: RDMADevice) -> dict[str, str] | None:
+        """Read Mellanox device configuration via mlxconfig (None on failure)."""
+        output = self.acq.run(self._mlxconfig_cmd(dev))
         if not output:
-            return {}
+            return None
         config: dict[str, str] = {}
         for line in output.splitlines():
             m = re.match(r"\s*(\w[\w_]*)\s+([\w/\-\.]+)", line)
@@ -67,15 +142,16 @@ class ConfigurationCollector(BaseCollector):
         """Read mlx5_core and rdma_cm module parameters."""
         params: dict[str, dict[str, str]] = {}
         for module in ("mlx5_core", "rdma_cm", "ib_core", "rdma_ucm"):
-            mod_dir = Path(f"/sys/module/{module}/parameters")
-            if not mod_dir.is_dir():
+            mod_dir = f"/sys/module/{module}/parameters"
+            try:
+                names = os.listdir(mod_dir)
+            except OSError:
                 continue
             mod_params: dict[str, str] = {}
-            for p in mod_dir.iterdir():
-                try:
-                    mod_params[p.name] = p.read_text().strip()
-                except (PermissionError, OSError):
-                    pass
+            for name in names:
+                val = self.acq.read_text(f"{mod_dir}/{name}")
+                if val is not None:
+                    mod_params[name] = val
             if mod_params:
                 params[module] = mod_params
         return params
@@ -83,48 +159,155 @@ class ConfigurationCollector(BaseCollector):
     def _rdma_system(self) -> dict[str, str]:
         """Read rdma system netns mode and other global settings."""
         info: dict[str, str] = {}
-        output = _run(["rdma", "system", "show"])
+        sysinfo = self.acq.rdma_system()
+        output = sysinfo.system_line() if sysinfo else ""
+        if not output:
+            output = self.acq.run(["rdma", "system", "show"])
         if output:
             info["rdma_system"] = output
         return info
 
-    def _ethtool_config(self, dev: RDMADevice) -> dict[str, Any]:
-        """Read ethtool ring/coalesce/features for RoCE netdevs."""
+    def _ethtool_config(self, dev: RDMADevice) -> tuple[dict[str, Any], list[str]]:
+        """Read ethtool ring/coalesce/features for RoCE netdevs.
+
+        Returns:
+            (config, failed) where *failed* lists the sections whose
+            ``ethtool`` call produced no output.
+        """
         if not dev.netdev:
-            return {}
+            return {}, []
         config: dict[str, Any] = {}
+        failed: list[str] = []
+
+        for flag, section in _ETHTOOL_SECTIONS:
+            output = self.acq.run(["ethtool", flag, dev.netdev])
+            if not output:
+                failed.append(section)
+                continue
+            section_data: dict[str, str] = {}
+            for line in output.splitlines():
+                m = re.match(r"(\S[\S\s]*\S)\s*:\s*(.+)", line)
+                if m:
+                    section_data[m.group(1).strip()] = m.group(2).strip()
+            if section_data:
+                config[section] = section_data
 
-        for flag, section in [("-g", "ring"), ("-c", "coalesce"), ("-k", "offload")]:
-            output = _run(["ethtool", flag, dev.netdev])
-            if output:
-                section_data: dict[str, str] = {}
-                for line in output.splitlines():
-                    m = re.match(r"(\S[\S\s]*\S)\s*:\s*(.+)", line)
-                    if m:
-                        section_data[m.group(1).strip()] = m.group(2).strip()
-                if section_data:
-                    config[section] = section_data
+        return config, failed
 
-        return config
+    def _gather(self, refresh_mlxconfig: bool
+                ) -> tuple[dict[str, Any], dict[str, str]]:
+        """Read every configuration section, keyed by section path.
 
-    def collect(self) -> dict[str, Any]:
-        result: dict[str, Any] = {"devices": {}}
-        result["kernel_modules"] = self._kernel_module_params()
-        result.update(self._rdma_system())
+        Returns:
+            (sections, errors).  A section whose tool failed keeps its
+            previous data and gets an entry in *errors*.
+        """
+        errors: dict[str, str] = {}
+        sections: dict[str, Any] = {
+            "kernel_modules": self._kernel_module_params(),
+            "rdma_system": self._rdma_system(),
+        }
+
+        # Start the per-device tool calls together
+        cmds = [["ethtool", flag, d.netdev] for d in self.devices
+                if d.net_type == NetworkType.ROCE and d.netdev
+                for flag, _ in _ETHTOOL_SECTIONS]
+        if refresh_mlxconfig:
+            cmds += [self._mlxconfig_cmd(d) for d in self.devices]
+        self.acq.prefetch(cmds)
 
         for dev in self.devices:
             key = f"{dev.name}/{dev.port}"
-            dev_cfg: dict[str, Any] = {
-                "firmware": self._read_fw_info(dev),
-                "port_attrs": self._read_port_attrs(dev),
-            }
-            mlx = self._mlxconfig(dev)
-            if mlx:
-                dev_cfg["mlxconfig"] = mlx
+            sections[f"{key}/firmware"] = self._read_fw_info(dev)
+            sections[f"{key}/port_attrs"] = self._read_port_attrs(dev)
+            if refresh_mlxconfig:
+                config = self._mlxconfig(dev)
+                if config is not None:
+                    self._mlxconfig_data[key] = config
+                elif key in self._mlxconfig_data:
+                    errors[f"{key}/mlxconfig"] = "mlxconfig query failed"
+            if self._mlxconfig_data.get(key):
+                sections[f"{key}/mlxconfig"] = self._mlxconfig_data[key]
             if dev.net_type == NetworkType.ROCE:
-                eth_cfg = self._ethtool_config(dev)
+                path = f"{key}/ethtool"
+                eth_cfg, failed = self._ethtool_config(dev)
+                prev = self._sections.get(path, {})
+                for section in failed:
+                    if section in prev:
+                        eth_cfg[section] = prev[section]
+                        errors[f"{path}/{section}"] = (
+                            f"ethtool {_ETHTOOL_FLAGS[section]} {dev.netdev} failed")
                 if eth_cfg:
-                    dev_cfg["ethtool"] = eth_cfg
-            result["devices"][key] = dev_cfg
+                    sections[path] = eth_cfg
+        return sections, errors
+
+    @staticmethod
+    def _comparable(path: str, data: Any) -> Any:
+        """Section data without values that are not configuration."""
+        if path.endswith("/port_attrs"):
+            return {k: v for k, v in data.items() if k not in _VOLATILE_ATTRS}
+        return data
+
+    def collect(self) -> dict[str, Any]:
+        now = time.monotonic()
+        refresh_mlxconfig = (
+            self._full_requested
+            or (self.mlxconfig_interval > 0
+                and now - self._mlxconfig_at >= self.mlxconfig_interval)
+        )
+        full = self._full_requested or now - self._full_at >= self.full_interval
+        self._full_requested = False
+        if refresh_mlxconfig:
+            self._mlxconfig_at = now
+
+        sections, errors = self._gather(refresh_mlxconfig)
+        ts = time.time()
+        hashes: dict[str, str] = {}
+        drift: list[dict[str, Any]] = []
+        for path, data in sections.items():
+            comparable = self._comparable(path, data)
+            hashes[path] = fingerprint(comparable)
+            # Sections appearing after the first run are drift too
+            if self._hashes and self._hashes.get(path) != hashes[path]:
+                drift += drift_records(
+                    path, self._comparable(path, self._sections.get(path, {})),
+                    comparable, ts
+                )
+        for path in self._hashes.keys() - hashes.keys():
+            drift += drift_records(path, self._comparable(path, self._sections[path]),
+                                   {}, ts)
+        self._sections, self._hashes = sections, hashes
+        self._drift_total += len(drift)
+        if drift:
+            logger.warning("Configuration drift: %d value(s) changed", len(drift))
+        if errors:
+            logger.warning("Configuration read failed for %s; keeping previous data",
+                           ", ".join(sorted(errors)))
+
+        result: dict[str, Any] = {
+            "fingerprint": fingerprint(hashes),
+            "full": full,
+            "drift_count": len(drift),
+            "drift_total": self._drift_total,
+            "error_count": len(errors),
+            "devices": {},
+        }
+        if drift:
+            result["drift"] = drift
+        if errors:
+            result["errors"] = errors
+
+        if full:
+            self._full_at = now
+        for path, data in sections.items():
+            dev_key, _, section = path.rpartition("/")
+            target = result["devices"].setdefault(dev_key, {}) if dev_key else result
+            target.setdefault("fingerprints", {})[section] = hashes[path]
+            if not full:
+                continue
+            if section == "rdma_system":
+                target.update(data)
+            else:
+                target[section] = data
 
         return result
@@ -6,31 +6,15 @@ congestion-control parameters for both IB and RoCE.
 
 import logging
 import re
-import subprocess
-from pathlib import Path
 from typing import Any
 
 from rdma_monitor.collectors.base import BaseCollector
+from rdma_monitor.utils.counter_reader import port_dir
 from rdma_monitor.utils.network_detector import RDMADevice, NetworkType
 
 logger = logging.getLogger(__name__)
 
 
-def _run(cmd: list[str], timeout: int = 10) -> str:
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-        return result.stdout.strip()
-    except Exception:
-        return ""
-
-
-def _read_sysfs(path: Path) -> str | None:
-    try:
-        return path.read_text().strip()
-    except (FileNotFoundError, PermissionError, OSError):
-        return None
-
-
 # HW counters related to congestion (mlx5)
 _CONGESTION_HW_COUNTERS = [
     "np_cnp_sent",
@@ -67,64 +51,43 @@ class CongestionCollector(BaseCollector):
     name = "congestion"
 
     def _read_hw_congestion_counters(self, dev: RDMADevice) -> dict[str, int]:
-        hw_dir = Path(
-            f"/sys/class/infiniband/{dev.name}/ports/{dev.port}/hw_counters"
-        )
-        counters: dict[str, int] = {}
-        if not hw_dir.is_dir():
-            return counters
-        for name in _CONGESTION_HW_COUNTERS:
-            val = _read_sysfs(hw_dir / name)
-            if val is not None:
-                try:
-                    counters[name] = int(val)
-                except ValueError:
-                    pass
-        return counters
+        hw_dir = f"{port_dir(dev.name, dev.port)}/hw_counters"
+        return self.acq.read_many(hw_dir, _CONGESTION_HW_COUNTERS)
 
     def _read_error_counters(self, dev: RDMADevice) -> dict[str, int]:
-        cnt_dir = Path(
-            f"/sys/class/infiniband/{dev.name}/ports/{dev.port}/counters"
-        )
-        counters: dict[str, int] = {}
-        for name in _ERROR_COUNTERS:
-            val = _read_sysfs(cnt_dir / name)
-            if val is not None:
-                try:
-                    counters[name] = int(val)
-                except ValueError:
-                    pass
-        return counters
+        cnt_dir = f"{port_dir(dev.name, dev.port)}/counters"
+        return self.acq.read_many(cnt_dir, _ERROR_COUNTERS)
 
     def _pfc_stats(self, dev: RDMADevice) -> dict[str, Any]:
         """Read PFC (Priority Flow Control) counters for RoCE."""
         if not dev.netdev:
             return {}
-        output = _run(["ethtool", "-S", dev.netdev])
-        if not output:
-            return {}
         pfc: dict[str, int] = {}
-        for line in output.splitlines():
-            line = line.strip()
-            if "pfc" in line.lower() or "pause" in line.lower() or "buffer" in line.lower():
-                m = re.match(r"(\S+):\s+(\d+)", line)
-                if m:
-                    pfc[m.group(1)] = int(m.group(2))
+        for name, value in self.acq.ethtool_stats(dev.netdev).items():
+            lname = name.lower()
+            if "pfc" in lname or "pause" in lname or "buffer" in lname:
+                pfc[name] = value
         return pfc
 
+    @staticmethod
+    def _ecn_cmds(dev: RDMADevice) -> tuple[list[str], list[str]]:
+        return (["mlnx_qos", "-i", dev.netdev],
+                ["tc", "-s", "qdisc", "show", "dev", dev.netdev])
+
     def _ecn_config(self, dev: RDMADevice) -> dict[str, str]:
         """Read ECN / DCQCN configuration from sysfs or mlnx_qos."""
         config: dict[str, str] = {}
+        qos_cmd, tc_cmd = self._ecn_cmds(dev)
 
         # Try mlnx_qos (Mellanox-specific)
         if dev.netdev:
-            output = _run(["mlnx_qos", "-i", dev.netdev])
+            output = self.acq.run(qos_cmd)
             if output:
                 config["mlnx_qos"] = output[:2000]
 
         # Try reading ECN setting from tc
         if dev.netdev:
-            output = _run(["tc", "-s", "qdisc", "show", "dev", dev.netdev])
+            output = self.acq.run(tc_cmd)
             if output:
                 config["tc_qdisc"] = output[:2000]
 
@@ -133,7 +96,7 @@ class CongestionCollector(BaseCollector):
     def _ib_congestion(self) -> dict[str, Any]:
         """Read IB-specific congestion info via perfquery / vendstat."""
         info: dict[str, Any] = {}
-        output = _run(["perfquery", "-x"])
+        output = self.acq.run(["perfquery", "-x"])
         if output:
             for line in output.splitlines():
                 m = re.match(r"(\w[\w\s]+\w)\.*:\s*(\d+)", line)
@@ -153,6 +116,11 @@ class CongestionCollector(BaseCollector):
             if ib_cong:
                 result["ib_fabric_congestion"] = ib_cong
 
+        # Start the per-netdev QoS queries together
+        self.acq.prefetch([cmd for d in self.devices
+                           if d.net_type == NetworkType.ROCE and d.netdev
+                           for cmd in self._ecn_cmds(d)])
+
         for dev in self.devices:
             key = f"{dev.name}/{dev.port}"
             dev_data: dict[str, Any] = {
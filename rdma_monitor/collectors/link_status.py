@@ -6,47 +6,56 @@ and link flap detection.
 
 import logging
 import re
-import subprocess
 import time
-from pathlib import Path
 from typing import Any
 
 from rdma_monitor.collectors.base import BaseCollector
+from rdma_monitor.utils.acquisition import Acquisition
+from rdma_monitor.utils.counter_reader import port_dir
+from rdma_monitor.utils.link_events import STATE_DOWN, LinkEventListener
 from rdma_monitor.utils.network_detector import RDMADevice, NetworkType
 
 logger = logging.getLogger(__name__)
 
+# Seconds before an empty transceiver read (tool failed, timed out or
+# printed nothing) is retried, instead of the full cable_ttl
+_CABLE_RETRY_TTL = 60.0
 
-def _run(cmd: list[str], timeout: int = 10) -> str:
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-        return result.stdout.strip()
-    except Exception:
-        return ""
-
-
-def _read_sysfs(path: Path) -> str | None:
-    try:
-        return path.read_text().strip()
-    except (FileNotFoundError, PermissionError, OSError):
-        return None
+_BER_COUNTERS = [
+    "symbol_error",
+    "link_error_recovery",
+    "link_downed",
+    "port_rcv_errors",
+    "port_rcv_remote_physical_errors",
+    "local_link_integrity_errors",
+]
 
 
 class LinkStatusCollector(BaseCollector):
     name = "link_status"
 
-    def __init__(self, devices: list[RDMADevice]):
-        super().__init__(devices)
+    def __init__(self, devices: list[RDMADevice],
+                 acq: Acquisition | None = None,
+                 cable_ttl: float = 3600,
+                 link_events: LinkEventListener | None = None):
+        super().__init__(devices, acq)
         # Track previous states for flap detection
         self._prev_states: dict[str, str] = {}
         self._flap_counts: dict[str, int] = {}
+        # Event-driven flap tracking, when a listener is running
+        self.link_events = link_events
+        self._event_flaps: dict[str, int] = {}
+        self._last_collect = 0.0
+        # Transceiver identity per port: (info, monotonic read time, phys_state)
+        self.cable_ttl = cable_ttl
+        self._cable_cache: dict[str, tuple[dict[str, str], float, str]] = {}
 
     def _read_link_state(self, dev: RDMADevice) -> dict[str, str]:
         """Read link state, physical state, and speed from sysfs."""
-        base = Path(f"/sys/class/infiniband/{dev.name}/ports/{dev.port}")
+        base = port_dir(dev.name, dev.port)
         info: dict[str, str] = {}
         for attr in ("state", "phys_state", "rate", "link_layer"):
-            val = _read_sysfs(base / attr)
+            val = self.acq.read_text(f"{base}/{attr}")
             if val is not None:
                 info[attr] = val
         return info
@@ -60,11 +69,45 @@ class LinkStatusCollector(BaseCollector):
             return True
         return False
 
+    def _event_flap_info(self, key: str, since: float) -> dict[str, Any] | None:
+        """Flap statistics of *key* from the link event listener.
+
+        Adds ``flaps_since_last_poll`` and the down durations of the flaps
+        that ended since monotonic *since* to the listener's port summary.
+        """
+        summary = self.link_events.port_summary(key) if self.link_events else None
+        if summary is None:
+            return None
+        flaps = summary["flap_count"]
+        summary["flaps_since_last_poll"] = flaps - self._event_flaps.get(key, flaps)
+        self._event_flaps[key] = flaps
+
+        durations: list[float] = []
+        down_at: float | None = None
+        for event in self.link_events.events(key):
+            if event.new == STATE_DOWN:
+                down_at = event.ts
+            elif down_at is not None:
+                if event.ts >= since:
+                    durations.append(round(event.ts - down_at, 3))
+                down_at = None
+        if durations:
+            summary["flap_durations_s"] = durations
+        return summary
+
+    @staticmethod
+    def _ibstatus_cmd(dev: RDMADevice) -> list[str]:
+        return ["ibstatus", f"{dev.name}:{dev.port - 1}"]
+
+    @staticmethod
+    def _mlxcable_cmd(dev: RDMADevice) -> list[str]:
+        return ["mlxcable", "-d", dev.name]
+
     def _ibstatus_info(self, dev: RDMADevice) -> dict[str, str]:
         """Parse ibstatus output for a device."""
-        output = _run(["ibstatus", f"{dev.name}:{dev.port - 1}"])
+        output = self.acq.run(self._ibstatus_cmd(dev))
         if not output:
-            output = _run(["ibstatus", dev.name])
+            output = self.acq.run(["ibstatus", dev.name])
         if not output:
             return {}
         info: dict[str, str] = {}
@@ -80,7 +123,7 @@ class LinkStatusCollector(BaseCollector):
         info: dict[str, str] = {}
 
         # Try mlxcable (Mellanox)
-        output = _run(["mlxcable", "-d", dev.name])
+        output = self.acq.run(self._mlxcable_cmd(dev))
         if output:
             for line in output.splitlines():
                 m = re.match(r"\s*([\w\s]+\w)\s*:\s*(.+)", line)
@@ -90,7 +133,7 @@ class LinkStatusCollector(BaseCollector):
 
         # Fallback: ethtool module info (RoCE)
         if dev.netdev:
-            output = _run(["ethtool", "-m", dev.netdev])
+            output = self.acq.run(["ethtool", "-m", dev.netdev])
             if output:
                 for line in output.splitlines():
                     m = re.match(r"\s*([\w\s/]+\w)\s*:\s*(.+)", line)
@@ -99,48 +142,74 @@ class LinkStatusCollector(BaseCollector):
 
         return info
 
+    def _cable_stale(self, key: str, phys_state: str, flapped: bool,
+                     now: float) -> bool:
+        """Return True if the cached cable info of *key* must be re-read.
+
+        EEPROM reads are slow and the transceiver identity only changes
+        when the module is swapped, which always takes the link through a
+        physical state change.  An empty read says nothing about the
+        module, so it is retried after a short delay.
+        """
+        cached = self._cable_cache.get(key)
+        if cached is None or flapped:
+            return True
+        info, read_at, cached_phys = cached
+        ttl = self.cable_ttl if info else min(self.cable_ttl, _CABLE_RETRY_TTL)
+        return cached_phys != phys_state or now - read_at >= ttl
+
     def _symbol_ber_errors(self, dev: RDMADevice) -> dict[str, int]:
         """Read symbol error and BER-related counters."""
-        base = Path(f"/sys/class/infiniband/{dev.name}/ports/{dev.port}")
-        counters: dict[str, int] = {}
-        for name in ("symbol_error", "link_error_recovery", "link_downed",
-                      "port_rcv_errors", "port_rcv_remote_physical_errors",
-                      "local_link_integrity_errors"):
-            val = _read_sysfs(base / "counters" / name)
-            if val is not None:
-                try:
-                    counters[name] = int(val)
-                except ValueError:
-                    pass
-        return counters
+        cnt_dir = f"{port_dir(dev.name, dev.port)}/counters"
+        return self.acq.read_many(cnt_dir, _BER_COUNTERS)
 
     def _netdev_carrier(self, dev: RDMADevice) -> dict[str, str]:
         """Check Linux netdev carrier state."""
         if not dev.netdev:
             return {}
         info: dict[str, str] = {}
-        carrier = _read_sysfs(Path(f"/sys/class/net/{dev.netdev}/carrier"))
+        base = f"/sys/class/net/{dev.netdev}"
+        carrier = self.acq.read_text(f"{base}/carrier")
         if carrier is not None:
             info["carrier"] = "up" if carrier == "1" else "down"
-        operstate = _read_sysfs(Path(f"/sys/class/net/{dev.netdev}/operstate"))
+        operstate = self.acq.read_text(f"{base}/operstate")
         if operstate is not None:
             info["operstate"] = operstate
-        speed = _read_sysfs(Path(f"/sys/class/net/{dev.netdev}/speed"))
+        speed = self.acq.read_text(f"{base}/speed")
         if speed is not None:
             info["speed_mbps"] = speed
-        mtu = _read_sysfs(Path(f"/sys/class/net/{dev.netdev}/mtu"))
+        mtu = self.acq.read_text(f"{base}/mtu")
         if mtu is not None:
             info["mtu"] = mtu
         return info
 
     def collect(self) -> dict[str, Any]:
         result: dict[str, Any] = {"devices": {}}
+        now = time.monotonic()
+        since, self._last_collect = self._last_collect, now
 
+        states: dict[str, tuple[dict[str, str], bool, dict | None]] = {}
+        refresh: set[str] = set()
         for dev in self.devices:
             key = f"{dev.name}/{dev.port}"
             link_state = self._read_link_state(dev)
-            current_state = link_state.get("state", "unknown")
-            flapped = self._check_link_flap(key, current_state)
+            flapped = self._check_link_flap(key, link_state.get("state", "unknown"))
+            events = self._event_flap_info(key, since)
+            if events is not None and events["flaps_since_last_poll"]:
+                flapped = True
+            states[key] = (link_state, flapped, events)
+            if self._cable_stale(key, link_state.get("phys_state", ""), flapped, now):
+                refresh.add(key)
+
+        # Start the per-device tool calls together
+        cmds = [self._ibstatus_cmd(d) for d in self.devices]
+        cmds += [self._mlxcable_cmd(d) for d in self.devices
+                 if f"{d.name}/{d.port}" in refresh]
+        self.acq.prefetch(cmds)
+
+        for dev in self.devices:
+            key = f"{dev.name}/{dev.port}"
+            link_state, flapped, events = states[key]
 
             dev_data: dict[str, Any] = {
                 "link_state": link_state,
@@ -148,14 +217,24 @@ class LinkStatusCollector(BaseCollector):
                 "total_flap_count": self._flap_counts.get(key, 0),
                 "error_counters": self._symbol_ber_errors(dev),
             }
+            if events is not None:
+                dev_data["link_events"] = events
+                dev_data["total_flap_count"] = max(
+                    events["flap_count"], dev_data["total_flap_count"]
+                )
 
             ibst = self._ibstatus_info(dev)
             if ibst:
                 dev_data["ibstatus"] = ibst
 
-            cable = self._cable_info(dev)
+            if key in refresh:
+                self._cable_cache[key] = (
+                    self._cable_info(dev), now, link_state.get("phys_state", "")
+                )
+            cable, read_at, _ = self._cable_cache[key]
             if cable:
                 dev_data["cable_info"] = cable
+                dev_data["cable_info_age_s"] = round(now - read_at, 1)
 
             if dev.net_type == NetworkType.ROCE:
                 netdev_info = self._netdev_carrier(dev)
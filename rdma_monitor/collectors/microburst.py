@@ -0,0 +1,250 @@
+"""High-frequency microburst sampler for throughput counters.
+
+Regular polls report averages over ``poll_interval``, which hides the
+sub-millisecond to 10 ms incast bursts that hurt collective operations.
+:class:`MicroburstSampler` reads a small set of port counters every
+1-10 ms on a dedicated thread, keeps per-sample rates in preallocated
+NumPy ring buffers, and hands the performance collector a per-interval
+summary (max, p50, p99 and time spent above a utilization threshold).
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any
+
+import numpy as np
+
+from rdma_monitor.utils.counter_matrix import PORT_COUNTER_WIDTHS, counter_deltas
+from rdma_monitor.utils.counter_reader import port_dir
+from rdma_monitor.utils.network_detector import RDMADevice
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COUNTERS = [
+    "port_xmit_data",
+    "port_rcv_data",
+    "port_xmit_wait",
+    "np_ecn_marked_roce_packets",
+]
+
+# Counters in units of 4 octets, for which a link utilization is computed
+_DATA_COUNTERS = {"port_xmit_data", "port_rcv_data"}
+
+_RATE_RE = re.compile(r"([\d.]+)\s*Gb/sec")
+
+
+def _link_bps(dev: RDMADevice) -> float:
+    """Link speed in bits/s from the sysfs ``rate`` attribute (0 if unknown)."""
+    try:
+        with open(f"{port_dir(dev.name, dev.port)}/rate") as fh:
+            m = _RATE_RE.search(fh.read())
+    except OSError:
+        m = None
+    if m is None:
+        m = _RATE_RE.search(dev.rate)
+    return float(m.group(1)) * 1e9 if m else 0.0
+
+
+class MicroburstSampler:
+    """Samples a few counters per port at millisecond granularity.
+
+    Args:
+        devices: Ports to sample.
+        counters: Counter names, looked up under ``counters/`` and then
+                  ``hw_counters/`` of each port.
+        interval_ms: Sampling period.
+        utilization_threshold: Fraction of link speed above which a data
+                               counter sample counts as "hot".
+        buffer_seconds: Ring-buffer length; should cover the longest gap
+                        between two :meth:`summary` calls.
+    """
+
+    def __init__(self, devices: list[RDMADevice],
+                 counters: list[str] | None = None,
+                 interval_ms: float = 5.0,
+                 utilization_threshold: float = 0.8,
+                 buffer_seconds: float = 15.0):
+        self.interval = max(interval_ms, 0.5) / 1000.0
+        self.threshold = utilization_threshold
+        counters = counters or DEFAULT_COUNTERS
+
+        # One series per (port, counter) that exists on this host
+        self._series: list[tuple[str, str]] = []
+        self._paths: list[str] = []
+        widths: list[int] = []
+        link_bps: list[float] = []
+        for dev in devices:
+            base = port_dir(dev.name, dev.port)
+            bps = _link_bps(dev)
+            for name in counters:
+                for sub in ("counters", "hw_counters"):
+                    path = f"{base}/{sub}/{name}"
+                    if os.path.exists(path):
+                        self._series.append((f"{dev.name}/{dev.port}", name))
+                        self._paths.append(path)
+                        # hw_counters are always 64 bits wide
+                        widths.append(PORT_COUNTER_WIDTHS.get(name, 64)
+                                      if sub == "counters" else 64)
+                        link_bps.append(bps if name in _DATA_COUNTERS else 0.0)
+                        break
+
+        n = len(self._series)
+        cap = max(16, int(buffer_seconds / self.interval))
+        self._cap = cap
+        self._rates = np.zeros((n, cap), dtype=np.float64)
+        self._dt = np.zeros(cap, dtype=np.float64)
+        self._width = np.array(widths, dtype=np.uint8)
+        # bits/s per counter unit/s; 0 for series without a utilization
+        bps = np.array(link_bps, dtype=np.float64)
+        self._util_scale = np.where(bps > 0, 32.0 / np.where(bps > 0, bps, 1.0), 0.0)
+        self._head = 0          # samples written in total
+        self._read_pos = 0      # samples already summarized
+
+        self._fds: list[int | None] = [None] * n
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._overruns = 0
+
+    # ------------------------------------------------------------------
+    # Sampling thread
+    # ------------------------------------------------------------------
+
+    def _read(self, i: int) -> int | None:
+        fd = self._fds[i]
+        try:
+            if fd is None:
+                fd = os.open(self._paths[i], os.O_RDONLY | os.O_CLOEXEC)
+                self._fds[i] = fd
+            return int(os.pread(fd, 32, 0))
+        except (OSError, ValueError):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+            self._fds[i] = None
+            return None
+
+    def _sample(self) -> tuple[np.ndarray, np.ndarray]:
+        raw = np.zeros(len(self._paths), dtype=np.uint64)
+        ok = np.ones(len(self._paths), dtype=bool)
+        for i in range(len(self._paths)):
+            val = self._read(i)
+            if val is None:
+                ok[i] = False
+            else:
+                raw[i] = val
+        return raw, ok
+
+    def _run(self) -> None:
+        prev, prev_ok = self._sample()
+        prev_ts = time.monotonic()
+        next_ts = prev_ts + self.interval
+        while not self._stop.is_set():
+            delay = next_ts - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self._overruns += 1
+            next_ts += self.interval
+            if next_ts < time.monotonic():
+                next_ts = time.monotonic() + self.interval
+
+            cur, ok = self._sample()
+            now = time.monotonic()
+            dt = now - prev_ts
+            # Same wrap / reset / saturation rules as the regular rates
+            delta, self._width, _, reset, saturated = counter_deltas(
+                prev, cur, prev_ok, ok, self._width
+            )
+            valid = ok & prev_ok & ~reset & ~saturated & (dt > 0)
+            rates = np.where(valid, delta.astype(np.float64) / (dt if dt > 0 else 1.0),
+                             np.nan)
+
+            with self._lock:
+                col = self._head % self._cap
+                self._rates[:, col] = rates
+                self._dt[col] = dt
+                self._head += 1
+            prev, prev_ok, prev_ts = cur, ok, now
+
+    def start(self) -> None:
+        if self._thread is not None or not self._series:
+            if not self._series:
+                logger.warning("Microburst sampler: no counters to sample")
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="rdma-microburst", daemon=True
+        )
+        self._thread.start()
+        logger.info("Microburst sampler started: %d series every %.1f ms",
+                    len(self._series), self.interval * 1000)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+        for fd in self._fds:
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._fds = [None] * len(self._fds)
+
+    # ------------------------------------------------------------------
+    # Summaries
+    # ------------------------------------------------------------------
+
+    def summary(self) -> dict[str, dict[str, Any]]:
+        """Summarize the samples taken since the previous call.
+
+        Returns:
+            port key -> counter name -> dict with ``samples``,
+            ``max_per_sec``, ``p50_per_sec`` and ``p99_per_sec``; data
+            counters also carry ``max_utilization`` and
+            ``time_above_threshold_ms``.
+        """
+        with self._lock:
+            start = max(self._read_pos, self._head - self._cap)
+            idx = np.arange(start, self._head) % self._cap
+            rates = self._rates[:, idx]
+            dt = self._dt[idx]
+            self._read_pos = self._head
+
+        result: dict[str, dict[str, Any]] = {}
+        if rates.shape[1] == 0:
+            return result
+        with np.errstate(all="ignore"):
+            counts = np.sum(~np.isnan(rates), axis=1)
+            maxes = np.nanmax(np.where(counts[:, None] > 0, rates, 0.0), axis=1)
+            p50, p99 = np.nanpercentile(
+                np.where(counts[:, None] > 0, rates, 0.0), [50, 99], axis=1
+            )
+            util = rates * self._util_scale[:, None]
+            hot = np.nan_to_num(util) >= self.threshold
+            hot_ms = (hot * dt[None, :]).sum(axis=1) * 1000.0
+            max_util = np.nanmax(np.where(counts[:, None] > 0, util, 0.0), axis=1)
+
+        for i, (port, name) in enumerate(self._series):
+            entry: dict[str, Any] = {
+                "samples": int(counts[i]),
+                "max_per_sec": round(float(maxes[i]), 2),
+                "p50_per_sec": round(float(p50[i]), 2),
+                "p99_per_sec": round(float(p99[i]), 2),
+            }
+            if self._util_scale[i] > 0:
+                entry["max_utilization"] = round(float(max_util[i]), 4)
+                entry["time_above_threshold_ms"] = round(float(hot_ms[i]), 2)
+            result.setdefault(port, {})[name] = entry
+        return result
+
+    @property
+    def overruns(self) -> int:
+        """Number of samples taken late because a read overran the period."""
+        return self._overruns
@@ -6,12 +6,14 @@ packet rates, and error counters.
 
 import logging
 import re
-import subprocess
 import time
-from pathlib import Path
 from typing import Any
 
 from rdma_monitor.collectors.base import BaseCollector
+from rdma_monitor.collectors.microburst import MicroburstSampler
+from rdma_monitor.utils.acquisition import Acquisition
+from rdma_monitor.utils.counter_matrix import PORT_COUNTER_WIDTHS, CounterMatrix
+from rdma_monitor.utils.counter_reader import port_dir
 from rdma_monitor.utils.network_detector import RDMADevice, NetworkType
 
 logger = logging.getLogger(__name__)
@@ -42,69 +44,46 @@ _HW_COUNTERS = [
 ]
 
 
-def _read_sysfs_counter(path: Path) -> int | None:
-    try:
-        return int(path.read_text().strip())
-    except (FileNotFoundError, PermissionError, ValueError):
-        return None
-
-
-def _run(cmd: list[str], timeout: int = 10) -> str:
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-        return result.stdout.strip()
-    except Exception:
-        return ""
-
-
 class PerformanceCollector(BaseCollector):
     name = "performance"
 
-    def __init__(self, devices: list[RDMADevice]):
-        super().__init__(devices)
-        self._prev_counters: dict[str, dict[str, int]] = {}
-        self._prev_ts: float = 0
+    def __init__(self, devices: list[RDMADevice],
+                 acq: Acquisition | None = None,
+                 microburst: MicroburstSampler | None = None):
+        super().__init__(devices, acq)
+        self.microburst = microburst
+        self._matrix = CounterMatrix(_PERF_COUNTERS + _HW_COUNTERS,
+                                     PORT_COUNTER_WIDTHS)
 
     def _read_counters(self, dev: RDMADevice) -> dict[str, int | None]:
-        base = Path(f"/sys/class/infiniband/{dev.name}/ports/{dev.port}")
+        base = port_dir(dev.name, dev.port)
         counters: dict[str, int | None] = {}
 
         # Standard counters
         for c in _PERF_COUNTERS:
-            counters[c] = _read_sysfs_counter(base / "counters" / c)
+            counters[c] = self.acq.read_int(f"{base}/counters/{c}")
 
-        # HW counters (may not exist on all cards)
-        hw_dir = base / "hw_counters"
-        if hw_dir.is_dir():
-            for c in _HW_COUNTERS:
-                counters[c] = _read_sysfs_counter(hw_dir / c)
+        # HW counters (may not exist on all cards; the reader backs off
+        # on paths that fail to open)
+        for c in _HW_COUNTERS:
+            counters[c] = self.acq.read_int(f"{base}/hw_counters/{c}")
 
         return counters
 
-    def _compute_rates(self, key: str, current: dict[str, int | None],
-                       elapsed: float) -> dict[str, float]:
-        rates: dict[str, float] = {}
-        prev = self._prev_counters.get(key, {})
-        if not prev or elapsed <= 0:
-            return rates
-        for counter_name, cur_val in current.items():
-            if cur_val is None:
-                continue
-            prev_val = prev.get(counter_name)
-            if prev_val is None:
-                continue
-            delta = cur_val - prev_val
-            if delta < 0:
-                # Counter wrapped
-                delta = cur_val
-            rates[f"{counter_name}_per_sec"] = round(delta / elapsed, 2)
-        return rates
+    def _compute_rates(self, current: dict[str, dict[str, int]], now: float
+                       ) -> dict[str, tuple[dict[str, float], dict[str, str]]]:
+        """Rates and wrap/reset flags for every port in one vectorized pass."""
+        return self._matrix.update(current, now)
+
+    @staticmethod
+    def _perfquery_cmd(dev: RDMADevice) -> list[str]:
+        return ["perfquery", "-x", "-d", dev.name, "-P", str(dev.port)]
 
     def _perfquery(self, dev: RDMADevice) -> dict[str, Any]:
         """Run perfquery for extended counters (IB only)."""
         if dev.net_type != NetworkType.INFINIBAND:
             return {}
-        output = _run(["perfquery", "-x", "-d", dev.name, "-P", str(dev.port)])
+        output = self.acq.run(self._perfquery_cmd(dev))
         if not output:
             return {}
         result: dict[str, Any] = {}
@@ -119,30 +98,39 @@ class PerformanceCollector(BaseCollector):
         """Read ethtool -S stats for RoCE devices."""
         if dev.net_type != NetworkType.ROCE or not dev.netdev:
             return {}
-        output = _run(["ethtool", "-S", dev.netdev])
-        if not output:
-            return {}
-        stats: dict[str, Any] = {}
-        for line in output.splitlines():
-            m = re.match(r"\s+(\S+):\s+(\d+)", line)
-            if m:
-                stats[m.group(1)] = int(m.group(2))
-        return stats
+        return dict(self.acq.ethtool_stats(dev.netdev))
 
     def collect(self) -> dict[str, Any]:
         now = time.monotonic()
-        elapsed = now - self._prev_ts if self._prev_ts > 0 else 0
         result: dict[str, Any] = {"devices": {}}
 
+        # Start the per-device perfquery calls together
+        self.acq.prefetch([self._perfquery_cmd(d) for d in self.devices
+                           if d.net_type == NetworkType.INFINIBAND])
+
+        current: dict[str, dict[str, int]] = {}
         for dev in self.devices:
-            key = f"{dev.name}/{dev.port}"
             counters = self._read_counters(dev)
-            rates = self._compute_rates(key, {k: v for k, v in counters.items() if v is not None}, elapsed)
+            current[f"{dev.name}/{dev.port}"] = {
+                k: v for k, v in counters.items() if v is not None
+            }
+        rates_by_port = self._compute_rates(current, now)
+        bursts = self.microburst.summary() if self.microburst else {}
+
+        for dev in self.devices:
+            key = f"{dev.name}/{dev.port}"
+            rates, flags = rates_by_port[key]
 
             dev_data: dict[str, Any] = {
-                "counters": {k: v for k, v in counters.items() if v is not None},
+                "counters": current[key],
                 "rates": rates,
             }
+            if flags:
+                # Counters that wrapped, were reset or saturated this cycle;
+                # reset/saturated counters have no rate.
+                dev_data["rate_flags"] = flags
+            if key in bursts:
+                dev_data["microburst"] = bursts[key]
 
             # Type-specific extended stats
             if dev.net_type == NetworkType.INFINIBAND:
@@ -156,10 +144,4 @@ class PerformanceCollector(BaseCollector):
 
             result["devices"][key] = dev_data
 
-            # Store for next rate computation
-            self._prev_counters[key] = {
-                k: v for k, v in counters.items() if v is not None
-            }
-
-        self._prev_ts = now
         return result
@@ -4,61 +4,127 @@ Discovers switch connectivity, LID/GID tables, and subnet layout.
 """
 
 import logging
-import re
-import subprocess
-from pathlib import Path
+import os
+import time
 from typing import Any
 
+from rdma_monitor.analysis.routing import (
+    analyze_routes, parse_lfts, routing_report,
+)
 from rdma_monitor.collectors.base import BaseCollector
+from rdma_monitor.utils.acquisition import Acquisition
+from rdma_monitor.utils.counter_reader import port_dir
+from rdma_monitor.utils.fabric_graph import (
+    FabricGraph, diff_graphs, parse_ibnetdiscover,
+)
+from rdma_monitor.utils.link_events import LinkEventListener
 from rdma_monitor.utils.network_detector import RDMADevice, NetworkType
 
 logger = logging.getLogger(__name__)
 
 
-def _run(cmd: list[str], timeout: int = 30) -> str:
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-        return result.stdout.strip()
-    except Exception:
-        return ""
+# Fabric discovery tools walk the whole subnet and can be slow.
+_FABRIC_TIMEOUT = 30
+
+# Fabric-wide dumps outgrow the per-command output limit: an LFT dump holds
+# one line per (switch, LID), about 0.5 GB on a 10k-node fabric, so it is
+# streamed to a temp file and parsed from a mapping rather than buffered.
+_FABRIC_MAX_OUTPUT = 1 << 30
+
+# Maximum link change records kept from one sweep
+_MAX_LINK_CHANGES = 100
 
 
 class TopologyCollector(BaseCollector):
     name = "topology"
 
+    def __init__(self, devices: list[RDMADevice],
+                 acq: Acquisition | None = None,
+                 sweep_interval: float = 1800,
+                 routing: bool = True,
+                 routing_max_links: int = 200,
+                 table_ttl: float = 3600,
+                 link_events: LinkEventListener | None = None):
+        super().__init__(devices, acq)
+        # Last full ibnetdiscover sweep and the changes it found
+        self.sweep_interval = sweep_interval
+        self.graph: FabricGraph | None = None
+        self._graph_at = 0.0
+        self._sweep_info: dict[str, Any] = {}
+        # LFT route analysis, refreshed with every sweep
+        self.routing = routing
+        self.routing_max_links = routing_max_links
+        self._routing: dict[str, Any] = {}
+        # GID / P_Key tables per port: (gids, pkeys, read time, address seq),
+        # plus a per-table sequence number bumped whenever the content changes
+        self.table_ttl = table_ttl
+        self.link_events = link_events
+        self._tables: dict[str, tuple[list, list, float, int]] = {}
+        self._table_seq: dict[str, dict[str, int]] = {}
+
+    def _sweep_fabric(self) -> None:
+        """Run ibnetdiscover, rebuild the graph and diff it with the last one."""
+        output = self.acq.run(["ibnetdiscover"], timeout=_FABRIC_TIMEOUT,
+                              max_output=_FABRIC_MAX_OUTPUT)
+        if not output:
+            return
+        t0 = time.perf_counter()
+        graph = parse_ibnetdiscover(output)
+        info: dict[str, Any] = {
+            "sweep_parse_ms": round((time.perf_counter() - t0) * 1000, 1),
+        }
+        if self.graph is not None:
+            diff = diff_graphs(self.graph, graph)
+            info.update(diff.counts())
+            changes = diff.records(self.graph, graph, limit=_MAX_LINK_CHANGES)
+            if changes:
+                info["link_changes"] = changes
+                logger.warning("Fabric changed: %s", diff.counts())
+        self.graph = graph
+        self._graph_at = time.monotonic()
+        self._sweep_info = info
+        if self.routing:
+            self._routing = self._analyze_routing(graph)
+
+    def _analyze_routing(self, graph: FabricGraph) -> dict[str, Any]:
+        """Per-link route counts and hot spots from the switch LFTs."""
+        output = self.acq.dump(["dump_lfts.sh"], timeout=_FABRIC_TIMEOUT,
+                               max_output=_FABRIC_MAX_OUTPUT)
+        if output is None:
+            return {}
+        t0 = time.perf_counter()
+        lfts = parse_lfts(output)
+        if not lfts:
+            return {}
+        report = routing_report(graph, analyze_routes(graph, lfts),
+                                max_links=self.routing_max_links)
+        report["analysis_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        return report
+
     def _collect_ib_topology(self) -> dict[str, Any]:
-        """Collect IB fabric topology using iblinkinfo / ibnetdiscover."""
-        topo: dict[str, Any] = {}
+        """Collect IB fabric topology from periodic ibnetdiscover sweeps.
 
-        # ibnetdiscover
-        output = _run(["ibnetdiscover"])
-        if output:
-            switches: list[str] = []
-            hcas: list[str] = []
-            for line in output.splitlines():
-                if line.startswith("Switch"):
-                    switches.append(line.strip())
-                elif line.startswith("Ca"):
-                    hcas.append(line.strip())
-            topo["switches_count"] = len(switches)
-            topo["hcas_count"] = len(hcas)
-            topo["switches"] = switches[:50]   # cap output size
-            topo["hcas"] = hcas[:50]
-
-        # iblinkinfo (connection map)
-        output = _run(["iblinkinfo"])
-        if output:
-            links: list[dict[str, str]] = []
-            for line in output.splitlines():
-                line = line.strip()
-                if not line:
-                    continue
-                links.append({"raw": line[:200]})
-            topo["links_count"] = len(links)
-            topo["links_sample"] = links[:30]
+        The full sweep runs every ``sweep_interval`` seconds; in between,
+        the graph summary and the changes found by the last sweep are
+        reported again.
+        """
+        topo: dict[str, Any] = {}
+        sweep = (self.graph is None
+                 or time.monotonic() - self._graph_at >= self.sweep_interval)
+        if sweep:
+            self.acq.prefetch([["ibnetdiscover"]], timeout=_FABRIC_TIMEOUT,
+                              max_output=_FABRIC_MAX_OUTPUT,
+                              dumps=[["dump_lfts.sh"]] if self.routing else None)
+            self._sweep_fabric()
+        if self.graph is not None:
+            topo.update(self.graph.summary())
+            topo["sweep_age_s"] = round(time.monotonic() - self._graph_at, 1)
+            topo.update(self._sweep_info)
+        if self._routing:
+            topo["routing"] = self._routing
 
         # SM info
-        output = _run(["sminfo"])
+        output = self.acq.run(["sminfo"], timeout=_FABRIC_TIMEOUT)
         if output:
             topo["subnet_manager"] = output
 
@@ -68,71 +134,92 @@ class TopologyCollector(BaseCollector):
         """Collect RoCE topology — GID table, DCQCN settings, neighbors."""
         topo: dict[str, Any] = {}
 
-        # Show rdma devices and their links
-        output = _run(["rdma", "link", "show"])
-        if output:
-            topo["rdma_links"] = output.splitlines()
+        # Show rdma devices and their links (netlink, then the rdma CLI)
+        ports = self.acq.rdma_ports()
+        if ports:
+            topo["rdma_links"] = [p.link_line() for p in ports]
+        else:
+            output = self.acq.run(["rdma", "link", "show"], timeout=_FABRIC_TIMEOUT)
+            if output:
+                topo["rdma_links"] = output.splitlines()
 
         return topo
 
     def _collect_gid_table(self, dev: RDMADevice) -> list[dict[str, str]]:
         """Read GID table for a device/port."""
         gids: list[dict[str, str]] = []
-        gid_dir = Path(f"/sys/class/infiniband/{dev.name}/ports/{dev.port}/gids")
-        if not gid_dir.is_dir():
+        base = port_dir(dev.name, dev.port)
+        try:
+            entries = sorted(os.listdir(f"{base}/gids"))
+        except OSError:
             # Fallback: rdma resource show cm_id
             return gids
-        for entry in sorted(gid_dir.iterdir(), key=lambda p: p.name):
-            if not entry.name.isdigit():
+        for index in entries:
+            if not index.isdigit():
                 continue
-            try:
-                gid_val = entry.read_text().strip()
-                if gid_val and gid_val != "0000:0000:0000:0000:0000:0000:0000:0000":
-                    gid_type_path = Path(
-                        f"/sys/class/infiniband/{dev.name}/ports/{dev.port}"
-                        f"/gid_attrs/types/{entry.name}"
-                    )
-                    gid_type = ""
-                    try:
-                        gid_type = gid_type_path.read_text().strip()
-                    except (FileNotFoundError, PermissionError):
-                        pass
-                    gids.append({
-                        "index": entry.name,
-                        "gid": gid_val,
-                        "type": gid_type,
-                    })
-            except (PermissionError, OSError):
-                pass
+            gid_val = self.acq.read_text(f"{base}/gids/{index}")
+            if gid_val and gid_val != "0000:0000:0000:0000:0000:0000:0000:0000":
+                gid_type = self.acq.read_text(f"{base}/gid_attrs/types/{index}")
+                gids.append({
+                    "index": index,
+                    "gid": gid_val,
+                    "type": gid_type or "",
+                })
         return gids
 
     def _collect_lid_info(self, dev: RDMADevice) -> dict[str, Any]:
         """Read LID information for IB devices."""
         info: dict[str, Any] = {}
-        base = Path(f"/sys/class/infiniband/{dev.name}/ports/{dev.port}")
+        base = port_dir(dev.name, dev.port)
         for attr in ("lid", "sm_lid", "sm_sl"):
-            p = base / attr
-            try:
-                info[attr] = p.read_text().strip()
-            except (FileNotFoundError, PermissionError):
-                pass
+            val = self.acq.read_text(f"{base}/{attr}")
+            if val is not None:
+                info[attr] = val
         return info
 
     def _collect_pkey_table(self, dev: RDMADevice) -> list[str]:
         """Read partition key table."""
         pkeys: list[str] = []
-        pkey_dir = Path(f"/sys/class/infiniband/{dev.name}/ports/{dev.port}/pkeys")
-        if not pkey_dir.is_dir():
+        pkey_dir = f"{port_dir(dev.name, dev.port)}/pkeys"
+        try:
+            entries = sorted(os.listdir(pkey_dir))
+        except OSError:
             return pkeys
-        for entry in sorted(pkey_dir.iterdir(), key=lambda p: p.name):
-            try:
-                val = entry.read_text().strip()
-                if val and val != "0x0000":
-                    pkeys.append(val)
-            except (PermissionError, OSError):
-                pass
+        for entry in entries:
+            val = self.acq.read_text(f"{pkey_dir}/{entry}")
+            if val and val != "0x0000":
+                pkeys.append(val)
         return pkeys
 
+    def _port_tables(self, dev: RDMADevice, key: str,
+                     now: float) -> tuple[list, list, float]:
+        """GID and P_Key tables of a port, re-read only when they may differ.
+
+        RoCE GIDs follow the IP addresses of the netdev and its uppers, so
+        they are re-read on any address change reported by the link event
+        listener (every run if no listener follows addresses).  Otherwise
+        the tables are re-read after ``table_ttl`` seconds.
+
+        Returns:
+            (gids, pkeys, monotonic time they were read)
+        """
+        watched = self.link_events is not None and self.link_events.watches_addresses
+        addr_seq = self.link_events.address_seq if watched else 0
+        cached = self._tables.get(key)
+        if cached is not None and now - cached[2] < self.table_ttl:
+            if dev.net_type != NetworkType.ROCE or (watched and cached[3] == addr_seq):
+                return cached[0], cached[1], cached[2]
+
+        gids = self._collect_gid_table(dev)
+        pkeys = self._collect_pkey_table(dev)
+        seq = self._table_seq.setdefault(key, {"gid_table": 0, "pkeys": 0})
+        if cached is None or cached[0] != gids:
+            seq["gid_table"] += 1
+        if cached is None or cached[1] != pkeys:
+            seq["pkeys"] += 1
+        self._tables[key] = (gids, pkeys, now, addr_seq)
+        return gids, pkeys, now
+
     def collect(self) -> dict[str, Any]:
         result: dict[str, Any] = {"devices": {}}
 
@@ -144,14 +231,20 @@ class TopologyCollector(BaseCollector):
         if has_roce:
             result["roce_fabric"] = self._collect_roce_topology()
 
+        now = time.monotonic()
         for dev in self.devices:
             key = f"{dev.name}/{dev.port}"
+            gids, pkeys, read_at = self._port_tables(dev, key, now)
+            seq = self._table_seq[key]
             dev_topo: dict[str, Any] = {
-                "gid_table": self._collect_gid_table(dev),
+                "gid_table": gids,
+                "gid_table_seq": seq["gid_table"],
             }
             if dev.net_type == NetworkType.INFINIBAND:
                 dev_topo["lid_info"] = self._collect_lid_info(dev)
-            dev_topo["pkeys"] = self._collect_pkey_table(dev)
+            dev_topo["pkeys"] = pkeys
+            dev_topo["pkeys_seq"] = seq["pkeys"]
+            dev_topo["tables_age_s"] = round(now - read_at, 1)
             result["devices"][key] = dev_topo
 
         return result
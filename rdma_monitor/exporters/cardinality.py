@@ -0,0 +1,128 @@
+"""Cardinality guard for wide counter dicts before Prometheus export.
+
+``ethtool -S`` on mlx5 reports every counter once per channel
+(``rx<N>_*``, ``tx<N>_*``, ``ch<N>_*``), so a 64-channel NIC alone yields
+tens of thousands of series.  :class:`CardinalityGuard` rewrites the
+guarded dicts (``ethtool_stats``, ``pfc_stats`` by default) of a
+collector's output:
+
+* counters matching a *deny* pattern, or no *allow* pattern when allow
+  patterns are configured, are dropped;
+* counters matching a *rollup* rule are summed per counter family into
+  ``<key>.queues.families.<family>.{sum,queues}``, exported as one series
+  per family with a ``family`` label;
+* everything else is kept as is.
+
+The per-host series budget itself is enforced by the exporter.
+"""
+
+import re
+from typing import Any
+
+DEFAULT_KEYS = ("ethtool_stats", "pfc_stats")
+
+# Per-queue / per-channel mlx5 counters: rx3_packets -> rx_packets
+DEFAULT_ROLLUPS = [
+    {"pattern": r"^(rx|tx)\d+_(.+)$", "family": r"\1_\2"},
+    {"pattern": r"^ch\d+_(.+)$", "family": r"ch_\1"},
+]
+
+# Key of the rollup subtree inside a guarded dict
+ROLLUP_KEY = "queues"
+
+_DROP = object()
+_KEEP = None
+
+
+class CardinalityGuard:
+    """Filters and rolls up guarded counter dicts of collector outputs.
+
+    Args:
+        keys: Dict keys (at any depth) whose counters are guarded.
+        allow: If non-empty, only counters matching one of these regexes
+               are kept or rolled up.
+        deny: Counters matching one of these regexes are dropped.
+        rollups: ``{"pattern": regex, "family": template}`` rules; the
+                 family name is ``match.expand(template)``.  The first
+                 matching rule wins.
+    """
+
+    def __init__(self, keys: list[str] | tuple[str, ...] = DEFAULT_KEYS,
+                 allow: list[str] | None = None,
+                 deny: list[str] | None = None,
+                 rollups: list[dict[str, str]] | None = None):
+        self.keys = frozenset(keys)
+        self._allow = [re.compile(p) for p in allow or []]
+        self._deny = [re.compile(p) for p in deny or []]
+        self._rollups = [
+            (re.compile(r["pattern"]), r["family"])
+            for r in (DEFAULT_ROLLUPS if rollups is None else rollups)
+        ]
+        # Counter name -> _KEEP, _DROP or family name
+        self._actions: dict[str, Any] = {}
+        self.stats: dict[str, dict[str, int]] = {}
+
+    def _classify(self, name: str) -> Any:
+        if any(p.search(name) for p in self._deny):
+            return _DROP
+        if self._allow and not any(p.search(name) for p in self._allow):
+            return _DROP
+        for pattern, family in self._rollups:
+            m = pattern.match(name)
+            if m:
+                return m.expand(family)
+        return _KEEP
+
+    def _filter(self, counters: dict[str, Any], stats: dict[str, int]) -> dict[str, Any]:
+        actions = self._actions
+        kept: dict[str, Any] = {}
+        families: dict[str, dict[str, Any]] = {}
+        for name, value in counters.items():
+            try:
+                action = actions[name]
+            except KeyError:
+                action = actions[name] = self._classify(name)
+            if action is _KEEP or not isinstance(value, (int, float)):
+                kept[name] = value
+            elif action is _DROP:
+                stats["denied"] += 1
+            else:
+                stats["rolled_up"] += 1
+                family = families.get(action)
+                if family is None:
+                    families[action] = {"sum": value, "queues": 1}
+                else:
+                    family["sum"] += value
+                    family["queues"] += 1
+        stats["kept"] += len(kept)
+        stats["families"] += len(families)
+        if families:
+            kept[ROLLUP_KEY] = {"families": families}
+        return kept
+
+    def _walk(self, data: dict[str, Any], stats: dict[str, int]) -> dict[str, Any]:
+        out = data
+        for key, value in data.items():
+            if not isinstance(value, dict):
+                continue
+            new = self._filter(value, stats) if key in self.keys else self._walk(value, stats)
+            if new is not value:
+                if out is data:
+                    out = dict(data)
+                out[key] = new
+        return out
+
+    def rewrite(self, collector_name: str, data: dict[str, Any]) -> dict[str, Any]:
+        """Guarded copy of *data*; *data* itself is never modified.
+
+        Per-call counts (``kept``, ``denied``, ``rolled_up``, ``families``)
+        are stored in ``stats[collector_name]``; the entry is removed when
+        the call found no counters, so stale counts are never reported.
+        """
+        stats = {"kept": 0, "denied": 0, "rolled_up": 0, "families": 0}
+        out = self._walk(data, stats)
+        if any(stats.values()):
+            self.stats[collector_name] = stats
+        else:
+            self.stats.pop(collector_name, None)
+        return out
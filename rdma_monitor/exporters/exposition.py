@@ -0,0 +1,238 @@
+"""Pre-rendered Prometheus exposition and a non-blocking HTTP endpoint.
+
+The exporter renders the registry once per collection cycle into an
+:class:`Exposition` (plain and gzip bodies plus ETags).
+:class:`ExpositionServer` serves the latest one from an asyncio event loop
+on its own thread, so a scrape only copies cached bytes: its cost does not
+depend on the number of metrics, and it never takes a registry lock.
+``If-None-Match`` requests for an unchanged exposition get ``304``.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest
+
+logger = logging.getLogger(__name__)
+
+_PATHS = ("/metrics", "/")
+_REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request",
+            404: "Not Found", 405: "Method Not Allowed",
+            503: "Service Unavailable"}
+
+
+@dataclass(frozen=True)
+class Exposition:
+    """One rendering of a registry in both encodings."""
+
+    body: bytes
+    gzip_body: bytes
+    etag: str
+    gzip_etag: str
+    rendered_at: float
+    render_ms: float
+
+
+def render(registry: CollectorRegistry, previous: Exposition | None = None,
+           compresslevel: int = 6) -> Exposition:
+    """Render *registry*; returns *previous* itself if nothing changed."""
+    t0 = time.perf_counter()
+    body = generate_latest(registry)
+    digest = hashlib.sha1(body).hexdigest()[:20]
+    if previous is not None and previous.etag == f'"{digest}"':
+        return previous
+    gzip_body = gzip.compress(body, compresslevel=compresslevel, mtime=0)
+    return Exposition(
+        body=body,
+        gzip_body=gzip_body,
+        etag=f'"{digest}"',
+        gzip_etag=f'"{digest}-gz"',
+        rendered_at=time.time(),
+        render_ms=round((time.perf_counter() - t0) * 1000, 3),
+    )
+
+
+def _accepts_gzip(value: str) -> bool:
+    for token in value.split(","):
+        coding, _, params = token.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            q = params.strip()
+            try:
+                return not q.startswith("q=") or float(q[2:]) > 0
+            except ValueError:
+                return True
+    return False
+
+
+def _etag_matches(value: str, etag: str) -> bool:
+    for token in value.split(","):
+        token = token.strip()
+        if token == "*" or token.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ExpositionServer:
+    """Serves the exposition returned by *source* over HTTP/1.1.
+
+    Args:
+        source: Returns the latest :class:`Exposition`, or ``None`` before
+                the first rendering (answered with 503).
+        host: Bind address.
+        port: Bind port.
+        timeout: Seconds an idle keep-alive connection is kept open.
+    """
+
+    def __init__(self, source: Callable[[], Exposition | None],
+                 host: str = "0.0.0.0", port: int = 9090, timeout: float = 30.0):
+        self.source = source
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.requests = 0
+        self.not_modified = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._server: asyncio.AbstractServer | None = None
+        self._connections: dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        if self._loop is not None:
+            return
+        loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=loop.run_forever, name="rdma-exposition", daemon=True
+        )
+        self._thread.start()
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._handle, self.host, self.port), loop
+        )
+        try:
+            self._server = future.result()
+        except Exception:
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(timeout=1)
+            loop.close()
+            self._thread = None
+            raise
+        self._loop = loop
+        if self.port == 0:
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    def stop(self) -> None:
+        loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        server = self._server
+
+        async def _close() -> None:
+            if server is not None:
+                server.close()
+            # Idle keep-alive connections would otherwise hold wait_closed();
+            # closing them ends their handlers at the next read.
+            for writer in list(self._connections.values()):
+                writer.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            if server is not None:
+                await server.wait_closed()
+
+        try:
+            asyncio.run_coroutine_threadsafe(_close(), loop).result(timeout=2)
+        except Exception:
+            logger.debug("Exposition server did not close cleanly", exc_info=True)
+        loop.call_soon_threadsafe(loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        loop.close()
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    def _respond(self, method: str, target: str, headers: dict[str, str]
+                 ) -> tuple[int, list[tuple[str, str]], bytes]:
+        if method not in ("GET", "HEAD"):
+            return 405, [("Allow", "GET, HEAD")], b""
+        if target.split("?", 1)[0] not in _PATHS:
+            return 404, [], b""
+        exp = self.source()
+        if exp is None:
+            return 503, [("Retry-After", "5")], b""
+
+        use_gzip = _accepts_gzip(headers.get("accept-encoding", ""))
+        etag = exp.gzip_etag if use_gzip else exp.etag
+        out = [("ETag", etag), ("Vary", "Accept-Encoding")]
+        inm = headers.get("if-none-match")
+        if inm is not None and _etag_matches(inm, etag):
+            self.not_modified += 1
+            return 304, out, b""
+        out.append(("Content-Type", CONTENT_TYPE_LATEST))
+        if use_gzip:
+            out.append(("Content-Encoding", "gzip"))
+            return 200, out, exp.gzip_body
+        return 200, out, exp.body
+
+    async def _handle(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), self.timeout
+                    )
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        asyncio.TimeoutError, ConnectionError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                request = lines[0].split()
+                headers: dict[str, str] = {}
+                for line in lines[1:]:
+                    name, sep, value = line.partition(":")
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+
+                if len(request) != 3 or not request[2].startswith("HTTP/"):
+                    status, out, body = 400, [], b""
+                    keep_alive = False
+                    method = "GET"
+                else:
+                    method, target, version = request
+                    conn = headers.get("connection", "").lower()
+                    keep_alive = (conn == "keep-alive" if version == "HTTP/1.0"
+                                  else conn != "close")
+                    # Requests with a body are not expected; don't parse it
+                    if headers.get("content-length", "0") != "0":
+                        keep_alive = False
+                    status, out, body = self._respond(method, target, headers)
+                self.requests += 1
+
+                lines_out = [f"HTTP/1.1 {status} {_REASONS[status]}"]
+                lines_out += [f"{k}: {v}" for k, v in out]
+                if status != 304:
+                    lines_out.append(f"Content-Length: {len(body)}")
+                if not keep_alive:
+                    lines_out.append("Connection: close")
+                writer.write("\r\n".join(lines_out).encode("latin-1") + b"\r\n\r\n")
+                if method != "HEAD" and body:
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
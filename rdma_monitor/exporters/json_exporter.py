@@ -1,52 +1,354 @@
 """JSON snapshot exporter.
 
-Periodically saves all collected metrics to timestamped JSON files.
+Periodically saves all collected metrics to an append-only store of
+segment files.  Each snapshot is serialized once, as one compact NDJSON
+record, and appended to the current segment
+(``rdma_segment_<first timestamp>.ndjson[.gz|.zst]``); segments rotate
+after a number of records or seconds.  Compressed segments are flushed at
+every record boundary, so everything up to the last save is readable
+while the segment is still open, and a segment cut short by a crash reads
+up to its last complete record.
+
+Every ``keyframe_interval``-th record of a segment (always its first) is
+a keyframe holding the full ``data``; the records in between only hold a
+``delta`` against the previous snapshot (see
+:mod:`~rdma_monitor.exporters.snapshot_delta`), since topology, firmware,
+mlxconfig and cable info rarely change between saves.  Readers rebuild
+any point from the nearest preceding keyframe; :func:`iter_snapshots`
+and :meth:`JsonExporter.get_at` do this.
+
+``latest.json`` always holds the full record and is published with a
+temp-file write plus ``os.replace``, so readers never see a torn file.
+
+Retention works on a :class:`~rdma_monitor.exporters.snapshot_index.SnapshotIndex`
+built once from the file names, so a save never lists the directory.
 """
 
+import gzip
 import json
 import logging
 import os
+import re
 import time
+import zlib
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
+from typing import Any, BinaryIO, Iterator
+
+from rdma_monitor.exporters.snapshot_delta import apply, encode
+from rdma_monitor.exporters.snapshot_index import IndexEntry, SnapshotIndex
+
+try:
+    import zstandard
+except ImportError:     # optional, only needed for compression: zstd
+    zstandard = None
 
 logger = logging.getLogger(__name__)
 
+SEGMENT_PREFIX = "rdma_segment_"
+COMPRESSIONS = {"none": ".ndjson", "gzip": ".ndjson.gz", "zstd": ".ndjson.zst"}
+
+# Records are written as {"timestamp": ..., "epoch": ..., "data"|"delta": ...}
+_RECORD_HEAD_RE = re.compile(
+    rb'^\{"timestamp":"[^"]*","epoch":([-+0-9.eE]+),"(data|delta)":'
+)
+
+
+def _segment_suffix(path: Path) -> str:
+    for compression in ("gzip", "zstd"):
+        if path.name.endswith(COMPRESSIONS[compression]):
+            return compression
+    return "none"
+
+
+_READ_CHUNK = 1 << 16
+
+
+def _gzip_chunks(raw: BinaryIO) -> Iterator[bytes]:
+    """Decompressed chunks of a (multi-member, possibly unfinished) gzip file."""
+    dec = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    while True:
+        chunk = raw.read(_READ_CHUNK)
+        if not chunk:
+            return
+        while chunk:
+            yield dec.decompress(chunk)
+            if dec.eof:
+                chunk = dec.unused_data
+                dec = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            else:
+                chunk = b""
+
+
+def _zstd_chunks(raw: BinaryIO) -> Iterator[bytes]:
+    reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+    while True:
+        chunk = reader.read(_READ_CHUNK)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_lines(path: str | Path) -> Iterator[bytes]:
+    """Yield the complete NDJSON lines of one segment file, oldest first.
+
+    Decompression is incremental, so a truncated tail (a segment still
+    being written or cut short by a crash) only loses its partial record.
+    """
+    path = Path(path)
+    compression = _segment_suffix(path)
+    if compression == "zstd" and zstandard is None:
+        raise RuntimeError(f"zstandard is required to read {path}")
+    with open(path, "rb") as raw:
+        if compression == "gzip":
+            chunks = _gzip_chunks(raw)
+        elif compression == "zstd":
+            chunks = _zstd_chunks(raw)
+        else:
+            chunks = iter(lambda: raw.read(_READ_CHUNK), b"")
+        pending: list[bytes] = []
+        try:
+            for chunk in chunks:
+                pos = 0
+                while (end := chunk.find(b"\n", pos)) >= 0:
+                    pending.append(chunk[pos:end])
+                    yield b"".join(pending)
+                    pending = []
+                    pos = end + 1
+                if pos < len(chunk):
+                    pending.append(chunk[pos:])
+        except (EOFError, zlib.error) as exc:
+            logger.debug("Stopped reading %s at a truncated record: %s", path, exc)
+        except Exception as exc:
+            if zstandard is not None and isinstance(exc, zstandard.ZstdError):
+                logger.debug("Stopped reading %s at a truncated frame: %s", path, exc)
+            else:
+                raise
+
+
+def _is_legacy(path: Path) -> bool:
+    """Whole-file snapshot written by the former per-snapshot exporter."""
+    return path.name.endswith(".json")
+
+
+def iter_segment(path: str | Path) -> Iterator[dict[str, Any]]:
+    """Yield the raw (keyframe or delta) records of one segment, oldest first."""
+    path = Path(path)
+    if _is_legacy(path):
+        with open(path) as fh:
+            yield json.load(fh)
+        return
+    for line in iter_lines(path):
+        try:
+            yield json.loads(line)
+        except ValueError:
+            logger.warning("Skipping corrupt record in %s", path)
+
+
+def record_head(line: bytes) -> tuple[float, bool] | None:
+    """``(epoch, is_keyframe)`` of a record line without parsing its body."""
+    m = _RECORD_HEAD_RE.match(line)
+    if m is None:
+        return None
+    return float(m.group(1)), m.group(2) == b"data"
+
+
+def _resolve(base: dict[str, Any] | None, record: dict[str, Any]
+             ) -> dict[str, Any] | None:
+    """Full record for *record* given the previous snapshot's data."""
+    if "data" in record:
+        return record
+    if base is None:
+        return None
+    return {"timestamp": record["timestamp"], "epoch": record["epoch"],
+            "data": apply(base, record.get("delta", {}))}
+
+
+def iter_snapshots(path: str | Path) -> Iterator[dict[str, Any]]:
+    """Yield the full snapshots of one segment, applying deltas."""
+    data = None
+    for record in iter_segment(path):
+        full = _resolve(data, record)
+        if full is None:
+            logger.warning("Skipping delta without a keyframe in %s", path)
+            continue
+        data = full["data"]
+        yield full
+
+
+def snapshot_at(path: str | Path, epoch: float) -> dict[str, Any] | None:
+    """Newest snapshot of one segment taken at or before *epoch*.
+
+    Only the nearest preceding keyframe and the deltas after it are
+    parsed; other records are skipped by their line prefix.
+    """
+    path = Path(path)
+    if _is_legacy(path):
+        record = next(iter_segment(path), None)
+        return record if record and record.get("epoch", 0) <= epoch else None
+    keyframe: bytes | None = None
+    deltas: list[bytes] = []
+    for line in iter_lines(path):
+        head = record_head(line)
+        if head is None:
+            continue
+        if head[0] > epoch:
+            break
+        if head[1]:
+            keyframe, deltas = line, []
+        elif keyframe is not None:
+            deltas.append(line)
+    if keyframe is None:
+        return None
+    full = json.loads(keyframe)
+    for line in deltas:
+        full = _resolve(full["data"], json.loads(line))
+    return full
+
+
+class _SegmentWriter:
+    """Appends records to one segment file, flushed per record."""
+
+    def __init__(self, path: Path, compression: str, started: float):
+        self.path = path
+        self.started = started
+        self.records = 0
+        self._raw = open(path, "ab")
+        if compression == "gzip":
+            self._stream: Any = gzip.GzipFile(fileobj=self._raw, mode="ab",
+                                              compresslevel=1, mtime=0)
+        elif compression == "zstd":
+            self._stream = zstandard.ZstdCompressor(level=3).stream_writer(
+                self._raw, closefd=False
+            )
+        else:
+            self._stream = None
+        self._compression = compression
+
+    def append(self, line: bytes) -> None:
+        if self._stream is None:
+            self._raw.write(line)
+        else:
+            self._stream.write(line)
+            # Make the record decodable without closing the stream
+            if self._compression == "gzip":
+                self._stream.flush(zlib.Z_SYNC_FLUSH)
+            else:
+                self._stream.flush(zstandard.FLUSH_BLOCK)
+        self._raw.flush()
+        self.records += 1
+
+    @property
+    def size(self) -> int:
+        return self._raw.tell()
+
+    def close(self) -> None:
+        if self._stream is not None:
+            self._stream.close()
+        self._raw.close()
+
 
 class JsonExporter:
-    """Writes metric snapshots to JSON files on disk."""
+    """Writes metric snapshots to segment files on disk.
+
+    Args:
+        snapshot_dir: Directory holding segments and ``latest.json``.
+        compression: ``none``, ``gzip`` or ``zstd`` (needs the optional
+                     ``zstandard`` package; falls back to gzip without it).
+        segment_records: Records per segment before rotating.
+        segment_seconds: Seconds after which a segment is rotated.
+        max_files: Retention: maximum number of segment files (0 = no limit).
+        max_bytes: Retention: maximum total bytes on disk (0 = no limit).
+        max_age: Retention: seconds of history kept (0 = no limit).
+        keyframe_interval: Every n-th record of a segment is a full
+                           keyframe, the others deltas (1 = all full).
+    """
 
-    def __init__(self, snapshot_dir: str = "./snapshots"):
+    def __init__(self, snapshot_dir: str = "./snapshots", compression: str = "gzip",
+                 segment_records: int = 120, segment_seconds: float = 3600,
+                 max_files: int = 1000, max_bytes: int = 0, max_age: float = 0,
+                 keyframe_interval: int = 20):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown snapshot compression: {compression}")
+        if compression == "zstd" and zstandard is None:
+            logger.warning("zstandard is not installed; compressing snapshots with gzip")
+            compression = "gzip"
         self.snapshot_dir = Path(snapshot_dir)
         self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        self.compression = compression
+        self.segment_records = max(1, segment_records)
+        self.segment_seconds = segment_seconds
         self._latest_path = self.snapshot_dir / "latest.json"
+        self._segment: _SegmentWriter | None = None
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.index = SnapshotIndex(self.snapshot_dir, sizes=bool(max_bytes))
+        self._entry: IndexEntry | None = None
+        self.keyframe_interval = max(1, keyframe_interval)
+        # Serialized subtrees of the previous snapshot, for deltas
+        self._prev: Any = None
+
+    def _segment_for(self, ts: datetime, epoch: float) -> _SegmentWriter:
+        seg = self._segment
+        if seg is not None and (seg.records >= self.segment_records
+                                or epoch - seg.started >= self.segment_seconds):
+            seg.close()
+            seg = None
+        if seg is None:
+            stem = f"{SEGMENT_PREFIX}{ts.strftime('%Y%m%dT%H%M%SZ')}"
+            suffix = COMPRESSIONS[self.compression]
+            # Several segments started within one second are ordered by a
+            # sequence number after the newest indexed one
+            newest = self.index.newest
+            n = newest.seq + 1 if newest and newest.start == int(epoch) else 0
+            path = self.snapshot_dir / (f"{stem}_{n}{suffix}" if n else f"{stem}{suffix}")
+            while path.exists():
+                n += 1
+                path = self.snapshot_dir / f"{stem}_{n}{suffix}"
+            seg = _SegmentWriter(path, self.compression, epoch)
+            self._segment = seg
+            self._entry = self.index.add(path)
+        return seg
 
     def save(self, data: dict[str, Any]) -> Path:
-        """Save a snapshot and update the ``latest.json`` symlink/copy.
+        """Append a snapshot to the current segment and publish ``latest.json``.
 
         Returns:
-            Path to the written snapshot file.
+            Path to the segment the snapshot was written to.
         """
         ts = datetime.now(timezone.utc)
-        filename = f"rdma_snapshot_{ts.strftime('%Y%m%dT%H%M%SZ')}.json"
-        filepath = self.snapshot_dir / filename
-
-        snapshot = {
-            "timestamp": ts.isoformat(),
-            "epoch": time.time(),
-            "data": data,
-        }
+        epoch = ts.timestamp()
+        seg = self._segment_for(ts, epoch)
+        if self.keyframe_interval == 1:
+            snapshot = {"timestamp": ts.isoformat(), "epoch": epoch, "data": data}
+            line = json.dumps(snapshot, separators=(",", ":"), default=str).encode() + b"\n"
+            record = line
+        else:
+            # Deltas compare the serialized text of each subtree, i.e. what
+            # readers will see, not the live objects, which collectors may
+            # reuse between cycles
+            prev = self._prev if seg.records % self.keyframe_interval else None
+            text, self._prev, delta = encode(data, prev)
+            head = f'{{"timestamp":{json.dumps(ts.isoformat())},"epoch":{json.dumps(epoch)},'
+            line = f'{head}"data":{text}}}\n'.encode()
+            record = line if delta is None else f'{head}"delta":{delta}}}\n'.encode()
+        seg.append(record)
+        self.index.resize(self._entry, seg.size)
 
-        with open(filepath, "w") as fh:
-            json.dump(snapshot, fh, indent=2, default=str)
+        tmp = self._latest_path.with_name(f".{self._latest_path.name}.tmp")
+        with open(tmp, "wb") as fh:
+            fh.write(line)
+        os.replace(tmp, self._latest_path)
 
-        # Overwrite latest.json for easy access
-        with open(self._latest_path, "w") as fh:
-            json.dump(snapshot, fh, indent=2, default=str)
+        logger.info("Saved snapshot to %s (%d bytes)", seg.path, len(record))
+        return seg.path
 
-        logger.info("Saved snapshot to %s", filepath)
-        return filepath
+    def close(self) -> None:
+        """Finish the current segment (writes the compression trailer)."""
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
 
     def get_latest(self) -> dict[str, Any] | None:
         """Read and return the latest snapshot, or None."""
@@ -55,20 +357,38 @@ class JsonExporter:
         with open(self._latest_path, "r") as fh:
             return json.load(fh)
 
-    def cleanup(self, max_files: int = 1000) -> int:
-        """Remove oldest snapshots if count exceeds *max_files*.
+    def get_at(self, epoch: float) -> dict[str, Any] | None:
+        """Snapshot that was current at *epoch* (the newest at or before it)."""
+        # Names have one-second resolution; include the segment before
+        for path in reversed(self.index.between(epoch - 1, epoch)):
+            try:
+                record = snapshot_at(path, epoch)
+            except FileNotFoundError:
+                continue
+            if record is not None:
+                return record
+        return None
+
+    def segments(self) -> list[Path]:
+        """Segment files, oldest first."""
+        return self.index.paths()
+
+    def cleanup(self, max_files: int | None = None) -> int:
+        """Apply the retention policies, oldest segments first.
+
+        Args:
+            max_files: Overrides the configured file count limit.
 
-        Returns number of files removed.
+        The segment being written is never removed.  Returns number of
+        files removed.
         """
-        files = sorted(
-            self.snapshot_dir.glob("rdma_snapshot_*.json"),
-            key=lambda p: p.stat().st_mtime,
+        removed = self.index.evict(
+            time.time(),
+            max_files=self.max_files if max_files is None else max_files,
+            max_bytes=self.max_bytes,
+            max_age=self.max_age,
+            keep=self._segment.path if self._segment else None,
         )
-        removed = 0
-        while len(files) > max_files:
-            oldest = files.pop(0)
-            oldest.unlink()
-            removed += 1
         if removed:
-            logger.info("Cleaned up %d old snapshots", removed)
-        return removed
+            logger.info("Cleaned up %d old snapshot segments", len(removed))
+        return len(removed)
@@ -2,35 +2,217 @@
 
 Flattens the nested metric dicts from collectors into Prometheus gauges
 and serves them via an HTTP endpoint.
+
+Flattening is compiled once per collector into a tree of :class:`_Node`
+plans that mirror the collector's output and hold the bound gauge (or
+labelled child) of every leaf, so a regular cycle only walks the data and
+calls ``set``.  A node whose keys or value kinds change is recompiled in
+place; the rest of the plan is kept.
+
+In ``snapshot`` mode no gauges are kept at all: :meth:`update` swaps in a
+new merged snapshot and :class:`SnapshotCollector` builds the metric
+families from it at scrape time, so series that vanish from the data
+vanish from the exposition too.
+
+Dicts under a ``devices`` key become a ``device`` label, dicts under a
+``families`` key a ``family`` label.  An optional
+:class:`~rdma_monitor.exporters.cardinality.CardinalityGuard` rewrites
+wide counter dicts first, and ``max_series`` caps the number of series
+exported per host.
+
+The registry is rendered (and gzip-compressed) once per
+:meth:`PrometheusExporter.update_all`; scrapes are answered from those
+cached bytes by :class:`~rdma_monitor.exporters.exposition.ExpositionServer`.
 """
 
 import logging
+import re
 import threading
-from typing import Any
+from typing import Any, Iterator
 
-from prometheus_client import Gauge, start_http_server, CollectorRegistry
+from prometheus_client import Gauge, CollectorRegistry
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from rdma_monitor.exporters.cardinality import CardinalityGuard
+from rdma_monitor.exporters.exposition import Exposition, ExpositionServer, render
 
 logger = logging.getLogger(__name__)
 
+# Plan entry kinds
+_SKIP, _LEAF, _LIST, _DICT = range(4)
+
+_NUMBER_TYPES = frozenset((int, float, bool))
+
+_SANITIZE = str.maketrans({"/": "_", "-": "_", ".": "_", " ": "_"})
+
+# Keys whose dict children become a label instead of a name component
+_LABEL_KEYS = {"devices": "device", "families": "family"}
+
+
+def _kind(value: Any) -> int:
+    if isinstance(value, dict):
+        return _DICT
+    if isinstance(value, (int, float)):
+        return _LEAF
+    if isinstance(value, list):
+        return _LIST
+    return _SKIP
+
+
+class _Node:
+    """Compiled flattening plan of one dict in a collector's output.
+
+    ``entries`` holds ``(key, kind, payload)``: the bound gauge/child for
+    leaves and lists, a child :class:`_Node` for dicts and the value's
+    type for skipped keys.  *path* and *labels* are kept so the node can
+    be recompiled on its own.
+    """
+
+    __slots__ = ("keys", "entries", "path", "labels", "label")
+
+    def __init__(self, path: str, labels: dict[str, str], label: str | None = None):
+        self.path = path
+        self.labels = labels
+        self.label = label          # children are dicts labelled by key
+        self.keys: frozenset = frozenset()
+        self.entries: list[tuple[str, int, Any]] = []
+
+
+class _ShapeChanged(Exception):
+    pass
+
+
+_METRIC_NAME_RE = re.compile(r"^[a-zA-Z_:][a-zA-Z0-9_:]*$")
+
+
+class SnapshotCollector(Collector):
+    """Builds gauge families from an exporter's latest snapshot per scrape.
+
+    The exporter replaces its snapshot reference wholesale, so a scrape
+    reads one consistent snapshot without taking any lock.
+    """
+
+    def __init__(self, exporter: "PrometheusExporter"):
+        self._exporter = exporter
+
+    def describe(self) -> list:
+        # Metric names are only known once data arrives
+        return []
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        exporter = self._exporter
+        snapshot = exporter._snapshot
+        budget = exporter.max_series or float("inf")
+        count = dropped = 0
+        series: dict[str, tuple[list[str], dict[tuple[str, ...], float]]] = {}
+        for collector_name, data in snapshot.items():
+            exempt = collector_name == exporter.STATS_COLLECTOR
+            for metric_name, labels, value in exporter._flatten(data, collector_name):
+                entry = series.get(metric_name)
+                if entry is None:
+                    if not _METRIC_NAME_RE.match(metric_name):
+                        continue
+                    entry = series[metric_name] = (sorted(labels), {})
+                label_keys, samples = entry
+                if len(labels) != len(label_keys):
+                    logger.debug("Label mismatch for metric %s", metric_name)
+                    continue
+                try:
+                    label_values = tuple(labels[k] for k in label_keys)
+                except KeyError:
+                    logger.debug("Label mismatch for metric %s", metric_name)
+                    continue
+                if label_values not in samples and not exempt:
+                    if count >= budget:
+                        dropped += 1
+                        continue
+                    count += 1
+                samples[label_values] = value
+        exporter._snapshot_series = count
+        exporter._snapshot_dropped = dropped
+
+        for metric_name, (label_keys, samples) in series.items():
+            if not samples:
+                continue
+            family = GaugeMetricFamily(metric_name, metric_name, labels=label_keys)
+            for label_values, value in samples.items():
+                family.add_metric(list(label_values), value)
+            yield family
+
 
 class PrometheusExporter:
-    """Dynamically creates and updates Prometheus gauges from collector data."""
+    """Dynamically creates and updates Prometheus gauges from collector data.
 
-    def __init__(self, prefix: str = "rdma", host: str = "0.0.0.0", port: int = 9090):
+    Args:
+        prefix: Metric name prefix.
+        host: Address the HTTP endpoint binds to.
+        port: HTTP port.
+        mode: ``gauges`` keeps one long-lived gauge per metric;
+              ``snapshot`` serves the latest data through
+              :class:`SnapshotCollector` and drops vanished series.
+        guard: Filters/rolls up wide counter dicts before export.
+        max_series: Series budget (0 = unlimited).  Gauges mode refuses
+                    series beyond it for good; snapshot mode drops the
+                    excess at every scrape.
+    """
+
+    MODES = ("gauges", "snapshot")
+
+    # Pseudo-collector carrying the exporter's own cardinality statistics;
+    # never subject to the series budget.
+    STATS_COLLECTOR = "cardinality"
+
+    def __init__(self, prefix: str = "rdma", host: str = "0.0.0.0", port: int = 9090,
+                 mode: str = "gauges", guard: CardinalityGuard | None = None,
+                 max_series: int = 0):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown Prometheus exporter mode: {mode}")
         self.prefix = prefix
         self.host = host
         self.port = port
+        self.mode = mode
+        self.guard = guard
+        self.max_series = max_series
+        self._stats_prefix = f"{prefix}_{self.STATS_COLLECTOR}_"
+        # Series bound in gauges mode / counted at the last snapshot render
+        self._series: set[tuple[str, tuple[str, ...]]] = set()
+        self._refused: set[tuple[str, tuple[str, ...]]] = set()
+        self._snapshot_series = 0
+        self._snapshot_dropped = 0
         self.registry = CollectorRegistry()
         self._gauges: dict[str, Gauge] = {}
+        self._plans: dict[str, _Node] = {}
         self._lock = threading.Lock()
-        self._started = False
+        self.recompiles = 0
+        # Latest data per collector; replaced, never mutated, in snapshot mode
+        self._snapshot: dict[str, dict[str, Any]] = {}
+        if mode == "snapshot":
+            self.registry.register(SnapshotCollector(self))
+        self._exposition: Exposition | None = None
+        self._server: ExpositionServer | None = None
 
     def start(self) -> None:
-        if self._started:
+        if self._server is not None:
             return
-        start_http_server(self.port, addr=self.host, registry=self.registry)
-        self._started = True
-        logger.info("Prometheus exporter listening on %s:%d", self.host, self.port)
+        self.render()
+        self._server = ExpositionServer(self.exposition, self.host, self.port)
+        self._server.start()
+        logger.info("Prometheus exporter listening on %s:%d", self.host, self._server.port)
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.stop()
+            self._server = None
+
+    def render(self) -> Exposition:
+        """Re-render the exposition served to scrapers."""
+        self._exposition = render(self.registry, self._exposition)
+        return self._exposition
+
+    def exposition(self) -> Exposition | None:
+        """Latest rendered exposition (``None`` before the first render)."""
+        return self._exposition
 
     def _get_or_create_gauge(self, metric_name: str, labels: list[str],
                               doc: str = "") -> Gauge:
@@ -48,7 +230,10 @@ class PrometheusExporter:
                  labels: dict[str, str] | None = None,
                  result: list[tuple[str, dict[str, str], float]] | None = None
                  ) -> list[tuple[str, dict[str, str], float]]:
-        """Recursively flatten a nested dict into (metric_name, labels, value) tuples."""
+        """Recursively flatten a nested dict into (metric_name, labels, value) tuples.
+
+        Uncompiled equivalent of the plans built by :meth:`_compile`.
+        """
         if result is None:
             result = []
         if labels is None:
@@ -61,11 +246,12 @@ class PrometheusExporter:
 
             current_path = f"{path}_{key}" if path else key
 
-            if key == "devices" and isinstance(value, dict):
-                for dev_key, dev_data in value.items():
-                    if isinstance(dev_data, dict):
-                        new_labels = {**labels, "device": dev_key}
-                        self._flatten(dev_data, path, new_labels, result)
+            label = _LABEL_KEYS.get(key)
+            if label and isinstance(value, dict):
+                for label_value, child in value.items():
+                    if isinstance(child, dict):
+                        new_labels = {**labels, label: label_value}
+                        self._flatten(child, path, new_labels, result)
                 continue
 
             if isinstance(value, dict):
@@ -84,19 +270,126 @@ class PrometheusExporter:
 
         return result
 
+    # ------------------------------------------------------------------
+    # Compiled plans
+    # ------------------------------------------------------------------
+
+    def _admit(self, metric_name: str, labels: dict[str, str]) -> bool:
+        """Whether a gauges-mode series fits in the series budget."""
+        if metric_name.startswith(self._stats_prefix):
+            return True
+        key = (metric_name, tuple(sorted(labels.items())))
+        if key in self._series:
+            return True
+        if self.max_series and len(self._series) >= self.max_series:
+            if key not in self._refused:
+                self._refused.add(key)
+                logger.debug("Series budget exhausted, dropping %s", metric_name)
+            return False
+        self._series.add(key)
+        return True
+
+    def _bind(self, metric_name: str, labels: dict[str, str]) -> Any:
+        """Gauge or labelled child that *metric_name* with *labels* sets."""
+        if not self._admit(metric_name, labels):
+            return None
+        try:
+            gauge = self._get_or_create_gauge(metric_name, sorted(labels))
+            return gauge.labels(**labels) if labels else gauge
+        except Exception:
+            logger.debug("Failed to export metric %s", metric_name, exc_info=True)
+            return None
+
+    def _compile(self, node: _Node, data: dict) -> None:
+        """(Re)build *node* for *data* and set its values."""
+        self.recompiles += 1
+        entries: list[tuple[str, int, Any]] = []
+        for key, value in data.items():
+            if node.label:
+                # Non-dict labelled entries are not exported
+                if isinstance(value, dict):
+                    child = _Node(node.path, {**node.labels, node.label: key})
+                    self._compile(child, value)
+                    entries.append((key, _DICT, child))
+                else:
+                    entries.append((key, _SKIP, type(value)))
+                continue
+            if key.startswith("_"):
+                entries.append((key, _SKIP, None))
+                continue
+
+            current_path = f"{node.path}_{key}" if node.path else key
+            kind = _kind(value)
+            if kind == _DICT:
+                if key in _LABEL_KEYS:
+                    child = _Node(node.path, node.labels, _LABEL_KEYS[key])
+                else:
+                    child = _Node(current_path, node.labels)
+                self._compile(child, value)
+                entries.append((key, kind, child))
+            elif kind == _LEAF:
+                bound = self._bind(
+                    f"{self.prefix}_{current_path}".translate(_SANITIZE), node.labels
+                )
+                if bound is not None:
+                    bound.set(value)
+                entries.append((key, kind, bound))
+            elif kind == _LIST:
+                bound = self._bind(
+                    f"{self.prefix}_{current_path}_count".translate(_SANITIZE),
+                    node.labels,
+                )
+                if bound is not None:
+                    bound.set(len(value))
+                entries.append((key, kind, bound))
+            else:
+                entries.append((key, kind, type(value)))
+        node.keys = frozenset(data)
+        node.entries = entries
+
+    def _apply(self, node: _Node, data: dict) -> None:
+        """Set the values of *data* through *node*, recompiling on change."""
+        try:
+            if data.keys() != node.keys:
+                raise _ShapeChanged
+            for key, kind, payload in node.entries:
+                value = data[key]
+                if kind == _LEAF:
+                    if type(value) not in _NUMBER_TYPES and _kind(value) != _LEAF:
+                        raise _ShapeChanged
+                    if payload is not None:
+                        payload.set(value)
+                elif kind == _DICT:
+                    if not isinstance(value, dict):
+                        raise _ShapeChanged
+                    self._apply(payload, value)
+                elif kind == _LIST:
+                    if not isinstance(value, list):
+                        raise _ShapeChanged
+                    if payload is not None:
+                        payload.set(len(value))
+                elif payload is not None and type(value) is not payload:
+                    raise _ShapeChanged
+        except _ShapeChanged:
+            self._compile(node, data)
+
     def update(self, collector_name: str, data: dict[str, Any]) -> None:
         """Update Prometheus metrics from a collector's output."""
-        flat = self._flatten(data, path=collector_name)
-        for metric_name, labels, value in flat:
-            label_keys = sorted(labels.keys())
-            try:
-                gauge = self._get_or_create_gauge(metric_name, label_keys)
-                if label_keys:
-                    gauge.labels(**labels).set(value)
-                else:
-                    gauge.set(value)
-            except Exception:
-                logger.debug("Failed to export metric %s", metric_name, exc_info=True)
+        if self.guard is not None:
+            data = self.guard.rewrite(collector_name, data)
+        if self.mode == "snapshot":
+            self._snapshot = {**self._snapshot, collector_name: data}
+            return
+        self._export(collector_name, data)
+
+    def _export(self, collector_name: str, data: dict[str, Any]) -> None:
+        plan = self._plans.get(collector_name)
+        if plan is None:
+            plan = _Node(collector_name, {})
+            self._plans[collector_name] = plan
+            self._compile(plan, data)
+        else:
+            self._apply(plan, data)
 
     def update_all(self, all_data: dict[str, dict[str, Any]]) -> None:
         """Update metrics from all collectors at once.
@@ -104,5 +397,34 @@ class PrometheusExporter:
         Args:
             all_data: mapping of collector_name -> collector output dict
         """
-        for collector_name, data in all_data.items():
-            self.update(collector_name, data)
+        if self.guard is not None:
+            all_data = {name: self.guard.rewrite(name, data)
+                        for name, data in all_data.items()}
+        if self.mode == "snapshot":
+            self._snapshot = {**self._snapshot, **all_data,
+                              self.STATS_COLLECTOR: self.cardinality_stats()}
+        else:
+            for collector_name, data in all_data.items():
+                self._export(collector_name, data)
+            self._export(self.STATS_COLLECTOR, self.cardinality_stats())
+        if self._server is not None:
+            self.render()
+
+    def cardinality_stats(self) -> dict[str, Any]:
+        """Series count, budget drops and per-collector guard counts.
+
+        In snapshot mode ``series``/``budget_dropped`` describe the most
+        recent rendering.
+        """
+        if self.mode == "snapshot":
+            series, dropped = self._snapshot_series, self._snapshot_dropped
+        else:
+            series, dropped = len(self._series), len(self._refused)
+        stats: dict[str, Any] = {
+            "max_series": self.max_series,
+            "series": series,
+            "budget_dropped": dropped,
+        }
+        if self.guard is not None:
+            stats.update(self.guard.stats)
+        return stats
@@ -0,0 +1,180 @@
+"""Structural diffs between consecutive snapshots.
+
+A delta describes, per dict level, what changed between two JSON-like
+snapshots::
+
+    {"c": {key: new value},     # changed or added values (replaced whole)
+     "d": [key, ...],           # removed keys
+     "n": {key: delta}}         # nested dicts with their own delta
+
+Empty parts are omitted, and identical snapshots give ``{}``.  Lists and
+scalars are compared by value and replaced whole.  :func:`apply` builds
+the new snapshot sharing every unchanged subtree with the old one, so
+neither input is modified.
+
+:func:`encode` produces the same kind of delta while serializing, from
+the JSON text of the previous snapshot's subtrees rather than its values.
+"""
+
+import json
+from typing import Any
+
+_encode = json.JSONEncoder(separators=(",", ":"), default=str).encode
+
+# Values compared by value in leaf dicts; anything else (lists, objects
+# written as str()) may be mutated in place and counts as changed
+_SCALARS = frozenset((str, int, float, bool, type(None)))
+_MISSING = object()
+
+
+def diff(old: dict[str, Any], new: dict[str, Any]) -> dict[str, Any]:
+    """Delta turning *old* into *new*."""
+    changed: dict[str, Any] = {}
+    nested: dict[str, Any] = {}
+    added = 0
+    for key, value in new.items():
+        if key not in old:
+            changed[key] = value
+            added += 1
+            continue
+        prev = old[key]
+        if prev is value:
+            continue
+        if isinstance(value, dict) and isinstance(prev, dict):
+            sub = diff(prev, value)
+            if sub:
+                nested[key] = sub
+        elif type(prev) is not type(value) or prev != value:
+            changed[key] = value
+    delta: dict[str, Any] = {}
+    if changed:
+        delta["c"] = changed
+    if len(new) - added != len(old):
+        delta["d"] = [k for k in old if k not in new]
+    if nested:
+        delta["n"] = nested
+    return delta
+
+
+def apply(base: dict[str, Any], delta: dict[str, Any]) -> dict[str, Any]:
+    """Snapshot obtained by applying *delta* to *base*."""
+    if not delta:
+        return base
+    out = dict(base)
+    for key in delta.get("d", ()):
+        out.pop(key, None)
+    out.update(delta.get("c", {}))
+    for key, sub in delta.get("n", {}).items():
+        out[key] = apply(out.get(key, {}), sub)
+    return out
+
+
+# ----------------------------------------------------------------------
+# Serialization-level deltas
+# ----------------------------------------------------------------------
+
+def _key_text(key: Any) -> str:
+    if isinstance(key, str):
+        return _encode(key)
+    # Non-string keys as json.dumps writes them ("1", "true", "null")
+    return _encode({key: 0})[1:-3]
+
+
+def _leaf_delta(old: dict[Any, Any], new: dict[Any, Any]) -> str | None:
+    """Delta text between two dicts of plain values, or None when most
+    values changed and replacing the dict whole is smaller."""
+    changed = {
+        key: value for key, value in new.items()
+        if type(value) not in _SCALARS
+        or type(old.get(key, _MISSING)) is not type(value)
+        or old[key] != value
+    }
+    if 2 * len(changed) > len(new):
+        return None
+    delta: dict[str, Any] = {}
+    if changed:
+        delta["c"] = changed
+    removed = [key for key in old if key not in new]
+    if removed:
+        delta["d"] = [key if isinstance(key, str) else json.loads(_key_text(key))
+                      for key in removed]
+    return _encode(delta)
+
+
+def _encode_node(value: Any, prev: Any) -> tuple[str, Any, str | None]:
+    """``(text, tree, delta)`` of *value* against the tree *prev*.
+
+    *delta* is ``""`` when nothing changed and None when the parent must
+    replace *value* whole.  Leaves of the tree are ``(text, values)``
+    tuples, *values* being a shallow copy of a leaf dict, or None for
+    other values and for leaf dicts found to change mostly as a whole
+    (compared key by key again only after the next keyframe).
+    """
+    was_leaf = isinstance(prev, tuple)
+    # A leaf stays one; dicts gaining nested dicts are then replaced whole
+    if was_leaf or not (isinstance(value, dict)
+                        and any(isinstance(v, dict) for v in value.values())):
+        text = _encode(value)
+        if was_leaf and text == prev[0]:
+            return text, prev, ""
+        if not was_leaf:
+            return text, (text, dict(value) if isinstance(value, dict) else None), None
+        if prev[1] is None or not isinstance(value, dict):
+            return text, (text, None), None
+        delta = _leaf_delta(prev[1], value)
+        return text, (text, None if delta is None else dict(value)), delta
+
+    old = prev if isinstance(prev, dict) else None
+    tree: dict[str, Any] = {}
+    parts: list[str] = []
+    changed: list[str] = []
+    nested: list[str] = []
+    for key, child in value.items():
+        key_text = _key_text(key)
+        text, tree[key_text], delta = _encode_node(
+            child, None if old is None else old.get(key_text)
+        )
+        parts.append(f"{key_text}:{text}")
+        if delta is None:
+            changed.append(parts[-1])
+        elif delta:
+            nested.append(f"{key_text}:{delta}")
+    text = "{" + ",".join(parts) + "}"
+    if old is None:
+        return text, tree, None
+
+    delta_parts = []
+    if changed:
+        delta_parts.append('"c":{' + ",".join(changed) + "}")
+    removed = [key_text for key_text in old if key_text not in tree]
+    if removed:
+        delta_parts.append('"d":[' + ",".join(removed) + "]")
+    if nested:
+        delta_parts.append('"n":{' + ",".join(nested) + "}")
+    return text, tree, "{" + ",".join(delta_parts) + "}" if delta_parts else ""
+
+
+def encode(data: dict[str, Any], prev: Any = None) -> tuple[str, Any, str | None]:
+    """Serialize *data* to compact JSON together with its delta against *prev*.
+
+    Nested dicts are serialized level by level down to the dicts that hold
+    no dicts, which are serialized whole.  The returned tree keeps the text
+    of those leaves, so the next call finds unchanged subtrees by comparing
+    strings, without parsing or walking their values; a leaf dict that changed
+    is compared key by key against a shallow copy of its previous values,
+    or replaced whole when most of them changed.  Values json cannot
+    serialize are written as ``str()``, as with ``json.dumps(default=str)``.
+
+    Args:
+        data: Snapshot to serialize.
+        prev: Tree returned by the previous call, or None.
+
+    Returns:
+        ``(text, tree, delta)``: the JSON text of *data*, the tree for the
+        next call and the JSON text of a delta for :func:`apply` (None
+        without *prev*, or when *data* must be stored in full).
+    """
+    text, tree, delta = _encode_node(data, prev)
+    if delta == "":
+        delta = "{}"
+    return text, tree, delta
@@ -0,0 +1,158 @@
+"""In-memory index of snapshot segment files.
+
+Segment names encode their first record's UTC time
+(``rdma_segment_20250101T120000Z[_n].ndjson.gz``), so the index is built
+once from a directory listing, without reading or ``stat()``-ing files
+unless a byte budget needs their sizes.  Entries are kept oldest first in
+a deque: retention evicts from the left in O(1) per file and time-range
+lookups bisect the start times.  Files written by the older per-snapshot
+exporter (``rdma_snapshot_<time>.json``) are indexed the same way.
+
+The writer adds and evicts entries while queries may read the index from
+other threads; every access takes the index lock, and lookups return
+copies.
+"""
+
+import bisect
+import logging
+import os
+import re
+import threading
+from calendar import timegm
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+_NAME_RE = re.compile(
+    r"^rdma_(?:segment|snapshot)_(\d{4})(\d{2})(\d{2})T(\d{2})(\d{2})(\d{2})Z"
+    r"(?:_(\d+))?\.(?:ndjson|json)"
+)
+
+
+def parse_name(name: str) -> tuple[float, int] | None:
+    """``(start epoch, sequence)`` encoded in a snapshot file name."""
+    m = _NAME_RE.match(name)
+    if m is None:
+        return None
+    parts = [int(g) for g in m.groups()[:6]]
+    return float(timegm((*parts, 0, 0, 0))), int(m.group(7) or 0)
+
+
+@dataclass
+class IndexEntry:
+    start: float
+    seq: int
+    path: Path
+    size: int = 0
+
+
+class SnapshotIndex:
+    """Oldest-first index of the snapshot files in one directory.
+
+    Args:
+        directory: Snapshot directory to scan.
+        sizes: ``stat()`` every file once at startup to learn its size
+               (only needed for a byte budget).
+    """
+
+    def __init__(self, directory: str | Path, sizes: bool = False):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        found: list[IndexEntry] = []
+        with os.scandir(self.directory) as it:
+            for dirent in it:
+                key = parse_name(dirent.name)
+                if key is None or not dirent.is_file():
+                    continue
+                size = dirent.stat().st_size if sizes else 0
+                found.append(IndexEntry(key[0], key[1], Path(dirent.path), size))
+        found.sort(key=lambda e: (e.start, e.seq, e.path.name))
+        self._entries: deque[IndexEntry] = deque(found)
+        self._starts: deque[float] = deque(e.start for e in found)
+        self.total_bytes = sum(e.size for e in found)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def paths(self) -> list[Path]:
+        with self._lock:
+            return [e.path for e in self._entries]
+
+    @property
+    def newest(self) -> IndexEntry | None:
+        with self._lock:
+            return self._entries[-1] if self._entries else None
+
+    def add(self, path: Path, size: int = 0) -> IndexEntry:
+        """Append a new (newest) file named per the snapshot convention."""
+        key = parse_name(path.name)
+        if key is None:
+            raise ValueError(f"Not a snapshot file name: {path.name}")
+        entry = IndexEntry(key[0], key[1], path, size)
+        with self._lock:
+            self._entries.append(entry)
+            self._starts.append(entry.start)
+            self.total_bytes += size
+        return entry
+
+    def resize(self, entry: IndexEntry, size: int) -> None:
+        """Record the current size of a file that is still growing."""
+        with self._lock:
+            self.total_bytes += size - entry.size
+            entry.size = size
+
+    def between(self, start: float, end: float) -> list[Path]:
+        """Files that may hold records with ``start <= epoch <= end``.
+
+        A file covers its start time up to the next file's start.
+        """
+        with self._lock:
+            lo = max(bisect.bisect_right(self._starts, start) - 1, 0)
+            hi = bisect.bisect_right(self._starts, end)
+            return [self._entries[i].path for i in range(lo, hi)]
+
+    def _pop_oldest(self) -> IndexEntry:
+        entry = self._entries.popleft()
+        self._starts.popleft()
+        self.total_bytes -= entry.size
+        return entry
+
+    def evict(self, now: float, max_files: int = 0, max_bytes: int = 0,
+              max_age: float = 0, keep: Path | None = None) -> list[Path]:
+        """Delete the oldest files until every policy holds.
+
+        Args:
+            now: Current epoch, for *max_age*.
+            max_files: Maximum number of files (0 = no limit).
+            max_bytes: Maximum total size (0 = no limit).
+            max_age: Seconds after which a file whose successor started
+                     before ``now - max_age`` is removed (0 = no limit).
+            keep: File never removed (the segment being written).
+
+        Returns:
+            The removed paths.
+        """
+        removed: list[Path] = []
+        with self._lock:
+            while self._entries and self._entries[0].path != keep:
+                over = (
+                    (max_files and len(self._entries) > max_files)
+                    or (max_bytes and self.total_bytes > max_bytes)
+                    or (max_age and len(self._entries) > 1
+                        and self._entries[1].start <= now - max_age)
+                )
+                if not over:
+                    break
+                removed.append(self._pop_oldest().path)
+        # Unlinked outside the lock; queries skip files that vanish
+        for path in removed:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logger.warning("Failed to remove snapshot %s", path, exc_info=True)
+        return removed
@@ -0,0 +1,301 @@
+"""Time-range queries over the stored snapshot history.
+
+Answers questions like "``rp_cnp_handled`` on mlx5_2/1 between 02:00 and
+03:00" without rebuilding whole snapshots.  Segments overlapping the
+range are found by bisecting their file names
+(:meth:`SnapshotIndex.between`).  Within a segment, records before the
+range are skipped by their line prefix, except for the keyframe preceding
+the range and the deltas after it.  Only the requested collector's
+``devices`` subtree (or single devices) is kept from each parsed record,
+and deltas are applied to that subtree alone.
+
+The result holds one timestamp per snapshot and one value array per
+``(device, metric)`` aligned on it (NaN where a sample lacks the metric),
+optionally downsampled into fixed-width buckets.
+"""
+
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from datetime import time as dtime
+from pathlib import Path
+from typing import Any, Iterator
+
+import numpy as np
+
+from rdma_monitor.exporters.json_exporter import _is_legacy, iter_lines, record_head
+from rdma_monitor.exporters.snapshot_delta import apply
+from rdma_monitor.exporters.snapshot_index import SnapshotIndex
+from rdma_monitor.utils.history import iter_numeric
+
+logger = logging.getLogger(__name__)
+
+AGGREGATES = ("last", "mean", "min", "max")
+
+_RELATIVE_RE = re.compile(r"^-(\d+(?:\.\d+)?)([smhd])$")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_time(text: str, now: float | None = None) -> float:
+    """Epoch for a CLI time argument.
+
+    Accepts an epoch (``1735696800``), a relative offset (``-30m``,
+    ``-2h``, ``-1d``), an ISO 8601 date-time (``2025-01-01T02:00``) or a
+    time of day (``02:00``, today).  Values without a UTC offset are local
+    time.
+    """
+    now = time.time() if now is None else now
+    text = text.strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    m = _RELATIVE_RE.match(text)
+    if m:
+        return now - float(m.group(1)) * _UNITS[m.group(2)]
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        pass
+    try:
+        of_day = dtime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"Unrecognized time: {text!r}") from None
+    return datetime.combine(datetime.fromtimestamp(now).date(), of_day).timestamp()
+
+
+# ----------------------------------------------------------------------
+# Subtree tracking
+# ----------------------------------------------------------------------
+
+def _subtree(data: Any, path: tuple[str, ...]) -> Any:
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def _subdelta(delta: dict[str, Any], path: tuple[str, ...]
+              ) -> tuple[bool, Any]:
+    """What *delta* does to the subtree at *path*.
+
+    Returns ``(True, new subtree)`` when the subtree (or a parent) is
+    replaced or removed, else ``(False, delta of the subtree)``.
+    """
+    for i, key in enumerate(path):
+        changed = delta.get("c", {})
+        if key in changed:
+            return True, _subtree(changed[key], path[i + 1:])
+        if key in delta.get("d", ()):
+            return True, None
+        delta = delta.get("n", {}).get(key)
+        if delta is None:
+            return False, {}
+    return False, delta
+
+
+class _Tracker:
+    """Current value of a few subtrees, kept up to date from records."""
+
+    def __init__(self, paths: list[tuple[str, ...]]):
+        self.paths = paths
+        self.state: list[Any] = [None] * len(paths)
+        self.synced = False
+
+    def keyframe(self, data: dict[str, Any]) -> None:
+        self.state = [_subtree(data, path) for path in self.paths]
+        self.synced = True
+
+    def delta(self, delta: dict[str, Any]) -> None:
+        for i, path in enumerate(self.paths):
+            replaced, sub = _subdelta(delta, path)
+            if replaced:
+                self.state[i] = sub
+            elif sub:
+                base = self.state[i]
+                self.state[i] = apply(base if isinstance(base, dict) else {}, sub)
+
+    def feed(self, line: bytes, is_keyframe: bool) -> None:
+        record = json.loads(line)
+        if is_keyframe:
+            self.keyframe(record["data"])
+        elif self.synced:
+            self.delta(record.get("delta", {}))
+
+
+def _iter_states(paths: list[Path], subtrees: list[tuple[str, ...]],
+                 start: float, end: float) -> Iterator[tuple[float, list[Any]]]:
+    """``(epoch, subtree values)`` of every snapshot in ``[start, end]``."""
+    for path in paths:
+        try:
+            if _is_legacy(path):
+                with open(path) as fh:
+                    record = json.load(fh)
+                epoch = record.get("epoch", 0)
+                if start <= epoch <= end:
+                    yield epoch, [_subtree(record.get("data"), p) for p in subtrees]
+                continue
+
+            tracker = _Tracker(subtrees)
+            # Before the range only the last keyframe and its deltas matter
+            pending: list[tuple[bytes, bool]] = []
+            for line in iter_lines(path):
+                head = record_head(line)
+                if head is None:
+                    continue
+                epoch, is_keyframe = head
+                if epoch > end:
+                    break
+                if epoch < start:
+                    if is_keyframe:
+                        pending = []
+                    pending.append((line, is_keyframe))
+                    continue
+                pending.append((line, is_keyframe))
+                try:
+                    for old, old_key in pending:
+                        tracker.feed(old, old_key)
+                except ValueError:
+                    logger.warning("Skipping corrupt record in %s", path)
+                    continue
+                finally:
+                    pending = []
+                if tracker.synced:
+                    yield epoch, tracker.state
+        except FileNotFoundError:
+            # Removed by retention since the index was built
+            continue
+
+
+# ----------------------------------------------------------------------
+# Results
+# ----------------------------------------------------------------------
+
+@dataclass
+class SeriesResult:
+    """Aligned series of one query.
+
+    Attributes:
+        timestamps: Snapshot epochs (or bucket starts when downsampled).
+        series: ``(device, metric)`` -> values aligned on *timestamps*,
+                NaN where the metric is missing.
+    """
+    timestamps: np.ndarray
+    series: dict[tuple[str, str], np.ndarray] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def downsample(self, step: float, agg: str = "last") -> "SeriesResult":
+        """Aggregate into buckets of *step* seconds (empty buckets omitted).
+
+        Args:
+            step: Bucket width in seconds, aligned to the epoch.
+            agg: One of :data:`AGGREGATES`; NaN samples are ignored.
+        """
+        if agg not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate: {agg}")
+        if not len(self.timestamps):
+            return self
+        buckets = np.floor(self.timestamps / step) * step
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        out: dict[tuple[str, str], np.ndarray] = {}
+        for key, values in self.series.items():
+            present = ~np.isnan(values)
+            if agg == "min":
+                out[key] = np.fmin.reduceat(values, starts)
+            elif agg == "max":
+                out[key] = np.fmax.reduceat(values, starts)
+            elif agg == "mean":
+                total = np.add.reduceat(np.where(present, values, 0.0), starts)
+                count = np.add.reduceat(present.astype(np.int64), starts)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    out[key] = np.where(count > 0, total / count, np.nan)
+            else:
+                # Last present sample of each bucket
+                idx = np.where(present, np.arange(len(values)), -1)
+                last = np.maximum.reduceat(idx, starts)
+                ok = last >= starts
+                out[key] = np.where(ok, values[np.where(ok, last, 0)], np.nan)
+        return SeriesResult(buckets[starts], out)
+
+    def to_dict(self) -> dict[str, Any]:
+        """JSON-friendly form: ``{"timestamps": [...], "series": {dev: {metric: [...]}}}``."""
+        series: dict[str, dict[str, list]] = {}
+        for (device, metric), values in self.series.items():
+            series.setdefault(device, {})[metric] = [
+                None if np.isnan(v) else float(v) for v in values
+            ]
+        return {"timestamps": self.timestamps.tolist(), "series": series}
+
+
+def _metric_filter(metrics: list[str] | None):
+    """Match a dotted path exactly or by its trailing components."""
+    if not metrics:
+        return lambda path: True
+    wanted = set(metrics)
+    suffixes = tuple("." + m for m in metrics)
+    return lambda path: path in wanted or path.endswith(suffixes)
+
+
+def query(source: str | Path | SnapshotIndex, collector: str,
+          start: float, end: float, devices: list[str] | None = None,
+          metrics: list[str] | None = None, step: float = 0,
+          agg: str = "last") -> SeriesResult:
+    """Series of one collector's per-device metrics over ``[start, end]``.
+
+    Args:
+        source: Snapshot directory, or the live index of a
+                :class:`~rdma_monitor.exporters.json_exporter.JsonExporter`.
+        collector: Collector name (``performance``, ``congestion``, ...).
+        start: First epoch (inclusive).
+        end: Last epoch (inclusive).
+        devices: Ports (``mlx5_2/1``); None = every port.
+        metrics: Dotted metric paths (``counters.rp_cnp_handled``) or
+                 trailing parts of them (``rp_cnp_handled``); None = all
+                 numeric leaves.
+        step: Downsample into buckets of this many seconds (0 = raw).
+        agg: Bucket aggregate, one of :data:`AGGREGATES`.
+
+    Returns:
+        The aligned series.
+    """
+    index = source if isinstance(source, SnapshotIndex) else SnapshotIndex(source)
+    # Names have one-second resolution; include the segment before
+    paths = index.between(start - 1, end)
+    if devices:
+        subtrees = [(collector, "devices", device) for device in devices]
+    else:
+        subtrees = [(collector, "devices")]
+    match = _metric_filter(metrics)
+
+    timestamps: list[float] = []
+    columns: dict[tuple[str, str], list[float]] = {}
+    for n, (epoch, state) in enumerate(_iter_states(paths, subtrees, start, end)):
+        if devices:
+            per_device = zip(devices, state)
+        else:
+            per_device = state[0].items() if isinstance(state[0], dict) else ()
+        for device, dev_data in per_device:
+            if not isinstance(dev_data, dict):
+                continue
+            for metric, value in iter_numeric(dev_data):
+                if match(metric):
+                    # Series first seen mid-range are padded with NaN
+                    column = columns.setdefault((device, metric), [np.nan] * n)
+                    column.append(value)
+        timestamps.append(epoch)
+        for column in columns.values():
+            if len(column) < len(timestamps):
+                column.append(np.nan)
+
+    result = SeriesResult(
+        np.array(timestamps, dtype=np.float64),
+        {key: np.array(values, dtype=np.float64)
+         for key, values in sorted(columns.items())},
+    )
+    return result.downsample(step, agg) if step > 0 else result
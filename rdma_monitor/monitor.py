@@ -4,24 +4,38 @@ Coordinates device discovery, collector scheduling, exporting, and
 AI analysis in a single event loop.
 """
 
+import heapq
 import json
 import logging
+import os
+import queue
 import signal
 import sys
 import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from typing import Any
 
 from rdma_monitor.utils.config_loader import load_config
+from rdma_monitor.utils.acquisition import get_acquisition
+from rdma_monitor.utils.command_executor import configure_executor, get_executor
+from rdma_monitor.utils.counter_reader import get_counter_reader
+from rdma_monitor.utils.history import HistoryStore
+from rdma_monitor.utils.link_events import LinkEvent, LinkEventListener
 from rdma_monitor.utils.network_detector import discover_devices, RDMADevice
+from rdma_monitor.utils.timeseries_store import TimeSeriesStore
 from rdma_monitor.collectors.base import BaseCollector
 from rdma_monitor.collectors.performance import PerformanceCollector
 from rdma_monitor.collectors.topology import TopologyCollector
 from rdma_monitor.collectors.configuration import ConfigurationCollector
 from rdma_monitor.collectors.congestion import CongestionCollector
 from rdma_monitor.collectors.link_status import LinkStatusCollector
+from rdma_monitor.collectors.microburst import MicroburstSampler
+from rdma_monitor.exporters.cardinality import DEFAULT_KEYS, CardinalityGuard
 from rdma_monitor.exporters.prometheus_exporter import PrometheusExporter
 from rdma_monitor.exporters.json_exporter import JsonExporter
+from rdma_monitor.exporters.snapshot_query import SeriesResult, query
 from rdma_monitor.analysis.llm_analyzer import LLMAnalyzer
 from rdma_monitor.analysis.dify_client import DifyClient
 
@@ -59,6 +73,26 @@ class RDMAMonitor:
         self._json_exporter: JsonExporter | None = None
         self._llm: LLMAnalyzer | None = None
         self._dify: DifyClient | None = None
+        self._microburst: MicroburstSampler | None = None
+        self._history: HistoryStore | None = None
+        self._tsdb: TimeSeriesStore | None = None
+        self._link_events: LinkEventListener | None = None
+
+        # Concurrent collection state
+        self._executor: ThreadPoolExecutor | None = None
+        self._pending: dict[str, Future] = {}
+        self._last_good: dict[str, tuple[float, dict[str, Any]]] = {}
+
+        # Per-collector scheduling: heap of (due_monotonic, seq, collector)
+        # and the most recent result served for each collector.
+        self._schedule: list[tuple[float, int, BaseCollector]] = []
+        self._latest: dict[str, dict[str, Any]] = {}
+        self._wakeup = threading.Event()
+        # Collectors requested out of cycle, e.g. on a link flap.  A
+        # SimpleQueue takes no lock a signal handler could deadlock on.
+        self._urgent: queue.SimpleQueue[str] = queue.SimpleQueue()
+        # Set by the SIGUSR1 handler, acted on by the main loop
+        self._refresh_requested = False
 
         # Timestamps for interval tracking
         self._last_snapshot_time: float = 0
@@ -91,9 +125,77 @@ class RDMAMonitor:
         ]
         for name, cls in mapping:
             if coll_cfg.get(name, {}).get("enabled", True):
-                self._collectors.append(cls(self._devices))
+                kwargs: dict[str, Any] = {}
+                if name == "performance":
+                    kwargs["microburst"] = self._init_microburst()
+                elif name == "topology":
+                    topo_cfg = coll_cfg.get(name, {})
+                    kwargs["sweep_interval"] = topo_cfg.get("fabric_sweep_interval", 1800)
+                    kwargs["routing"] = topo_cfg.get("routing", {}).get("enabled", True)
+                    kwargs["routing_max_links"] = topo_cfg.get("routing", {}).get(
+                        "max_links", 200)
+                    kwargs["table_ttl"] = topo_cfg.get("table_ttl", 3600)
+                    kwargs["link_events"] = self._init_link_events()
+                elif name == "configuration":
+                    conf_cfg = coll_cfg.get(name, {})
+                    kwargs["full_interval"] = conf_cfg.get("full_interval", 86400)
+                    kwargs["mlxconfig_interval"] = conf_cfg.get("mlxconfig_interval", 0)
+                elif name == "link_status":
+                    kwargs["cable_ttl"] = coll_cfg.get(name, {}).get("cable_ttl", 3600)
+                    kwargs["link_events"] = self._init_link_events()
+                self._collectors.append(cls(self._devices, **kwargs))
                 logger.info("Enabled collector: %s", name)
 
+        general = self.cfg.get("general", {})
+        configure_executor(
+            max_concurrency=general.get("command_concurrency", 8),
+            max_output=general.get("command_max_output", 4 * 1024 * 1024),
+        )
+
+        max_workers = general.get("collector_workers", 4)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, min(max_workers, len(self._collectors) or 1)),
+            thread_name_prefix="rdma-collector",
+        )
+
+    def _init_microburst(self) -> MicroburstSampler | None:
+        mb_cfg = (self.cfg.get("collectors", {}).get("performance", {})
+                  .get("microburst", {}))
+        if not mb_cfg.get("enabled", False):
+            return None
+        self._microburst = MicroburstSampler(
+            self._devices,
+            counters=mb_cfg.get("counters"),
+            interval_ms=mb_cfg.get("interval_ms", 5),
+            utilization_threshold=mb_cfg.get("utilization_threshold", 0.8),
+            buffer_seconds=mb_cfg.get("buffer_seconds", 15),
+        )
+        self._microburst.start()
+        return self._microburst
+
+    def _init_link_events(self) -> LinkEventListener | None:
+        """Start the shared link/address event listener (once)."""
+        if self._link_events is not None:
+            return self._link_events
+        ev_cfg = (self.cfg.get("collectors", {}).get("link_status", {})
+                  .get("events", {}))
+        if not ev_cfg.get("enabled", True):
+            return None
+        on_change = self._on_link_change if ev_cfg.get("trigger_collection", True) \
+            else None
+        self._link_events = LinkEventListener(
+            self._devices,
+            on_change=on_change,
+            poll_interval=ev_cfg.get("poll_interval", 1.0),
+            buffer_size=ev_cfg.get("buffer_size", 1024),
+        )
+        self._link_events.start()
+        return self._link_events
+
+    def _on_link_change(self, event: LinkEvent) -> None:
+        logger.warning("Link %s went %s (%s)", event.port, event.new, event.source)
+        self.request_collection("link_status")
+
     def _init_prometheus(self) -> None:
         prom_cfg = self.cfg.get("prometheus", {})
         if not prom_cfg.get("enabled", True):
@@ -102,13 +204,58 @@ class RDMAMonitor:
             prefix=prom_cfg.get("metric_prefix", "rdma"),
             host=prom_cfg.get("host", "0.0.0.0"),
             port=prom_cfg.get("port", 9090),
+            mode=prom_cfg.get("mode", "gauges"),
+            guard=self._init_cardinality_guard(prom_cfg),
+            max_series=prom_cfg.get("cardinality", {}).get("max_series", 0),
         )
         self._prometheus.start()
 
+    @staticmethod
+    def _init_cardinality_guard(prom_cfg: dict[str, Any]) -> CardinalityGuard | None:
+        card_cfg = prom_cfg.get("cardinality", {})
+        if not card_cfg.get("enabled", True):
+            return None
+        return CardinalityGuard(
+            keys=card_cfg.get("keys", DEFAULT_KEYS),
+            allow=card_cfg.get("allow"),
+            deny=card_cfg.get("deny"),
+            rollups=card_cfg.get("rollups"),
+        )
+
     def _init_json_exporter(self) -> None:
         general = self.cfg.get("general", {})
         snapshot_dir = general.get("snapshot_dir", "./snapshots")
-        self._json_exporter = JsonExporter(snapshot_dir=snapshot_dir)
+        retention = general.get("snapshot_retention", {})
+        self._json_exporter = JsonExporter(
+            snapshot_dir=snapshot_dir,
+            compression=general.get("snapshot_compression", "gzip"),
+            segment_records=general.get("snapshot_segment_records", 120),
+            segment_seconds=general.get("snapshot_segment_seconds", 3600),
+            max_files=retention.get("max_files", 1000),
+            max_bytes=retention.get("max_bytes", 0),
+            max_age=retention.get("max_age", 0),
+            keyframe_interval=general.get("snapshot_keyframe_interval", 20),
+        )
+
+    def _init_history(self) -> None:
+        hist_cfg = self.cfg.get("history", {})
+        if not hist_cfg.get("enabled", True):
+            return
+        self._history = HistoryStore(
+            capacity=hist_cfg.get("capacity", 360),
+            exclude=hist_cfg.get("exclude", ["ethtool_stats"]),
+        )
+
+    def _init_tsdb(self) -> None:
+        tsdb_cfg = self.cfg.get("tsdb", {})
+        if not tsdb_cfg.get("enabled", True):
+            return
+        snapshot_dir = self.cfg.get("general", {}).get("snapshot_dir", "./snapshots")
+        self._tsdb = TimeSeriesStore(
+            root=os.path.join(snapshot_dir, "tsdb"),
+            capacities=tsdb_cfg.get("capacities"),
+            exclude=tsdb_cfg.get("exclude", ["ethtool_stats"]),
+        )
 
     def _init_llm(self) -> None:
         llm_cfg = self.cfg.get("llm", {})
@@ -137,13 +284,136 @@ class RDMAMonitor:
     # Collection loop
     # ------------------------------------------------------------------
 
-    def _collect_all(self) -> dict[str, Any]:
-        """Run every enabled collector and merge results."""
-        all_data: dict[str, Any] = {}
-        for collector in self._collectors:
-            data = collector.safe_collect()
-            all_data[collector.name] = data
-        return all_data
+    def _collector_interval(self, name: str) -> float:
+        coll_cfg = self.cfg.get("collectors", {}).get(name, {})
+        default = self.cfg.get("general", {}).get("poll_interval", 10)
+        return float(coll_cfg.get("interval", default))
+
+    def _collector_timeout(self, name: str) -> float:
+        coll_cfg = self.cfg.get("collectors", {}).get(name, {})
+        default = min(self._collector_interval(name),
+                      self.cfg.get("general", {}).get("poll_interval", 10))
+        return float(coll_cfg.get("timeout", default))
+
+    def _init_schedule(self) -> None:
+        """Make every collector due immediately."""
+        now = time.monotonic()
+        self._schedule = [(now, seq, c) for seq, c in enumerate(self._collectors)]
+        heapq.heapify(self._schedule)
+
+    def _pop_due(self, now: float) -> list[BaseCollector]:
+        """Pop every collector whose deadline has passed and reschedule it.
+
+        The next deadline is the previous one plus the interval, so the
+        cadence does not drift; a collector that fell a whole interval
+        behind is rescheduled relative to *now* instead of bursting.
+        """
+        due: list[BaseCollector] = []
+        while self._schedule and self._schedule[0][0] <= now:
+            deadline, seq, collector = heapq.heappop(self._schedule)
+            nxt = deadline + self._collector_interval(collector.name)
+            if nxt <= now:
+                nxt = now + self._collector_interval(collector.name)
+            heapq.heappush(self._schedule, (nxt, seq, collector))
+            due.append(collector)
+        return due
+
+    def _pop_urgent(self, due: list[BaseCollector]) -> list[BaseCollector]:
+        """Collectors requested out of cycle that are not already *due*."""
+        names: set[str] = set()
+        while True:
+            try:
+                names.add(self._urgent.get_nowait())
+            except queue.Empty:
+                break
+        return [c for c in self._collectors if c.name in names and c not in due]
+
+    def _next_due(self) -> float:
+        return self._schedule[0][0] if self._schedule else time.monotonic() + 1
+
+    def _remember(self, name: str, data: dict[str, Any]) -> None:
+        if not data.get("_error"):
+            self._last_good[name] = (time.monotonic(), data)
+
+    def _stale_result(self, name: str) -> dict[str, Any]:
+        """Return the last good result of *name*, marked stale."""
+        last = self._last_good.get(name)
+        if last is None:
+            return {"_collector": name, "_stale": True, "_timeout": True}
+        ts, data = last
+        stale = dict(data)
+        stale["_stale"] = True
+        stale["_stale_age_s"] = round(time.monotonic() - ts, 2)
+        return stale
+
+    def _submit(self, collector: BaseCollector) -> Future:
+        """Return the in-flight future for *collector*, starting one if idle.
+
+        A collector that overran a previous deadline keeps running in the
+        pool; it is not resubmitted until that run has finished.
+        """
+        fut = self._pending.get(collector.name)
+        if fut is not None and fut.done():
+            self._remember(collector.name, fut.result())
+            fut = None
+        if fut is None:
+            fut = self._executor.submit(collector.safe_collect)  # type: ignore[union-attr]
+            self._pending[collector.name] = fut
+        return fut
+
+    def _collect_all(self, due: list[BaseCollector] | None = None
+                     ) -> dict[str, Any]:
+        """Run the *due* collectors concurrently and merge all results.
+
+        *due* defaults to every collector.  Each one gets its own deadline
+        (``collectors.<name>.timeout``); a collector that misses it
+        contributes its last good result with ``_stale`` set.  Collectors
+        that were not due contribute their most recent result, so the
+        merged dict always has one entry per collector that has run.
+        """
+        if due is None:
+            due = self._collectors
+        start = time.monotonic()
+        get_acquisition().begin_cycle()
+        futures = [(c.name, self._submit(c)) for c in due]
+
+        for name, fut in futures:
+            remaining = start + self._collector_timeout(name) - time.monotonic()
+            try:
+                data = fut.result(timeout=max(0.0, remaining))
+            except FutureTimeoutError:
+                logger.warning("Collector %s missed its deadline; "
+                               "serving last good result", name)
+                self._latest[name] = self._stale_result(name)
+                continue
+            del self._pending[name]
+            self._remember(name, data)
+            self._latest[name] = data
+
+        return {
+            c.name: self._latest[c.name]
+            for c in self._collectors if c.name in self._latest
+        }
+
+    def _report_acquisition(self) -> None:
+        """Log and export source-read statistics of the cycle just finished."""
+        acq_stats = get_acquisition().end_cycle()
+        logger.debug(
+            "acquisition: %d fetches, %d dedup hits (%d forks saved)",
+            acq_stats["total_fetches"], acq_stats["total_hits"],
+            acq_stats["command_hits"] + acq_stats["ethtool_stats_hits"],
+        )
+        stats = get_counter_reader().end_cycle()
+        logger.debug(
+            "sysfs counters: %d reads in %.3f ms (open/read/close path est. "
+            "%s ms, saved %s ms)",
+            stats["reads"], stats["read_time_ms"],
+            stats.get("legacy_read_time_ms", "n/a"),
+            stats.get("saved_time_ms", "n/a"),
+        )
+        if self._prometheus:
+            self._prometheus.update("acquisition", acq_stats)
+            self._prometheus.update("counter_reader", stats)
 
     def _maybe_save_snapshot(self, data: dict[str, Any], now: float) -> None:
         interval = self.cfg.get("general", {}).get("snapshot_interval", 30)
@@ -157,7 +427,8 @@ class RDMAMonitor:
         if self._llm and (now - self._last_llm_time) >= interval:
             # Run in a background thread to avoid blocking the main loop
             thread = threading.Thread(
-                target=self._run_llm_analysis, args=(data,), daemon=True
+                target=self._run_llm_analysis, args=(self._with_trends(data),),
+                daemon=True,
             )
             thread.start()
             self._last_llm_time = now
@@ -183,7 +454,8 @@ class RDMAMonitor:
         interval = self.cfg.get("dify", {}).get("push_interval", 60)
         if self._dify and (now - self._last_dify_time) >= interval:
             thread = threading.Thread(
-                target=self._run_dify_push, args=(data,), daemon=True
+                target=self._run_dify_push, args=(self._with_trends(data),),
+                daemon=True,
             )
             thread.start()
             self._last_dify_time = now
@@ -198,6 +470,51 @@ class RDMAMonitor:
         except Exception:
             logger.exception("Dify push thread error")
 
+    def _record_history(self, due: list[BaseCollector],
+                        data: dict[str, Any], now: float) -> None:
+        """Append the fresh results of this cycle to the history buffers."""
+        if not self._history and not self._tsdb:
+            return
+        for collector in due:
+            result = data.get(collector.name, {})
+            if result.get("_stale") or result.get("_error"):
+                continue
+            if self._history:
+                self._history.record(collector.name, result, now)
+            if self._tsdb:
+                self._tsdb.record(collector.name, result, now)
+
+    def _with_trends(self, data: dict[str, Any]) -> dict[str, Any]:
+        """Prefix *data* with a trend summary for the AI consumers."""
+        if not self._history:
+            return data
+        window = self.cfg.get("history", {}).get("trend_window", 300)
+        return {"trends": self.trend_summary(window), **data}
+
+    def _run_cycle(self, due: list[BaseCollector]) -> None:
+        """Collect from the *due* collectors and feed every consumer."""
+        now = time.time()
+        try:
+            data = self._collect_all(due)
+            self._report_acquisition()
+            self._record_history(due, data, now)
+
+            # Export to Prometheus
+            if self._prometheus:
+                self._prometheus.update_all(data)
+
+            # JSON snapshot
+            self._maybe_save_snapshot(data, now)
+
+            # LLM analysis
+            self._maybe_llm_analyze(data, now)
+
+            # Dify push
+            self._maybe_push_dify(data, now)
+
+        except Exception:
+            logger.exception("Error in main monitor loop")
+
     # ------------------------------------------------------------------
     # Public interface
     # ------------------------------------------------------------------
@@ -210,51 +527,128 @@ class RDMAMonitor:
         self._init_collectors()
         self._init_prometheus()
         self._init_json_exporter()
+        self._init_history()
+        self._init_tsdb()
         self._init_llm()
         self._init_dify()
 
+        self._init_schedule()
         self._running = True
 
         # Register signal handlers for graceful shutdown
         def _handle_signal(signum, frame):
             logger.info("Received signal %d, shutting down...", signum)
-            self._running = False
+            self.stop()
 
         signal.signal(signal.SIGINT, _handle_signal)
         signal.signal(signal.SIGTERM, _handle_signal)
 
-        poll_interval = self.cfg.get("general", {}).get("poll_interval", 10)
-        logger.info("Entering main loop (poll every %ds)", poll_interval)
+        # SIGUSR1 requests a full configuration report (incl. mlxconfig).
+        # The handler runs on the main thread, possibly inside the loop, so
+        # it only raises a flag; the loop does the refresh.
+        def _handle_refresh(signum, frame):
+            self._refresh_requested = True
+            self._wakeup.set()
 
-        while self._running:
-            loop_start = time.monotonic()
-            now = time.time()
-
-            try:
-                data = self._collect_all()
-
-                # Export to Prometheus
-                if self._prometheus:
-                    self._prometheus.update_all(data)
-
-                # JSON snapshot
-                self._maybe_save_snapshot(data, now)
+        signal.signal(signal.SIGUSR1, _handle_refresh)
 
-                # LLM analysis
-                self._maybe_llm_analyze(data, now)
+        for c in self._collectors:
+            logger.info("Collector %s runs every %ss",
+                        c.name, self._collector_interval(c.name))
+        logger.info("Entering main loop")
 
-                # Dify push
-                self._maybe_push_dify(data, now)
-
-            except Exception:
-                logger.exception("Error in main monitor loop")
-
-            elapsed = time.monotonic() - loop_start
-            sleep_time = max(0, poll_interval - elapsed)
+        while self._running:
+            if self._refresh_requested:
+                self._refresh_requested = False
+                logger.info("Received SIGUSR1, refreshing configuration")
+                self.refresh_configuration()
+            due = self._pop_due(time.monotonic())
+            due += self._pop_urgent(due)
+            if due:
+                self._run_cycle(due)
+
+            sleep_time = self._next_due() - time.monotonic()
             if sleep_time > 0:
-                time.sleep(sleep_time)
-
+                self._wakeup.wait(sleep_time)
+            self._wakeup.clear()
+
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._microburst:
+            self._microburst.stop()
+        if self._link_events:
+            self._link_events.stop()
+        if self._prometheus:
+            self._prometheus.stop()
+        if self._json_exporter:
+            self._json_exporter.close()
+        if self._tsdb:
+            self._tsdb.flush()
+        get_acquisition().close()
+        get_executor().close()
+        get_counter_reader().close()
         logger.info("RDMA Monitor stopped.")
 
+    def history_stats(self, collector: str, device: str, metric: str,
+                      window: float = 300,
+                      percentiles: tuple[float, ...] = (50, 95, 99)
+                      ) -> dict[str, Any]:
+        """Windowed statistics of one metric from the in-memory history.
+
+        Args:
+            collector: Collector name, e.g. ``"congestion"``.
+            device: Port key, e.g. ``"mlx5_2/1"``.
+            metric: Dotted path inside the device's data, e.g.
+                    ``"hw_counters.rp_cnp_handled"`` or
+                    ``"rates.port_xmit_data_per_sec"``.
+            window: Look-back window in seconds.
+
+        Returns:
+            dict with samples, min, max, mean, the requested percentiles,
+            last and slope_per_sec (empty apart from ``samples`` when there
+            is no data or history is disabled).
+        """
+        if not self._history:
+            return {"samples": 0}
+        return self._history.stats(collector, device, metric, window,
+                                   time.time(), percentiles)
+
+    def trend_summary(self, window: float = 300) -> dict[str, Any]:
+        """Windowed statistics of every rate, per collector and port."""
+        if not self._history:
+            return {}
+        return self._history.summary(window, time.time())
+
+    def query_history(self, collector: str, start: float, end: float,
+                      devices: list[str] | None = None,
+                      metrics: list[str] | None = None,
+                      step: float = 0, agg: str = "last") -> SeriesResult | None:
+        """Aligned series from the stored snapshots over ``[start, end]``.
+
+        See :func:`rdma_monitor.exporters.snapshot_query.query` for the
+        arguments.  Returns None when snapshots are disabled.  Safe to
+        call from any thread while snapshots are being written.
+        """
+        if not self._json_exporter:
+            return None
+        return query(self._json_exporter.index, collector, start, end,
+                     devices=devices, metrics=metrics, step=step, agg=agg)
+
+    def request_collection(self, name: str) -> None:
+        """Run collector *name* as soon as possible, outside its schedule.
+
+        Safe to call from any thread; the regular schedule is unaffected.
+        """
+        self._urgent.put(name)
+        self._wakeup.set()
+
+    def refresh_configuration(self) -> None:
+        """Re-run mlxconfig and report full configuration data now."""
+        for c in self._collectors:
+            if isinstance(c, ConfigurationCollector):
+                c.request_full()
+                self.request_collection(c.name)
+
     def stop(self) -> None:
         self._running = False
+        self._wakeup.set()
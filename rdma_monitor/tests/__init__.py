@@ -0,0 +1 @@
+"""Unit tests (run with ``python -m pytest rdma_monitor/tests``)."""
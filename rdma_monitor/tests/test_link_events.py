@@ -0,0 +1,91 @@
+"""Decode tests for the rtnetlink notifications of the link event listener.
+
+The fixtures are RTM_NEWLINK / RTM_DELLINK / RTM_NEWADDR datagrams in
+kernel wire format (``struct ifinfomsg`` / ``struct ifaddrmsg`` followed
+by rtattrs), as delivered to an ``RTMGRP_LINK`` subscriber.  The
+listener tests check which state each kind of port follows.
+"""
+
+from rdma_monitor.utils import link_events
+from rdma_monitor.utils.link_events import (
+    STATE_DOWN,
+    STATE_UP,
+    LinkEventListener,
+    count_addr_messages,
+    parse_link_messages,
+)
+from rdma_monitor.utils.network_detector import NetworkType, RDMADevice
+
+# ib0 operstate DOWN, ens1f0np0 operstate UP, then one RTM_NEWADDR
+NEWLINK = bytes.fromhex(
+    "3800000010000000000000000000000000002000050000000210000000000000"
+    "0800030069623000050010000200000008000400fc0700004000000010000000"
+    "0000000000000000000020000500000043100100000000000e000300656e7331"
+    "66306e7030000000050010000600000008000400fc0700002c00000014000000"
+    "00000000000000000a4000000500000014000100000000000000000000000000"
+    "00000000"
+)
+
+# ens1f1np1 with operstate UNKNOWN and IFF_RUNNING set, then its RTM_DELLINK
+UNKNOWN_THEN_DELLINK = bytes.fromhex(
+    "4000000010000000000000000000000000002000050000004310000000000000"
+    "0e000300656e733166316e7031000000050010000000000008000400fc070000"
+    "4000000011000000000000000000000000002000050000000310000000000000"
+    "0e000300656e733166316e7031000000050010000000000008000400fc070000"
+)
+
+
+def test_link_messages():
+    assert parse_link_messages(NEWLINK) == [
+        ("ib0", STATE_DOWN),
+        ("ens1f0np0", STATE_UP),
+    ]
+    assert count_addr_messages(NEWLINK) == 1
+
+
+def test_unknown_operstate_and_dellink():
+    assert parse_link_messages(UNKNOWN_THEN_DELLINK) == [
+        ("ens1f1np1", STATE_UP),
+        ("ens1f1np1", STATE_DOWN),
+    ]
+    assert count_addr_messages(UNKNOWN_THEN_DELLINK) == 0
+
+
+def test_truncated_datagram():
+    # A cut-off trailing message is ignored, the complete one still decodes
+    assert parse_link_messages(NEWLINK[:0x38 + 20]) == [("ib0", STATE_DOWN)]
+    assert parse_link_messages(b"") == []
+
+
+def _listener(monkeypatch, tmp_path, netdev_states):
+    ib = RDMADevice("mlx5_0", 1, NetworkType.INFINIBAND, netdev="ib0")
+    roce = RDMADevice("mlx5_1", 1, NetworkType.ROCE, netdev="ens1f0np0")
+    (tmp_path / "state").write_text("4: ACTIVE\n")
+    monkeypatch.setattr(link_events, "port_dir", lambda dev, port: str(tmp_path))
+    monkeypatch.setattr(link_events, "_netdev_state", netdev_states.get)
+    listener = LinkEventListener([ib, roce])
+    listener._rtnl = object()
+    return listener
+
+
+def test_ipoib_port_follows_ib_state(monkeypatch, tmp_path):
+    # ib0 admin-down on an ACTIVE IB link
+    listener = _listener(monkeypatch, tmp_path,
+                         {"ib0": STATE_DOWN, "ens1f0np0": STATE_UP})
+    assert "ib0" not in listener._by_netdev
+    assert listener._poll_keys() == ["mlx5_0/1"]
+    assert listener._read_sysfs("mlx5_0/1") == STATE_UP
+    assert listener._read_sysfs("mlx5_1/1") == STATE_UP
+
+    # Startup poll, an uevent re-read and a resync see no transition
+    for source in ("poll", "uevent", "poll"):
+        listener._poll(list(listener._ports), source)
+    assert listener.events() == []
+    assert listener.port_summary("mlx5_0/1")["flap_count"] == 0
+
+
+def test_roce_port_follows_netdev_state(monkeypatch, tmp_path):
+    listener = _listener(monkeypatch, tmp_path, {"ens1f0np0": STATE_DOWN})
+    assert listener._by_netdev == {"ens1f0np0": "mlx5_1/1"}
+    # IB port state says ACTIVE, the netdev is what counts for RoCE
+    assert listener._read_sysfs("mlx5_1/1") == STATE_DOWN
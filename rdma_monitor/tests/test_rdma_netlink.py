@@ -0,0 +1,115 @@
+"""Decode tests for the RDMA netlink client on NLDEV reply fixtures.
+
+The fixtures are byte-exact kernel replies for a two-port mlx5 RoCE host
+(attribute IDs from ``<rdma/rdma_netlink.h>``, including the PAD
+attributes the kernel inserts before 64-bit values).  They are replayed
+through :class:`NldevClient` via its ``transport`` hook.
+"""
+
+import errno
+
+import pytest
+
+from rdma_monitor.utils.rdma_netlink import (
+    NldevClient,
+    NldevSystem,
+    parse_messages,
+)
+
+# RDMA_NLDEV_CMD_PORT_GET dump: mlx5_0/1 ACTIVE/LINK_UP, mlx5_1/1
+# DOWN/DISABLED, then NLMSG_DONE
+LINK_DUMP = bytes.fromhex(
+    "8c00000005140200070000009210000008000100000000000b0002006d6c7835"
+    "5f3000000800030001000000040000000c0004004ae851260000000004000000"
+    "0c00080000000000000080fe080009000000000008000a000000000005000b00"
+    "0000000005000c000400000005000d000500000008003200040000000e003300"
+    "656e733166306e70300000008c00000005140200070000009210000008000100"
+    "010000000b0002006d6c78355f3100000800030001000000040000000c000400"
+    "4ae8512600000000040000000c00080000000000000080fe0800090000000000"
+    "08000a000000000005000b000000000005000c000100000005000d0003000000"
+    "08003200050000000e003300656e733166316e70310000001400000003000200"
+    "070000009210000000000000"
+)
+
+# RDMA_NLDEV_CMD_GET dump of mlx5_0 (protocol "roce"), then NLMSG_DONE
+DEV_DUMP = bytes.fromhex(
+    "8000000001140200080000009210000008000100000000000b0002006d6c7835"
+    "5f3000000800030001000000040000000c0004004ae85126000000000f000500"
+    "32382e33392e313030320000040000000c000600c3b2a10003d23fb804000000"
+    "0c000700c3b2a10003d23fb805000e000100000009004300726f636500000000"
+    "1400000003000200080000009210000000000000"
+)
+
+# RDMA_NLDEV_CMD_SYS_GET reply: netns shared, copy-on-fork on
+SYS_GET = bytes.fromhex(
+    "20000000061400000900000092100000050042000100000005005d0001000000"
+)
+
+# Dump on a host without RDMA devices: NLMSG_DONE only
+EMPTY_DUMP = bytes.fromhex(
+    "14000000030002000a0000009210000000000000"
+)
+
+# SYS_GET answered by a bare ACK (NLMSG_ERROR with error 0)
+EMPTY_ACK = bytes.fromhex(
+    "24000000020000000b000000921000000000000010000000061401000b000000"
+    "00000000"
+)
+
+# SYS_GET rejected with -EPERM
+EPERM = bytes.fromhex(
+    "24000000020000000c00000092100000ffffffff10000000061401000c000000"
+    "00000000"
+)
+
+
+def _client(*datagrams: bytes) -> NldevClient:
+    return NldevClient(transport=lambda request: list(datagrams))
+
+
+def test_link_dump():
+    ports = _client(LINK_DUMP).ports()
+    assert [p.link_line() for p in ports] == [
+        "link mlx5_0/1 state ACTIVE physical_state LINK_UP netdev ens1f0np0",
+        "link mlx5_1/1 state DOWN physical_state DISABLED netdev ens1f1np1",
+    ]
+    port = ports[0]
+    assert (port.dev_index, port.netdev_index) == (0, 4)
+    assert port.subnet_prefix == "fe80:0000:0000:0000"
+    assert port.cap_flags == 0x2651E84A
+    assert (port.lid, port.sm_lid, port.lmc) == (0, 0, 0)
+
+
+def test_dev_dump():
+    (dev,) = _client(DEV_DUMP).devices()
+    assert dev.name == "mlx5_0"
+    assert dev.node_type == "ca"
+    assert dev.fw_version == "28.39.1002"
+    assert dev.node_guid == "b83f:d203:00a1:b2c3"
+    assert dev.protocol == "roce"
+
+
+def test_system():
+    sysinfo = _client(SYS_GET).system()
+    assert sysinfo == NldevSystem(netns_mode="shared", copy_on_fork="on")
+    assert sysinfo.system_line() == "netns shared copy-on-fork on"
+
+
+def test_empty_dump():
+    messages, done = parse_messages(EMPTY_DUMP)
+    assert (messages, done) == ([], True)
+    assert _client(EMPTY_DUMP).ports() == []
+    assert _client(EMPTY_DUMP).devices() == []
+
+
+def test_empty_system_reply():
+    sysinfo = _client(EMPTY_ACK).system()
+    assert sysinfo == NldevSystem()
+    # Empty, so ConfigurationCollector falls back to ``rdma system show``
+    assert sysinfo.system_line() == ""
+
+
+def test_error_reply():
+    with pytest.raises(OSError) as exc:
+        _client(EPERM).system()
+    assert exc.value.errno == errno.EPERM
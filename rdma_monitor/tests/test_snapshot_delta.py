@@ -0,0 +1,55 @@
+"""Round-trip tests for the serialization-level snapshot deltas."""
+
+import json
+
+from rdma_monitor.exporters.snapshot_delta import apply, encode
+
+SNAPSHOTS = [
+    {"performance": {"devices": {"mlx5_0/1": {"counters": {"a": 1, "b": 2, "c": 3},
+                                              "rates": {"a_per_sec": 0.5}}}},
+     "topology": {"gids": ["fe80::1"], "nodes": 12}},
+    # One counter moves, the list is rewritten in place
+    {"performance": {"devices": {"mlx5_0/1": {"counters": {"a": 1, "b": 2, "c": 4},
+                                              "rates": {"a_per_sec": 0.5}}}},
+     "topology": {"gids": ["fe80::1", "fe80::2"], "nodes": 12}},
+    # A counter disappears, a port and a collector appear, a type changes
+    {"performance": {"devices": {"mlx5_0/1": {"counters": {"a": 1, "c": 4},
+                                              "rates": {"a_per_sec": 0.5}},
+                                 "mlx5_1/1": {"counters": {"a": True}}}},
+     "topology": {"gids": ["fe80::1", "fe80::2"], "nodes": 12.0},
+     "link_status": {"devices": {1: {"state": object}}}},
+    # Unchanged
+    None,
+    # A nested section is replaced by a scalar and vice versa
+    {"performance": 0,
+     "topology": {"gids": {"0": {"gid": "fe80::1"}}, "nodes": 12.0},
+     "link_status": {"devices": {1: {"state": object}}}},
+]
+
+
+def test_encode_round_trip():
+    tree = state = previous = None
+    deltas = []
+    for data in SNAPSHOTS:
+        data = data or previous
+        text, tree, delta = encode(data, tree)
+        assert text == json.dumps(data, separators=(",", ":"), default=str)
+        full = json.loads(text)
+        state = full if delta is None else apply(state, json.loads(delta))
+        assert state == full
+        deltas.append(delta)
+        previous = data
+    assert deltas[0] is None
+    assert deltas[3] == "{}"
+
+
+def test_small_change_is_key_level():
+    _, tree, _ = encode(SNAPSHOTS[0])
+    _, _, delta = encode(SNAPSHOTS[1], tree)
+    assert json.loads(delta) == {
+        "n": {
+            "performance": {"n": {"devices": {"n": {"mlx5_0/1": {"n": {
+                "counters": {"c": {"c": 4}}}}}}}},
+            "topology": {"c": {"gids": ["fe80::1", "fe80::2"]}},
+        },
+    }
@@ -0,0 +1,278 @@
+"""Per-cycle acquisition layer shared by all collectors.
+
+Several collectors read the same sources in one cycle: ``ethtool -S`` for
+a netdev, the ``hw_counters`` CNP counters, ``port_rcv_errors`` and so on.
+:class:`Acquisition` fetches each sysfs file and each external command
+output at most once per cycle and hands every collector the same sample,
+so their views are consistent with each other.  Concurrent requests for a
+source that is still being fetched wait for the in-flight fetch instead of
+starting a second one.
+
+Each collector run is bound to the cycle it started in
+(:meth:`Acquisition.cycle_scope`): a run that overruns into the next
+cycle keeps reading from, and writing to, its own cycle's cache, so its
+prefetched commands are not fetched again and its late samples do not
+leak into the new cycle.
+"""
+
+import logging
+import mmap
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from rdma_monitor.utils.counter_reader import CounterReader, get_counter_reader
+from rdma_monitor.utils import rdma_netlink
+from rdma_monitor.utils.command_executor import get_executor
+from rdma_monitor.utils.ethtool_native import EthtoolStatsReader
+
+logger = logging.getLogger(__name__)
+
+_ETHTOOL_STAT_RE = re.compile(r"\s*(\S+):\s+(\d+)")
+
+
+def parse_ethtool_stats(output: str) -> dict[str, int]:
+    """Parse ``ethtool -S`` text output into a name -> value dict."""
+    stats: dict[str, int] = {}
+    for line in output.splitlines():
+        m = _ETHTOOL_STAT_RE.match(line)
+        if m:
+            stats[m.group(1)] = int(m.group(2))
+    return stats
+
+
+class _Slot:
+    """One cached source; *ready* is set once *value* has been fetched."""
+
+    __slots__ = ("ready", "value")
+
+    def __init__(self) -> None:
+        self.ready = threading.Event()
+        self.value: Any = None
+
+
+class Acquisition:
+    """Fetches sources at most once per cycle and counts the dedup hits.
+
+    Call :meth:`begin_cycle` before the collectors of a cycle run and
+    :meth:`end_cycle` afterwards to read the statistics.
+    """
+
+    def __init__(self, reader: CounterReader | None = None,
+                 ethtool_reader: EthtoolStatsReader | None = None):
+        self._reader = reader or get_counter_reader()
+        self._ethtool = ethtool_reader or EthtoolStatsReader()
+        self._lock = threading.Lock()
+        self._cache: dict[tuple[str, Any], _Slot] = {}
+        # Cache a collector run captured when it started (see cycle_scope)
+        self._local = threading.local()
+        self._fetches: dict[str, int] = {}
+        self._hits: dict[str, int] = {}
+
+    def _count(self, kind: str) -> None:
+        with self._lock:
+            self._fetches[kind] = self._fetches.get(kind, 0) + 1
+
+    def _scoped_cache(self) -> dict[tuple[str, Any], _Slot]:
+        """Cache of the calling run's cycle (the current one if unbound)."""
+        cache = getattr(self._local, "cache", None)
+        return self._cache if cache is None else cache
+
+    def _get(self, kind: str, key: Any, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            cache = self._scoped_cache()
+            slot = cache.get((kind, key))
+            owner = slot is None
+            if owner:
+                slot = _Slot()
+                cache[(kind, key)] = slot
+                self._fetches[kind] = self._fetches.get(kind, 0) + 1
+            else:
+                self._hits[kind] = self._hits.get(kind, 0) + 1
+        if owner:
+            try:
+                slot.value = loader()
+            finally:
+                slot.ready.set()
+        else:
+            slot.ready.wait()
+        return slot.value
+
+    # ------------------------------------------------------------------
+    # Sources
+    # ------------------------------------------------------------------
+
+    def read_int(self, path: str) -> int | None:
+        """Integer sysfs counter, read through the shared CounterReader."""
+        return self._get("sysfs", path, lambda: self._reader.read_int(path))
+
+    def read_many(self, directory: str, names: list[str]) -> dict[str, int]:
+        """Read several counters from *directory*, skipping unreadable ones."""
+        counters: dict[str, int] = {}
+        for name in names:
+            val = self.read_int(f"{directory}/{name}")
+            if val is not None:
+                counters[name] = val
+        return counters
+
+    def read_text(self, path: str) -> str | None:
+        """Stripped text of a sysfs attribute, or None if unreadable."""
+        def _load() -> str | None:
+            try:
+                return Path(path).read_text().strip()
+            except (FileNotFoundError, PermissionError, OSError):
+                return None
+        return self._get("sysfs", path, _load)
+
+    def run(self, cmd: list[str], timeout: float = 10,
+            max_output: int | None = None) -> str:
+        """Stdout of an external command (empty string on failure)."""
+        return self._get("command", tuple(cmd),
+                         lambda: get_executor().run(cmd, timeout, max_output))
+
+    def dump(self, cmd: list[str], timeout: float = 10,
+             max_output: int | None = None) -> mmap.mmap | None:
+        """Output of a command too large to buffer, as a read-only mapping.
+
+        See :meth:`CommandExecutor.dump`; the mapping is shared between
+        collectors for the cycle and must not be closed by them.
+        """
+        return self._get("dump", tuple(cmd),
+                         lambda: get_executor().dump(cmd, timeout, max_output))
+
+    def _claim(self, kind: str, cmds: list[list[str]]
+               ) -> list[tuple[list[str], _Slot]]:
+        """Slots for the *cmds* not yet fetched (or in flight) this cycle."""
+        owned: list[tuple[list[str], _Slot]] = []
+        with self._lock:
+            cache = self._scoped_cache()
+            for cmd in cmds:
+                key = (kind, tuple(cmd))
+                if key in cache:
+                    continue
+                slot = _Slot()
+                cache[key] = slot
+                self._fetches[kind] = self._fetches.get(kind, 0) + 1
+                owned.append((cmd, slot))
+        return owned
+
+    def prefetch(self, cmds: list[list[str]], timeout: float = 10,
+                 max_output: int | None = None,
+                 dumps: list[list[str]] | None = None) -> None:
+        """Start every command in *cmds* at once and cache the outputs.
+
+        Collectors call this before their per-device loop so that the
+        per-device tool calls overlap on the shared executor; the later
+        :meth:`run` calls are then served from the cycle cache.  Commands
+        already fetched (or in flight) this cycle are not started again.
+        *dumps* are started alongside and served to :meth:`dump`.
+        """
+        owned = self._claim("command", cmds)
+        owned_dumps = self._claim("dump", dumps or [])
+        if not owned and not owned_dumps:
+            return
+        executor = get_executor()
+        futures = [executor.dump_async(cmd, timeout, max_output)
+                   for cmd, _ in owned_dumps]
+        outputs: list[str] = []
+        try:
+            if owned:
+                outputs = executor.run_many([(cmd, timeout) for cmd, _ in owned],
+                                            max_output)
+        finally:
+            for i, (_, slot) in enumerate(owned):
+                slot.value = outputs[i] if i < len(outputs) else ""
+                slot.ready.set()
+            for fut, (cmd, slot) in zip(futures, owned_dumps):
+                try:
+                    slot.value = fut.result()
+                except Exception:
+                    logger.exception("Dump of %s failed", " ".join(cmd))
+                    slot.value = None
+                finally:
+                    slot.ready.set()
+
+    def ethtool_stats(self, netdev: str) -> dict[str, int]:
+        """``ethtool -S`` statistics of *netdev*.
+
+        Read through SIOCETHTOOL when possible, falling back to forking
+        ``ethtool -S`` and parsing its output.  The returned dict is shared
+        between collectors and must not be mutated.
+        """
+        def _load() -> dict[str, int]:
+            stats = self._ethtool.read(netdev)
+            if stats is not None:
+                self._count("ethtool_ioctl")
+                return stats
+            return parse_ethtool_stats(self.run(["ethtool", "-S", netdev]))
+        return self._get("ethtool_stats", netdev, _load)
+
+    def rdma_ports(self) -> list[rdma_netlink.NldevPort] | None:
+        """RDMA port/link dump over netlink, or None if unavailable."""
+        return self._get("nldev", "ports", lambda: rdma_netlink.query("ports"))
+
+    def rdma_system(self) -> rdma_netlink.NldevSystem | None:
+        """RDMA subsystem settings over netlink, or None if unavailable."""
+        return self._get("nldev", "system", lambda: rdma_netlink.query("system"))
+
+    # ------------------------------------------------------------------
+    # Cycle management
+    # ------------------------------------------------------------------
+
+    def close(self) -> None:
+        """Release the ethtool socket; cached counter fds are shared."""
+        self._ethtool.close()
+
+    def begin_cycle(self) -> None:
+        """Start a new cycle cache.
+
+        Runs still bound to the previous cycle keep its cache alive until
+        they finish; it is dropped with the last of them.
+        """
+        with self._lock:
+            self._cache = {}
+
+    @contextmanager
+    def cycle_scope(self) -> Iterator[None]:
+        """Bind the calling thread to the current cycle for one collector run."""
+        with self._lock:
+            self._local.cache = self._cache
+        try:
+            yield
+        finally:
+            self._local.cache = None
+
+    def end_cycle(self) -> dict[str, Any]:
+        """Return and reset fetch / dedup-hit counts for the cycle.
+
+        Returns:
+            dict with ``<kind>_fetches`` and ``<kind>_hits`` per source kind
+            (sysfs, command, dump, ethtool_stats, nldev), the number of ethtool stats
+            served by ioctl instead of a fork, plus totals.
+        """
+        with self._lock:
+            fetches, hits = self._fetches, self._hits
+            self._fetches, self._hits = {}, {}
+        stats: dict[str, Any] = {}
+        for kind in ("sysfs", "command", "dump", "ethtool_stats", "nldev"):
+            stats[f"{kind}_fetches"] = fetches.get(kind, 0)
+            stats[f"{kind}_hits"] = hits.get(kind, 0)
+        stats["ethtool_ioctl_reads"] = fetches.pop("ethtool_ioctl", 0)
+        stats["total_fetches"] = sum(fetches.values())
+        stats["total_hits"] = sum(hits.values())
+        return stats
+
+
+_shared_acquisition: Acquisition | None = None
+_shared_lock = threading.Lock()
+
+
+def get_acquisition() -> Acquisition:
+    """Return the process-wide :class:`Acquisition` used by collectors."""
+    global _shared_acquisition
+    with _shared_lock:
+        if _shared_acquisition is None:
+            _shared_acquisition = Acquisition()
+        return _shared_acquisition
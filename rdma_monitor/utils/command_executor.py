@@ -0,0 +1,257 @@
+"""Shared asyncio subprocess executor for diagnostic tools.
+
+Collectors call ``perfquery``, ``ibstatus``, ``mlxcable``, ``mlxconfig``,
+``ethtool`` and friends once per device.  :class:`CommandExecutor` runs
+them with ``asyncio.create_subprocess_exec`` on a dedicated event-loop
+thread so that a batch of per-device calls overlaps, bounded by one global
+concurrency cap.  Each command runs in its own session; on timeout or when
+its output exceeds the size limit the whole process group is killed.
+
+Commands with very large output (fabric-wide LFT dumps) can instead write
+straight to an anonymous temp file, which is handed back memory-mapped
+(:meth:`CommandExecutor.dump`), so the output is never buffered in the
+process.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import mmap
+import os
+import signal
+import tempfile
+import threading
+from typing import IO, Sequence
+
+logger = logging.getLogger(__name__)
+
+_READ_CHUNK = 65536
+
+# How often a dump's file size is checked against its limit (seconds)
+_DUMP_POLL = 0.5
+
+
+class CommandExecutor:
+    """Runs external commands concurrently from synchronous callers.
+
+    Args:
+        max_concurrency: Maximum number of child processes alive at once.
+        max_output: Maximum stdout bytes kept per command; the process
+                    group is killed once it is exceeded and the output is
+                    truncated.
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_output: int = 4 * 1024 * 1024):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_output = max_output
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._sem: asyncio.Semaphore | None = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Event-loop thread
+    # ------------------------------------------------------------------
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def _serve() -> None:
+                    asyncio.set_event_loop(loop)
+                    self._sem = asyncio.Semaphore(self.max_concurrency)
+                    ready.set()
+                    loop.run_forever()
+
+                self._thread = threading.Thread(
+                    target=_serve, name="rdma-cmd-executor", daemon=True
+                )
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    @staticmethod
+    def _kill_group(proc: asyncio.subprocess.Process) -> None:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    async def _read_limited(self, proc: asyncio.subprocess.Process,
+                            cmd: Sequence[str], limit: int) -> bytes:
+        chunks: list[bytes] = []
+        size = 0
+        assert proc.stdout is not None
+        while True:
+            chunk = await proc.stdout.read(_READ_CHUNK)
+            if not chunk:
+                break
+            if size + len(chunk) > limit:
+                chunks.append(chunk[:limit - size])
+                logger.warning("Output of %s exceeded %d bytes; truncated",
+                               " ".join(cmd), limit)
+                self._kill_group(proc)
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+        await proc.wait()
+        return b"".join(chunks)
+
+    @staticmethod
+    async def _spawn(cmd: Sequence[str], stdout: int | IO[bytes]
+                     ) -> asyncio.subprocess.Process | None:
+        try:
+            return await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=stdout,
+                stderr=asyncio.subprocess.DEVNULL,
+                start_new_session=True,
+            )
+        except FileNotFoundError:
+            logger.debug("Command not found: %s", cmd[0])
+        except OSError as exc:
+            logger.warning("Command failed (%s): %s", " ".join(cmd), exc)
+        return None
+
+    async def _run(self, cmd: Sequence[str], timeout: float, limit: int) -> str:
+        assert self._sem is not None
+        async with self._sem:
+            proc = await self._spawn(cmd, asyncio.subprocess.PIPE)
+            if proc is None:
+                return ""
+            try:
+                out = await asyncio.wait_for(self._read_limited(proc, cmd, limit), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Command timed out: %s", " ".join(cmd))
+                self._kill_group(proc)
+                await proc.wait()
+                return ""
+            except asyncio.CancelledError:
+                self._kill_group(proc)
+                raise
+            return out.decode(errors="replace").strip()
+
+    async def _wait_dump(self, proc: asyncio.subprocess.Process,
+                         cmd: Sequence[str], fh: IO[bytes], limit: int) -> bool:
+        """Wait for a dump to finish; False if it outgrew *limit*."""
+        while True:
+            try:
+                await asyncio.wait_for(proc.wait(), _DUMP_POLL)
+                return True
+            except asyncio.TimeoutError:
+                if os.fstat(fh.fileno()).st_size > limit:
+                    logger.warning("Output of %s exceeded %d bytes; killed",
+                                   " ".join(cmd), limit)
+                    self._kill_group(proc)
+                    await proc.wait()
+                    return False
+
+    async def _dump(self, cmd: Sequence[str], timeout: float,
+                    limit: int) -> mmap.mmap | None:
+        assert self._sem is not None
+        with tempfile.TemporaryFile() as fh:
+            async with self._sem:
+                proc = await self._spawn(cmd, fh)
+                if proc is None:
+                    return None
+                try:
+                    complete = await asyncio.wait_for(
+                        self._wait_dump(proc, cmd, fh, limit), timeout)
+                except asyncio.TimeoutError:
+                    logger.warning("Command timed out: %s", " ".join(cmd))
+                    self._kill_group(proc)
+                    await proc.wait()
+                    return None
+                except asyncio.CancelledError:
+                    self._kill_group(proc)
+                    raise
+            if not complete or os.fstat(fh.fileno()).st_size == 0:
+                return None
+            # The mapping outlives the (already unlinked) file
+            return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    async def _run_many(self, cmds: Sequence[tuple[Sequence[str], float]],
+                        limit: int) -> list[str]:
+        return list(await asyncio.gather(
+            *(self._run(cmd, timeout, limit) for cmd, timeout in cmds)
+        ))
+
+    # ------------------------------------------------------------------
+    # Public interface
+    # ------------------------------------------------------------------
+
+    def run(self, cmd: Sequence[str], timeout: float = 10,
+            max_output: int | None = None) -> str:
+        """Run one command and return its stripped stdout ("" on failure)."""
+        return self.run_many([(cmd, timeout)], max_output)[0]
+
+    def run_many(self, cmds: Sequence[tuple[Sequence[str], float]],
+                 max_output: int | None = None) -> list[str]:
+        """Run ``(cmd, timeout)`` pairs concurrently; outputs keep their order.
+
+        *max_output* overrides the executor-wide output limit for this
+        batch (fabric-wide dumps are much larger than per-device output).
+        """
+        if not cmds:
+            return []
+        loop = self._ensure_loop()
+        limit = self.max_output if max_output is None else max_output
+        return asyncio.run_coroutine_threadsafe(
+            self._run_many(cmds, limit), loop
+        ).result()
+
+    def dump_async(self, cmd: Sequence[str], timeout: float = 10,
+                   max_output: int | None = None
+                   ) -> "concurrent.futures.Future[mmap.mmap | None]":
+        """Start *cmd* with stdout on a temp file; see :meth:`dump`."""
+        loop = self._ensure_loop()
+        limit = self.max_output if max_output is None else max_output
+        return asyncio.run_coroutine_threadsafe(self._dump(cmd, timeout, limit), loop)
+
+    def dump(self, cmd: Sequence[str], timeout: float = 10,
+             max_output: int | None = None) -> mmap.mmap | None:
+        """Run a command with very large output and map its stdout.
+
+        The child writes to an anonymous temp file, which is returned as a
+        read-only ``mmap`` (None on failure, timeout, empty output or when
+        the file outgrows *max_output*).
+        """
+        return self.dump_async(cmd, timeout, max_output).result()
+
+    def close(self) -> None:
+        """Stop the event-loop thread."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            if self._thread is not None:
+                self._thread.join(timeout=5)
+            loop.close()
+
+
+_shared_executor: CommandExecutor | None = None
+_shared_lock = threading.Lock()
+
+
+def configure_executor(max_concurrency: int = 8,
+                       max_output: int = 4 * 1024 * 1024) -> CommandExecutor:
+    """Replace the process-wide executor with one using these limits."""
+    global _shared_executor
+    with _shared_lock:
+        if _shared_executor is not None:
+            _shared_executor.close()
+        _shared_executor = CommandExecutor(max_concurrency, max_output)
+        return _shared_executor
+
+
+def get_executor() -> CommandExecutor:
+    """Return the process-wide :class:`CommandExecutor`."""
+    global _shared_executor
+    with _shared_lock:
+        if _shared_executor is None:
+            _shared_executor = CommandExecutor()
+        return _shared_executor
@@ -0,0 +1,184 @@
+"""Vectorized counter-delta and rate computation.
+
+:class:`CounterMatrix` keeps the previous sample of every (port, counter)
+pair in NumPy arrays and turns a new sample into per-second rates with one
+vectorized pass.  It knows each counter's width so that a 32-bit IB
+PortCounters value that wrapped is distinguished from a counter that was
+reset (driver reload, ``perfquery -R``); across a reset no rate is
+emitted and the counter is flagged instead.  :func:`counter_deltas` is
+the same classification on bare arrays, for samplers that keep their own
+state.
+"""
+
+import numpy as np
+
+_U64_MAX = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+# Values of the per-counter flags returned by CounterMatrix.update()
+FLAG_WRAP = "wrap"
+FLAG_RESET = "reset"
+FLAG_SATURATED = "saturated"
+
+
+# PortCounters data/packet counters are 32 bits wide (and saturate or wrap
+# quickly at 100G+); the unicast/multicast ones only exist in the 64-bit
+# extended set.  hw_counters are 64 bits.  Narrow counters are promoted to
+# 64 bits per port once a larger value is seen (extended-width devices).
+PORT_COUNTER_WIDTHS = {
+    "port_xmit_data": 32,
+    "port_rcv_data": 32,
+    "port_xmit_packets": 32,
+    "port_rcv_packets": 32,
+}
+
+
+def _mask(width: int) -> np.uint64:
+    return _U64_MAX if width >= 64 else np.uint64((1 << width) - 1)
+
+
+def counter_deltas(prev: np.ndarray, cur: np.ndarray, had: np.ndarray,
+                   present: np.ndarray, width: np.ndarray
+                   ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Width-aware deltas between two samples of the same counters.
+
+    Args:
+        prev: Previous values (uint64).
+        cur: Current values (uint64), same shape.
+        had: Whether each previous value was read.
+        present: Whether each current value was read.
+        width: Bit width per value (uint8); narrow counters that report a
+               value above their range are promoted to 64 bits.
+
+    Returns:
+        (delta, width, wrap, reset, saturated): the modular uint64 deltas,
+        the updated widths and boolean masks of counters that wrapped,
+        were reset, or sit at their maximum.  Deltas of reset or
+        saturated counters are meaningless.
+    """
+    # Promote narrow counters that reported a value above their range
+    narrow = width < 64
+    limit = np.left_shift(np.uint64(1), width.astype(np.uint64) % np.uint64(64))
+    promote = narrow & present & (cur >= limit)
+    width = np.where(promote, np.uint8(64), width)
+    narrow = width < 64
+
+    mask = np.where(
+        narrow,
+        np.left_shift(np.uint64(1), width.astype(np.uint64) % np.uint64(64))
+        - np.uint64(1),
+        _U64_MAX,
+    )
+    delta = (cur - prev) & mask
+    backwards = present & had & (cur < prev)
+    # A narrow counter that went backwards wrapped when its modular
+    # (forward) delta is under half its range, i.e. it moved back by more
+    # than half the range.  A counter that was pinned at its maximum did
+    # not wrap: it saturated and was then reset.  Anything else going
+    # backwards was reset.
+    pinned = had & narrow & (prev == mask)
+    wrap = backwards & narrow & ~pinned & (delta < (mask >> np.uint64(1)))
+    reset = backwards & ~wrap
+    saturated = present & narrow & (cur == mask)
+    return delta, width, wrap, reset, saturated
+
+
+class CounterMatrix:
+    """Previous samples and rate computation for ports x counters.
+
+    Args:
+        counters: Counter names; they become the matrix columns.
+        widths: Bit width per counter name (default 64).  A counter with a
+                width below 64 is promoted to 64 bits for a port as soon
+                as a value above its range is seen there, which covers
+                ports whose driver reports extended (64-bit) counters.
+    """
+
+    def __init__(self, counters: list[str], widths: dict[str, int] | None = None):
+        widths = widths or {}
+        self.counters = list(counters)
+        self._col = {name: i for i, name in enumerate(self.counters)}
+        self._default_width = np.array(
+            [widths.get(n, 64) for n in self.counters], dtype=np.uint8
+        )
+        self._rows: dict[str, int] = {}
+        ncols = len(self.counters)
+        self._prev = np.zeros((0, ncols), dtype=np.uint64)
+        self._present = np.zeros((0, ncols), dtype=bool)
+        self._width = np.zeros((0, ncols), dtype=np.uint8)
+        self._ts = np.zeros(0, dtype=np.float64)
+
+    def _row(self, key: str) -> int:
+        row = self._rows.get(key)
+        if row is None:
+            row = len(self._rows)
+            self._rows[key] = row
+            ncols = len(self.counters)
+            self._prev = np.vstack([self._prev, np.zeros((1, ncols), np.uint64)])
+            self._present = np.vstack([self._present, np.zeros((1, ncols), bool)])
+            self._width = np.vstack([self._width, self._default_width[None, :]])
+            self._ts = np.append(self._ts, 0.0)
+        return row
+
+    def update(self, samples: dict[str, dict[str, int]], now: float
+               ) -> dict[str, tuple[dict[str, float], dict[str, str]]]:
+        """Feed one sample per port and compute rates against the last one.
+
+        Args:
+            samples: port key -> {counter name: value}.  Counters missing
+                     from a port's dict are treated as absent this cycle.
+            now: Monotonic timestamp of the sample.
+
+        Returns:
+            port key -> (rates, flags).  *rates* maps ``<counter>_per_sec``
+            to a rate for every counter with a valid delta; *flags* maps a
+            counter name to ``"wrap"``, ``"reset"`` or ``"saturated"`` when
+            that condition was detected this cycle.
+        """
+        keys = list(samples)
+        rows = np.array([self._row(k) for k in keys], dtype=np.intp)
+        ncols = len(self.counters)
+
+        cur = np.zeros((len(keys), ncols), dtype=np.uint64)
+        present = np.zeros((len(keys), ncols), dtype=bool)
+        col = self._col
+        for i, key in enumerate(keys):
+            for name, value in samples[key].items():
+                j = col.get(name)
+                if j is not None and value is not None and value >= 0:
+                    cur[i, j] = value
+                    present[i, j] = True
+
+        prev = self._prev[rows]
+        had = self._present[rows]
+        delta, width, wrap, reset, saturated = counter_deltas(
+            prev, cur, had, present, self._width[rows]
+        )
+
+        elapsed = now - self._ts[rows]
+        ok_time = (self._ts[rows] > 0) & (elapsed > 0)
+        valid = present & had & ~reset & ~saturated & ok_time[:, None]
+        safe_elapsed = np.where(ok_time, elapsed, 1.0)[:, None]
+        rates = np.round(delta.astype(np.float64) / safe_elapsed, 2)
+
+        # Store the new sample; keep the old one for absent counters
+        self._prev[rows] = np.where(present, cur, prev)
+        self._present[rows] = present
+        self._width[rows] = width
+        self._ts[rows] = now
+
+        names = self.counters
+        result: dict[str, tuple[dict[str, float], dict[str, str]]] = {}
+        for i, key in enumerate(keys):
+            row_rates = {
+                f"{names[j]}_per_sec": float(rates[i, j])
+                for j in np.flatnonzero(valid[i])
+            }
+            flags: dict[str, str] = {}
+            for j in np.flatnonzero(wrap[i]):
+                flags[names[j]] = FLAG_WRAP
+            for j in np.flatnonzero(reset[i]):
+                flags[names[j]] = FLAG_RESET
+            for j in np.flatnonzero(saturated[i]):
+                flags[names[j]] = FLAG_SATURATED
+            result[key] = (row_rates, flags)
+        return result
@@ -0,0 +1,143 @@
+"""Fork-free ``ethtool -S`` via the SIOCETHTOOL ioctl.
+
+Per poll, :class:`EthtoolStatsReader` issues two ioctls per netdev:
+``ETHTOOL_GSSET_INFO`` for the current statistics count and
+``ETHTOOL_GSTATS`` for the u64 array.  The string table
+(``ETHTOOL_GSTRINGS``) is cached per netdev and only re-fetched when the
+count changes (e.g. after ``ethtool -L``) or the cache ages out.
+
+Returns None whenever the ioctl path is unavailable (non-Linux, missing
+CAP_NET_ADMIN, driver without string sets) so callers can fall back to
+forking ``ethtool -S``.
+"""
+
+import ctypes
+import fcntl
+import logging
+import socket
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SIOCETHTOOL = 0x8946
+ETHTOOL_GSTRINGS = 0x0000001B
+ETHTOOL_GSTATS = 0x0000001D
+ETHTOOL_GSSET_INFO = 0x00000037
+ETH_SS_STATS = 1
+ETH_GSTRING_LEN = 32
+IFNAMSIZ = 16
+
+# sizeof(struct ifreq) on 64-bit Linux
+_IFREQ_SIZE = 40
+# Extra u64 slots in the stats buffer: GSTATS writes as many values as the
+# driver reports, so leave headroom for a count that grew since GSSET_INFO.
+_STATS_SLACK = 256
+
+
+class _NetdevTable:
+    """Cached string table and reusable stats buffer for one netdev."""
+
+    __slots__ = ("names", "fetched", "buf")
+
+    def __init__(self, names: tuple[str, ...]):
+        self.names = names
+        self.fetched = time.monotonic()
+        self.buf = ctypes.create_string_buffer(8 + 8 * (len(names) + _STATS_SLACK))
+
+
+class EthtoolStatsReader:
+    """Reads NIC statistics through SIOCETHTOOL without forking.
+
+    Args:
+        strings_ttl: Seconds after which a netdev's string table is
+                     re-fetched even if the count did not change.
+        retry_after: Seconds before retrying a netdev whose ioctl failed.
+    """
+
+    def __init__(self, strings_ttl: float = 300.0, retry_after: float = 300.0):
+        self._strings_ttl = strings_ttl
+        self._retry_after = retry_after
+        self._tables: dict[str, _NetdevTable] = {}
+        self._failed: dict[str, float] = {}
+        self._sock: socket.socket | None = None
+        self._lock = threading.Lock()
+
+    def _ioctl(self, netdev: str, buf: ctypes.Array) -> None:
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        ifr = bytearray(_IFREQ_SIZE)
+        struct.pack_into(f"{IFNAMSIZ}sP", ifr, 0,
+                         netdev.encode()[:IFNAMSIZ - 1], ctypes.addressof(buf))
+        fcntl.ioctl(self._sock.fileno(), SIOCETHTOOL, ifr)
+
+    def _stats_count(self, netdev: str) -> int:
+        # struct ethtool_sset_info { u32 cmd; u32 reserved; u64 sset_mask;
+        #                            u32 data[]; }
+        buf = ctypes.create_string_buffer(20)
+        struct.pack_into("IIQ", buf, 0, ETHTOOL_GSSET_INFO, 0, 1 << ETH_SS_STATS)
+        self._ioctl(netdev, buf)
+        mask = struct.unpack_from("Q", buf, 8)[0]
+        if not mask & (1 << ETH_SS_STATS):
+            raise OSError("driver has no ETH_SS_STATS string set")
+        return struct.unpack_from("I", buf, 16)[0]
+
+    def _strings(self, netdev: str, count: int) -> tuple[str, ...]:
+        # struct ethtool_gstrings { u32 cmd; u32 string_set; u32 len;
+        #                           u8 data[]; }
+        buf = ctypes.create_string_buffer(12 + count * ETH_GSTRING_LEN)
+        struct.pack_into("III", buf, 0, ETHTOOL_GSTRINGS, ETH_SS_STATS, count)
+        self._ioctl(netdev, buf)
+        n = min(count, struct.unpack_from("I", buf, 8)[0])
+        raw = buf.raw
+        return tuple(
+            raw[12 + i * ETH_GSTRING_LEN:12 + (i + 1) * ETH_GSTRING_LEN]
+            .split(b"\0", 1)[0].decode(errors="replace")
+            for i in range(n)
+        )
+
+    def _table(self, netdev: str) -> _NetdevTable:
+        count = self._stats_count(netdev)
+        table = self._tables.get(netdev)
+        if (table is None or len(table.names) != count
+                or time.monotonic() - table.fetched > self._strings_ttl):
+            table = _NetdevTable(self._strings(netdev, count))
+            self._tables[netdev] = table
+        return table
+
+    def _read(self, netdev: str) -> dict[str, int]:
+        table = self._table(netdev)
+        # struct ethtool_stats { u32 cmd; u32 n_stats; u64 data[]; }
+        struct.pack_into("II", table.buf, 0, ETHTOOL_GSTATS, len(table.names))
+        self._ioctl(netdev, table.buf)
+        n_stats = struct.unpack_from("I", table.buf, 4)[0]
+        if n_stats != len(table.names):
+            # Count changed between the two ioctls; refresh next poll.
+            self._tables.pop(netdev, None)
+            n_stats = min(n_stats, len(table.names))
+        values = memoryview(table.buf).cast("B")[8:8 + 8 * n_stats].cast("Q")
+        return dict(zip(table.names, values))
+
+    def read(self, netdev: str) -> dict[str, int] | None:
+        """Return ``ethtool -S`` statistics of *netdev*, or None."""
+        with self._lock:
+            retry_at = self._failed.get(netdev)
+            if retry_at is not None and time.monotonic() < retry_at:
+                return None
+            try:
+                stats = self._read(netdev)
+            except OSError as exc:
+                logger.debug("SIOCETHTOOL stats failed for %s: %s", netdev, exc)
+                self._tables.pop(netdev, None)
+                self._failed[netdev] = time.monotonic() + self._retry_after
+                return None
+            self._failed.pop(netdev, None)
+            return stats
+
+    def close(self) -> None:
+        with self._lock:
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+            self._tables.clear()
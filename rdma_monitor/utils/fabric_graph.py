@@ -0,0 +1,301 @@
+"""InfiniBand fabric graph built from ``ibnetdiscover`` output.
+
+:func:`parse_ibnetdiscover` turns a subnet dump into a :class:`FabricGraph`
+held in a handful of NumPy arrays (nodes sorted by GUID, one row per
+physical link with its width and speed), which stays in the low megabytes
+even for 10k-node fabrics.  :func:`diff_graphs` compares two sweeps and
+returns only the links that were added, removed or came up degraded.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+
+NODE_CA = 1
+NODE_SWITCH = 2
+NODE_ROUTER = 3
+_NODE_TYPES = {"Ca": NODE_CA, "Switch": NODE_SWITCH, "Rtr": NODE_ROUTER}
+NODE_TYPE_NAMES = {NODE_CA: "ca", NODE_SWITCH: "switch", NODE_ROUTER: "router"}
+
+# Link speed codes, ordered so that a lower code is a slower link
+SPEEDS = ["", "SDR", "DDR", "QDR", "FDR10", "FDR", "EDR", "HDR", "NDR", "XDR"]
+_SPEED_CODE = {name: code for code, name in enumerate(SPEEDS) if name}
+
+_NODE_RE = re.compile(
+    r'^(Switch|Ca|Rtr)\s+(\d+)\s+"[SHR]-([0-9a-fA-F]+)"\s*#\s*"([^"]*)"(.*)$'
+)
+_LINK_RE = re.compile(
+    r'^\[(\d+)\](?:\([0-9a-fA-F]+\))?\s+"[SHR]-([0-9a-fA-F]+)"\[(\d+)\]'
+)
+_LID_RE = re.compile(r"\blid (\d+)")
+_RATE_RE = re.compile(r"\b(\d+)x([A-Z]+\d*)\s*$")
+
+
+@dataclass
+class FabricGraph:
+    """One fabric sweep.
+
+    Nodes are sorted by GUID, so the node index of a GUID is a binary
+    search away.  Every physical link appears once, oriented from the
+    endpoint with the lower (node index, port) to the higher one.
+    """
+    guids: np.ndarray                  # uint64 [n_nodes]
+    node_type: np.ndarray              # uint8  [n_nodes]
+    num_ports: np.ndarray              # uint8  [n_nodes]
+    names: list[str]                   # node description per node
+    link_a: np.ndarray                 # int32  [n_links] node index
+    port_a: np.ndarray                 # uint8  [n_links]
+    link_b: np.ndarray                 # int32  [n_links]
+    port_b: np.ndarray                 # uint8  [n_links]
+    width: np.ndarray                  # uint8  [n_links] lanes (1x/4x/...)
+    speed: np.ndarray                  # uint8  [n_links] index into SPEEDS
+    lid_node: np.ndarray               # int32  [n_lids] owning node index
+    lid_port: np.ndarray               # uint8  [n_lids] owning port (0 = switch)
+    lids: np.ndarray                   # uint32 [n_lids]
+    _adjacency: tuple | None = field(default=None, repr=False)
+
+    @property
+    def num_nodes(self) -> int:
+        return int(self.guids.size)
+
+    @property
+    def num_links(self) -> int:
+        return int(self.link_a.size)
+
+    def node_index(self, guid: int) -> int | None:
+        """Index of the node with *guid*, or None."""
+        i = int(np.searchsorted(self.guids, np.uint64(guid)))
+        if i < self.guids.size and int(self.guids[i]) == guid:
+            return i
+        return None
+
+    def switch_links(self) -> np.ndarray:
+        """Boolean mask of switch-to-switch links."""
+        t = self.node_type
+        return (t[self.link_a] == NODE_SWITCH) & (t[self.link_b] == NODE_SWITCH)
+
+    def adjacency(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """CSR adjacency over both link directions (built once, cached).
+
+        Returns:
+            (indptr, neighbor, local_port, link) where the neighbors of
+            node ``i`` are ``neighbor[indptr[i]:indptr[i + 1]]``, reached
+            through ``local_port`` over link index ``link``.
+        """
+        if self._adjacency is None:
+            src = np.concatenate([self.link_a, self.link_b])
+            dst = np.concatenate([self.link_b, self.link_a])
+            port = np.concatenate([self.port_a, self.port_b])
+            link = np.concatenate([np.arange(self.num_links)] * 2).astype(np.int32)
+            order = np.argsort(src, kind="stable")
+            indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+            np.cumsum(np.bincount(src, minlength=self.num_nodes), out=indptr[1:])
+            self._adjacency = (indptr, dst[order], port[order], link[order])
+        return self._adjacency
+
+    def port_label(self, node: int, port: int) -> str:
+        return f"{self.names[node] or f'0x{int(self.guids[node]):016x}'}[{port}]"
+
+    def link_record(self, i: int) -> dict[str, Any]:
+        return {
+            "a": self.port_label(int(self.link_a[i]), int(self.port_a[i])),
+            "b": self.port_label(int(self.link_b[i]), int(self.port_b[i])),
+            "a_guid": f"0x{int(self.guids[self.link_a[i]]):016x}",
+            "b_guid": f"0x{int(self.guids[self.link_b[i]]):016x}",
+            "width": f"{int(self.width[i])}x",
+            "speed": SPEEDS[int(self.speed[i])],
+        }
+
+    def summary(self) -> dict[str, Any]:
+        t = self.node_type
+        return {
+            "switches_count": int(np.count_nonzero(t == NODE_SWITCH)),
+            "hcas_count": int(np.count_nonzero(t == NODE_CA)),
+            "routers_count": int(np.count_nonzero(t == NODE_ROUTER)),
+            "links_count": self.num_links,
+            "switch_links_count": int(np.count_nonzero(self.switch_links())),
+        }
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the graph arrays."""
+        arrays = (self.guids, self.node_type, self.num_ports, self.link_a,
+                  self.port_a, self.link_b, self.port_b, self.width,
+                  self.speed, self.lid_node, self.lid_port, self.lids)
+        return sum(a.nbytes for a in arrays) + sum(len(n) for n in self.names)
+
+
+def parse_ibnetdiscover(text: str) -> FabricGraph:
+    """Parse ``ibnetdiscover`` output into a :class:`FabricGraph`.
+
+    Each link is listed from both of its ends; the two listings are merged.
+    Links to nodes missing from the dump are dropped.
+    """
+    node_guids: list[int] = []
+    node_types: list[int] = []
+    node_ports: list[int] = []
+    node_names: list[str] = []
+    # Raw link listings: (guid, port, peer guid, peer port, width, speed)
+    raw: list[tuple[int, int, int, int, int, int]] = []
+    # (guid, port, lid); port 0 is a switch's management port
+    lid_rows: list[tuple[int, int, int]] = []
+
+    cur_guid = -1
+    cur_type = 0
+    for line in text.splitlines():
+        if not line:
+            continue
+        first = line[0]
+        if first == "[":
+            if cur_guid < 0:
+                continue
+            m = _LINK_RE.match(line)
+            if m is None:
+                continue
+            port = int(m.group(1))
+            width = speed = 0
+            r = _RATE_RE.search(line)
+            if r is not None:
+                width = int(r.group(1))
+                speed = _SPEED_CODE.get(r.group(2), 0)
+            raw.append((cur_guid, port, int(m.group(2), 16), int(m.group(3)),
+                        width, speed))
+            if cur_type != NODE_SWITCH:
+                # Ca/Rtr port lines carry the local LID first after '#'
+                comment = line.find("#")
+                lm = _LID_RE.search(line, comment) if comment >= 0 else None
+                if lm is not None:
+                    lid_rows.append((cur_guid, port, int(lm.group(1))))
+        elif first in "SCR":
+            m = _NODE_RE.match(line)
+            if m is None:
+                continue
+            cur_type = _NODE_TYPES[m.group(1)]
+            cur_guid = int(m.group(3), 16)
+            node_guids.append(cur_guid)
+            node_types.append(cur_type)
+            node_ports.append(int(m.group(2)))
+            node_names.append(m.group(4))
+            if cur_type == NODE_SWITCH:
+                lm = _LID_RE.search(m.group(5))
+                if lm is not None:
+                    lid_rows.append((cur_guid, 0, int(lm.group(1))))
+        elif first == "v":
+            # "vendid=" opens the next node block
+            cur_guid = -1
+
+    guids = np.array(node_guids, dtype=np.uint64)
+    order = np.argsort(guids, kind="stable")
+    guids = guids[order]
+    node_type = np.array(node_types, dtype=np.uint8)[order]
+    num_ports = np.array(node_ports, dtype=np.uint8)[order]
+    names = [node_names[i] for i in order]
+
+    def lookup(values: np.ndarray) -> np.ndarray:
+        idx = np.searchsorted(guids, values)
+        idx = np.minimum(idx, max(guids.size - 1, 0))
+        found = guids[idx] == values if guids.size else np.zeros(values.size, bool)
+        return np.where(found, idx, -1).astype(np.int32)
+
+    if raw:
+        arr = np.array(raw, dtype=np.uint64)
+        src = lookup(arr[:, 0])
+        dst = lookup(arr[:, 2])
+        sport = arr[:, 1].astype(np.int64)
+        dport = arr[:, 3].astype(np.int64)
+        ok = (src >= 0) & (dst >= 0)
+        src, dst, sport, dport = src[ok], dst[ok], sport[ok], dport[ok]
+        width = arr[ok, 4].astype(np.uint8)
+        speed = arr[ok, 5].astype(np.uint8)
+        # Orient every listing low -> high endpoint and merge duplicates
+        swap = (src.astype(np.int64) * 256 + sport) > (dst.astype(np.int64) * 256 + dport)
+        a = np.where(swap, dst, src)
+        b = np.where(swap, src, dst)
+        pa = np.where(swap, dport, sport)
+        pb = np.where(swap, sport, dport)
+        key = a.astype(np.int64) * 256 + pa
+        _, first = np.unique(key, return_index=True)
+        link_a, port_a = a[first].astype(np.int32), pa[first].astype(np.uint8)
+        link_b, port_b = b[first].astype(np.int32), pb[first].astype(np.uint8)
+        width, speed = width[first], speed[first]
+    else:
+        link_a = link_b = np.zeros(0, dtype=np.int32)
+        port_a = port_b = width = speed = np.zeros(0, dtype=np.uint8)
+
+    if lid_rows:
+        lid_arr = np.array(lid_rows, dtype=np.uint64)
+        lid_node = lookup(lid_arr[:, 0])
+        keep = lid_node >= 0
+        lid_node = lid_node[keep]
+        lid_port = lid_arr[keep, 1].astype(np.uint8)
+        lids = lid_arr[keep, 2].astype(np.uint32)
+    else:
+        lid_node = np.zeros(0, dtype=np.int32)
+        lid_port = np.zeros(0, dtype=np.uint8)
+        lids = np.zeros(0, dtype=np.uint32)
+
+    return FabricGraph(guids, node_type, num_ports, names,
+                       link_a, port_a, link_b, port_b, width, speed,
+                       lid_node, lid_port, lids)
+
+
+@dataclass
+class LinkDiff:
+    """Link changes between two sweeps (indices into the graphs' links)."""
+    added: np.ndarray      # into the new graph
+    removed: np.ndarray    # into the old graph
+    degraded: np.ndarray   # into the new graph
+    degraded_prev: np.ndarray  # matching indices into the old graph
+
+    def counts(self) -> dict[str, int]:
+        return {
+            "links_added": int(self.added.size),
+            "links_removed": int(self.removed.size),
+            "links_degraded": int(self.degraded.size),
+        }
+
+    def records(self, old: FabricGraph, new: FabricGraph,
+                limit: int = 100) -> list[dict[str, Any]]:
+        """Up to *limit* change records, degraded links first."""
+        out: list[dict[str, Any]] = []
+        for i, j in zip(self.degraded, self.degraded_prev):
+            rec = new.link_record(int(i))
+            rec["change"] = "degraded"
+            rec["prev_width"] = f"{int(old.width[j])}x"
+            rec["prev_speed"] = SPEEDS[int(old.speed[j])]
+            out.append(rec)
+        out += [{"change": "removed", **old.link_record(int(i))} for i in self.removed]
+        out += [{"change": "added", **new.link_record(int(i))} for i in self.added]
+        return out[:limit]
+
+
+def _link_keys(graph: FabricGraph, universe: np.ndarray) -> np.ndarray:
+    """One int64 per link identifying both endpoints by (GUID, port)."""
+    span = np.int64(universe.size * 256)
+    ka = np.searchsorted(universe, graph.guids[graph.link_a]).astype(np.int64) * 256 \
+        + graph.port_a
+    kb = np.searchsorted(universe, graph.guids[graph.link_b]).astype(np.int64) * 256 \
+        + graph.port_b
+    return ka * span + kb
+
+
+def diff_graphs(old: FabricGraph, new: FabricGraph) -> LinkDiff:
+    """Compare two sweeps link by link.
+
+    A link whose endpoints are unchanged but whose width or speed dropped
+    is *degraded*; a recabled port shows up as one removed and one added
+    link.
+    """
+    universe = np.union1d(old.guids, new.guids)
+    k_old = _link_keys(old, universe)
+    k_new = _link_keys(new, universe)
+    _, i_old, i_new = np.intersect1d(k_old, k_new, assume_unique=True,
+                                     return_indices=True)
+    lower = (new.width[i_new] < old.width[i_old]) | (new.speed[i_new] < old.speed[i_old])
+    return LinkDiff(
+        added=np.flatnonzero(~np.isin(k_new, k_old, assume_unique=True)),
+        removed=np.flatnonzero(~np.isin(k_old, k_new, assume_unique=True)),
+        degraded=i_new[lower],
+        degraded_prev=i_old[lower],
+    )
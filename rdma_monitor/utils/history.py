@@ -0,0 +1,169 @@
+"""In-memory per-port history of recent samples.
+
+Every numeric leaf of a collector's per-device output (counters, rates,
+error counters, ...) is kept in a fixed-size ring buffer so that questions
+like "what was the CNP rate over the last 5 minutes" can be answered
+in-process.  Buffers are preallocated per (collector, port) group, so memory
+stays constant once every metric has been seen.
+"""
+
+import threading
+from typing import Any, Iterator
+
+import numpy as np
+
+# Grow metric rows in chunks to avoid reallocating on every new metric
+_ROW_CHUNK = 32
+
+
+def iter_numeric(data: dict, prefix: str = "") -> Iterator[tuple[str, float]]:
+    """Yield ``(dotted.path, value)`` for every int/float leaf of *data*."""
+    for key, value in data.items():
+        if key.startswith("_"):
+            continue
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from iter_numeric(value, path)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, float(value)
+
+
+class _Group:
+    """Ring buffers of one (collector, port): shared timestamps + metrics."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.float64)
+        self.values = np.full((_ROW_CHUNK, capacity), np.nan, dtype=np.float64)
+        self.rows: dict[str, int] = {}
+        self.head = 0   # samples written in total
+
+    def _row(self, metric: str) -> int:
+        row = self.rows.get(metric)
+        if row is None:
+            row = len(self.rows)
+            if row >= self.values.shape[0]:
+                extra = np.full((_ROW_CHUNK, self.capacity), np.nan, dtype=np.float64)
+                self.values = np.vstack([self.values, extra])
+            self.rows[metric] = row
+        return row
+
+    def append(self, ts: float, sample: dict[str, float]) -> None:
+        col = self.head % self.capacity
+        self.ts[col] = ts
+        self.values[:, col] = np.nan
+        for metric, value in sample.items():
+            self.values[self._row(metric), col] = value
+        self.head += 1
+
+    def window(self, metric: str, since: float) -> tuple[np.ndarray, np.ndarray]:
+        row = self.rows.get(metric)
+        n = min(self.head, self.capacity)
+        if row is None or n == 0:
+            return np.empty(0), np.empty(0)
+        idx = np.arange(self.head - n, self.head) % self.capacity
+        ts = self.ts[idx]
+        vals = self.values[row, idx]
+        keep = (ts >= since) & ~np.isnan(vals)
+        return ts[keep], vals[keep]
+
+
+class HistoryStore:
+    """Per-port ring-buffer history with windowed statistics.
+
+    Args:
+        capacity: Samples kept per (collector, port).
+        exclude: Top-level per-device keys not recorded (e.g. the very wide
+                 ``ethtool_stats`` dict).
+    """
+
+    def __init__(self, capacity: int = 360, exclude: list[str] | None = None):
+        self.capacity = capacity
+        self.exclude = set(exclude or [])
+        self._groups: dict[tuple[str, str], _Group] = {}
+        self._lock = threading.Lock()
+
+    def record(self, collector: str, data: dict[str, Any], ts: float) -> None:
+        """Append one collector result (its ``devices`` subtree) at *ts*."""
+        devices = data.get("devices")
+        if not isinstance(devices, dict):
+            return
+        with self._lock:
+            for port, dev_data in devices.items():
+                if not isinstance(dev_data, dict):
+                    continue
+                sample = dict(iter_numeric(
+                    {k: v for k, v in dev_data.items() if k not in self.exclude}
+                ))
+                if not sample:
+                    continue
+                group = self._groups.get((collector, port))
+                if group is None:
+                    group = _Group(self.capacity)
+                    self._groups[(collector, port)] = group
+                group.append(ts, sample)
+
+    def metrics(self, collector: str, port: str) -> list[str]:
+        with self._lock:
+            group = self._groups.get((collector, port))
+            return sorted(group.rows) if group else []
+
+    def ports(self, collector: str) -> list[str]:
+        with self._lock:
+            return sorted(p for c, p in self._groups if c == collector)
+
+    def series(self, collector: str, port: str, metric: str, window: float,
+               now: float) -> tuple[np.ndarray, np.ndarray]:
+        """Timestamps and values of *metric* over the last *window* seconds."""
+        with self._lock:
+            group = self._groups.get((collector, port))
+            if group is None:
+                return np.empty(0), np.empty(0)
+            return group.window(metric, now - window)
+
+    def stats(self, collector: str, port: str, metric: str, window: float,
+              now: float, percentiles: tuple[float, ...] = (50, 95, 99)
+              ) -> dict[str, Any]:
+        """Windowed min/max/mean/percentiles/slope of one metric.
+
+        *slope* is the least-squares trend in units per second.  Returns
+        only ``samples: 0`` when the window holds no data.
+        """
+        ts, vals = self.series(collector, port, metric, window, now)
+        result: dict[str, Any] = {"samples": int(vals.size)}
+        if vals.size == 0:
+            return result
+        result["min"] = float(vals.min())
+        result["max"] = float(vals.max())
+        result["mean"] = round(float(vals.mean()), 4)
+        for p, v in zip(percentiles, np.percentile(vals, percentiles)):
+            result[f"p{p:g}"] = round(float(v), 4)
+        result["last"] = float(vals[-1])
+        if vals.size >= 2 and ts[-1] > ts[0]:
+            t = ts - ts.mean()
+            result["slope_per_sec"] = round(
+                float((t * (vals - vals.mean())).sum() / (t * t).sum()), 6
+            )
+        else:
+            result["slope_per_sec"] = 0.0
+        return result
+
+    def summary(self, window: float, now: float,
+                prefixes: tuple[str, ...] = ("rates.",)) -> dict[str, Any]:
+        """Stats of every metric starting with one of *prefixes*.
+
+        Returns:
+            collector -> port -> metric -> stats dict (without percentiles
+            other than p95, to keep the payload small).
+        """
+        with self._lock:
+            targets = [
+                (c, p, m) for (c, p), g in self._groups.items()
+                for m in g.rows if m.startswith(prefixes)
+            ]
+        result: dict[str, Any] = {}
+        for collector, port, metric in targets:
+            st = self.stats(collector, port, metric, window, now, percentiles=(95,))
+            if st["samples"]:
+                result.setdefault(collector, {}).setdefault(port, {})[metric] = st
+        return result
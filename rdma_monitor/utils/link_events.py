@@ -0,0 +1,379 @@
+"""Event-driven link state tracking.
+
+Polling ``state`` once per interval misses a port that goes down and comes
+back between two polls, and only dates the flaps it does see to the
+nearest poll.  :class:`LinkEventListener` follows link state on a
+background thread instead:
+
+* rtnetlink ``RTNLGRP_LINK`` notifications for RoCE ports, whose link is
+  their netdev,
+* kernel uevents of the ``infiniband`` subsystem, on which every port is
+  re-read from sysfs,
+* a short sysfs poll as a safety net for ports rtnetlink does not cover.
+
+Each port follows one state only, whatever the source: the netdev
+``operstate`` for RoCE ports, the IB port ``state`` for InfiniBand ports.
+An IPoIB netdev is not followed, since it can be down on an active IB link.
+
+Every transition is stored with a monotonic timestamp in a bounded event
+buffer, from which exact flap counts and durations are derived.  The same
+rtnetlink socket also counts IP address changes (``RTM_NEWADDR`` /
+``RTM_DELADDR``), which is when RoCE GID tables change.
+"""
+
+import logging
+import select
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable
+
+from rdma_monitor.utils.counter_reader import port_dir
+from rdma_monitor.utils.network_detector import NetworkType, RDMADevice
+from rdma_monitor.utils.rdma_netlink import iter_attrs, iter_messages
+
+logger = logging.getLogger(__name__)
+
+NETLINK_KOBJECT_UEVENT = 15
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+UEVENT_KERNEL_GROUP = 0x1
+
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+
+# struct ifinfomsg
+_IFINFOMSG = struct.Struct("=BxHiII")
+
+IFLA_IFNAME = 3
+IFLA_OPERSTATE = 16
+IF_OPER_UNKNOWN = 0
+IF_OPER_UP = 6
+IFF_RUNNING = 0x40
+
+_RECV_SIZE = 65536
+
+STATE_UP = "up"
+STATE_DOWN = "down"
+
+
+@dataclass
+class LinkEvent:
+    """One observed state transition of a port."""
+    ts: float          # time.monotonic()
+    port: str          # "<dev>/<port>"
+    old: str
+    new: str
+    source: str        # "rtnetlink", "uevent" or "poll"
+
+
+@dataclass
+class _PortState:
+    state: str = ""
+    since: float = 0.0
+    flaps: int = 0
+    # Time of the observed up->down transition; None while up, and for a
+    # port already down when first seen (its outage start is unknown)
+    down_at: float | None = None
+    last_flap_at: float | None = None
+    last_flap_duration: float | None = None
+    total_down: float = 0.0
+
+
+def parse_link_messages(data: bytes) -> list[tuple[str, str]]:
+    """Decode RTM_NEWLINK/RTM_DELLINK notifications.
+
+    Returns:
+        ``(ifname, "up" | "down")`` per link message; a deleted link is
+        reported as down.
+    """
+    result: list[tuple[str, str]] = []
+    for mtype, _flags, body, end in iter_messages(data):
+        if mtype not in (RTM_NEWLINK, RTM_DELLINK) or body + _IFINFOMSG.size > end:
+            continue
+        _family, _type, _index, ifflags, _change = _IFINFOMSG.unpack_from(data, body)
+        name = ""
+        operstate = IF_OPER_UNKNOWN
+        for rta_type, payload in iter_attrs(data, body + _IFINFOMSG.size, end):
+            if rta_type == IFLA_IFNAME:
+                name = payload.split(b"\0", 1)[0].decode(errors="replace")
+            elif rta_type == IFLA_OPERSTATE and payload:
+                operstate = payload[0]
+        if name:
+            if mtype == RTM_DELLINK:
+                up = False
+            elif operstate == IF_OPER_UNKNOWN:
+                up = bool(ifflags & IFF_RUNNING)
+            else:
+                up = operstate == IF_OPER_UP
+            result.append((name, STATE_UP if up else STATE_DOWN))
+    return result
+
+
+def count_addr_messages(data: bytes) -> int:
+    """Number of RTM_NEWADDR/RTM_DELADDR messages in a datagram."""
+    return sum(1 for mtype, _flags, _body, _end in iter_messages(data)
+               if mtype in (RTM_NEWADDR, RTM_DELADDR))
+
+
+def parse_uevent(data: bytes) -> dict[str, str]:
+    """Decode a kernel uevent (``action@devpath\\0KEY=VALUE\\0...``)."""
+    env: dict[str, str] = {}
+    for field in data.split(b"\0")[1:]:
+        key, sep, value = field.partition(b"=")
+        if sep:
+            env[key.decode(errors="replace")] = value.decode(errors="replace")
+    return env
+
+
+def _ib_state(text: str) -> str:
+    """Map a sysfs port ``state`` ("4: ACTIVE") to up/down."""
+    return STATE_UP if "ACTIVE" in text.upper() else STATE_DOWN
+
+
+def _netdev_state(netdev: str) -> str | None:
+    """Up/down of *netdev* from sysfs, decided as for RTM_NEWLINK."""
+    base = f"/sys/class/net/{netdev}"
+    try:
+        with open(f"{base}/operstate") as fh:
+            operstate = fh.read().strip()
+    except OSError:
+        return None
+    if operstate != "unknown":
+        return STATE_UP if operstate == "up" else STATE_DOWN
+    # No operstate reported by the driver: fall back to the carrier
+    # (IFF_RUNNING); reading it fails while the netdev is admin-down
+    try:
+        with open(f"{base}/carrier") as fh:
+            return STATE_UP if fh.read().strip() == "1" else STATE_DOWN
+    except OSError:
+        return STATE_DOWN
+
+
+class LinkEventListener:
+    """Background link-state follower with a monotonic event buffer.
+
+    Args:
+        devices: Ports to follow.
+        on_change: Called from the listener thread with the
+                   :class:`LinkEvent` of every transition.
+        poll_interval: Period of the sysfs safety-net poll in seconds.
+        buffer_size: Number of events kept.
+    """
+
+    def __init__(self, devices: list[RDMADevice],
+                 on_change: Callable[[LinkEvent], None] | None = None,
+                 poll_interval: float = 1.0, buffer_size: int = 1024):
+        self.on_change = on_change
+        self.poll_interval = max(poll_interval, 0.05)
+        self._ports = {f"{d.name}/{d.port}": d for d in devices}
+        # Ports followed by netdev operstate (rtnetlink and sysfs alike)
+        self._by_netdev = {
+            d.netdev: f"{d.name}/{d.port}" for d in devices
+            if d.netdev and d.net_type == NetworkType.ROCE
+        }
+        self._events: deque[LinkEvent] = deque(maxlen=buffer_size)
+        self._state: dict[str, _PortState] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._rtnl: socket.socket | None = None
+        self._uevent: socket.socket | None = None
+        self._addr_seq = 0
+
+    # ------------------------------------------------------------------
+    # Sources
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _open(proto: int, groups: int) -> socket.socket | None:
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, proto)
+            sock.bind((0, groups))
+            sock.setblocking(False)
+            return sock
+        except (OSError, AttributeError) as exc:
+            logger.debug("Netlink protocol %d unavailable: %s", proto, exc)
+            return None
+
+    def _read_sysfs(self, key: str) -> str | None:
+        dev = self._ports[key]
+        if self._by_netdev.get(dev.netdev) == key:
+            return _netdev_state(dev.netdev)
+        try:
+            with open(f"{port_dir(dev.name, dev.port)}/state") as fh:
+                return _ib_state(fh.read())
+        except OSError:
+            return None
+
+    def _poll_keys(self) -> list[str]:
+        """Ports not covered by rtnetlink notifications."""
+        if self._rtnl is None:
+            return list(self._ports)
+        return [k for k, d in self._ports.items() if self._by_netdev.get(d.netdev) != k]
+
+    def _poll(self, keys: list[str], source: str) -> None:
+        for key in keys:
+            state = self._read_sysfs(key)
+            if state is not None:
+                self.record(key, state, time.monotonic(), source)
+
+    def _drain(self, sock: socket.socket) -> list[bytes]:
+        datagrams: list[bytes] = []
+        while True:
+            try:
+                datagrams.append(sock.recv(_RECV_SIZE))
+            except BlockingIOError:
+                return datagrams
+            except OSError as exc:
+                # ENOBUFS: notifications were dropped; resync from sysfs
+                # and assume addresses changed too
+                logger.debug("Netlink receive error: %s", exc)
+                self._poll(list(self._ports), "poll")
+                self._addr_seq += 1
+                return datagrams
+
+    def _run(self) -> None:
+        self._poll(list(self._ports), "poll")
+        next_poll = time.monotonic() + self.poll_interval
+        socks = [s for s in (self._rtnl, self._uevent) if s is not None]
+        poll_keys = self._poll_keys()
+        while not self._stop.is_set():
+            timeout = max(0.0, next_poll - time.monotonic())
+            readable: list[socket.socket] = []
+            if socks:
+                try:
+                    readable = select.select(socks, [], [], timeout)[0]
+                except (OSError, ValueError):
+                    break
+            else:
+                self._stop.wait(timeout)
+            for sock in readable:
+                for data in self._drain(sock):
+                    now = time.monotonic()
+                    if sock is self._rtnl:
+                        for ifname, state in parse_link_messages(data):
+                            key = self._by_netdev.get(ifname)
+                            if key is not None:
+                                self.record(key, state, now, "rtnetlink")
+                        self._addr_seq += count_addr_messages(data)
+                    elif parse_uevent(data).get("SUBSYSTEM") == "infiniband":
+                        self._poll(list(self._ports), "uevent")
+            if time.monotonic() >= next_poll:
+                self._poll(poll_keys, "poll")
+                next_poll = time.monotonic() + self.poll_interval
+
+    # ------------------------------------------------------------------
+    # Public interface
+    # ------------------------------------------------------------------
+
+    def record(self, port: str, state: str, ts: float, source: str) -> None:
+        """Register the observed *state* of *port*; no-op if unchanged."""
+        with self._lock:
+            st = self._state.get(port)
+            if st is None:
+                self._state[port] = _PortState(state=state, since=ts)
+                return
+            if st.state == state:
+                return
+            event = LinkEvent(ts, port, st.state, state, source)
+            self._events.append(event)
+            if state == STATE_DOWN:
+                st.flaps += 1
+                st.down_at = ts
+                st.last_flap_at = ts
+            elif st.down_at is not None:
+                st.last_flap_duration = ts - st.down_at
+                st.total_down += ts - st.down_at
+                st.down_at = None
+            st.state = state
+            st.since = ts
+        if self.on_change is not None:
+            try:
+                self.on_change(event)
+            except Exception:
+                logger.exception("Link change callback failed")
+
+    def events(self, port: str | None = None, since: float = 0.0) -> list[LinkEvent]:
+        """Buffered transitions (of one port) at or after monotonic *since*."""
+        with self._lock:
+            return [e for e in self._events
+                    if e.ts >= since and (port is None or e.port == port)]
+
+    def port_summary(self, port: str, now: float | None = None) -> dict | None:
+        """Flap statistics of *port*, or None if it has not been seen yet.
+
+        ``flap_count`` counts up->down transitions since the listener
+        started; durations are seconds from going down to coming back up.
+        A port that was already down when first seen does not count until
+        it goes down again.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            st = self._state.get(port)
+            if st is None:
+                return None
+            down = now - st.down_at if st.down_at is not None else 0.0
+            summary = {
+                "state": st.state,
+                "state_age_s": round(now - st.since, 3),
+                "flap_count": st.flaps,
+                "total_down_s": round(st.total_down + down, 3),
+            }
+            if st.last_flap_at is not None:
+                summary["time_since_last_flap_s"] = round(now - st.last_flap_at, 3)
+            if st.last_flap_duration is not None:
+                summary["last_flap_duration_s"] = round(st.last_flap_duration, 3)
+            return summary
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    @property
+    def watches_addresses(self) -> bool:
+        """True if address changes are being followed over rtnetlink."""
+        return self._rtnl is not None and self._thread is not None
+
+    @property
+    def address_seq(self) -> int:
+        """Counter bumped on every IP address change on any interface.
+
+        Addresses on VLAN or macvlan uppers add GIDs to the lower RDMA
+        port too, so changes are counted host-wide.
+        """
+        return self._addr_seq
+
+    def start(self) -> None:
+        if self._thread is not None or not self._ports:
+            return
+        if self._by_netdev:
+            self._rtnl = self._open(
+                socket.NETLINK_ROUTE,
+                RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR,
+            )
+        self._uevent = self._open(NETLINK_KOBJECT_UEVENT, UEVENT_KERNEL_GROUP)
+        self._thread = threading.Thread(
+            target=self._run, name="rdma-link-events", daemon=True
+        )
+        self._thread.start()
+        logger.info("Link event listener started (rtnetlink=%s, uevent=%s, "
+                    "poll=%.2fs for %d port(s))",
+                    self._rtnl is not None, self._uevent is not None,
+                    self.poll_interval, len(self._poll_keys()))
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        for sock in (self._rtnl, self._uevent):
+            if sock is not None:
+                sock.close()
+        self._rtnl = self._uevent = None
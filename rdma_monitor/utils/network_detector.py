@@ -8,6 +8,8 @@ from enum import Enum
 from pathlib import Path
 from typing import Optional
 
+from rdma_monitor.utils import rdma_netlink
+
 logger = logging.getLogger(__name__)
 
 
@@ -100,10 +102,21 @@ def _parse_ibstat_device(device_name: str, port: int) -> dict:
     return info
 
 
-def _get_netdev_for_rdma(device_name: str, port: int) -> str:
-    """Map an RDMA device/port to its Linux netdev name."""
-    # Try rdma link show
-    output = _run(["rdma", "link", "show"])
+def _get_netdev_for_rdma(device_name: str, port: int,
+                         links: list[rdma_netlink.NldevPort] | None = None) -> str:
+    """Map an RDMA device/port to its Linux netdev name.
+
+    *links* is an RDMA netlink port dump; when given, it is consulted
+    before falling back to ``rdma link show`` and sysfs.
+    """
+    for link in links or ():
+        if link.dev_name == device_name and link.port == port and link.netdev:
+            return link.netdev
+    if links:
+        output = ""
+    else:
+        # Try rdma link show
+        output = _run(["rdma", "link", "show"])
     if output:
         for line in output.splitlines():
             # e.g. "link mlx5_0/1 state ACTIVE physical_state LINK_UP netdev ib0"
@@ -147,6 +160,13 @@ def discover_devices(force_mode: str = "auto",
         if output:
             dev_names = [n.strip() for n in output.splitlines() if n.strip()]
 
+    # One netlink dump serves the device-name fallback and the netdev
+    # mapping of every port.
+    links = rdma_netlink.query("ports")
+
+    if not dev_names and links:
+        dev_names = sorted({link.dev_name for link in links})
+
     if not dev_names:
         # Final fallback: rdma link show
         output = _run(["rdma", "link", "show"])
@@ -180,7 +200,7 @@ def discover_devices(force_mode: str = "auto",
                     net_type = _detect_type_from_ibstat(dname)
 
             ibinfo = _parse_ibstat_device(dname, port)
-            netdev = _get_netdev_for_rdma(dname, port)
+            netdev = _get_netdev_for_rdma(dname, port, links)
 
             dev = RDMADevice(
                 name=dname,
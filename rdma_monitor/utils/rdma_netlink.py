@@ -0,0 +1,413 @@
+"""Minimal RDMA netlink (NETLINK_RDMA / RDMA_NL_NLDEV) client.
+
+Returns the device, port/link, netdev-mapping and system-mode data that
+``rdma dev show``, ``rdma link show`` and ``rdma system show`` print, as
+structured objects and in one netlink dump per query instead of one
+process spawn per command.
+
+Message parsing (:func:`parse_messages`) works on raw bytes, so it can be
+exercised against recorded netlink replies; the socket side is isolated in
+:class:`NldevClient` behind a replaceable ``transport`` callable.  The
+message and attribute walks (:func:`iter_messages`, :func:`iter_attrs`)
+are generic netlink and shared with the rtnetlink decoding in
+:mod:`rdma_monitor.utils.link_events`.
+"""
+
+import errno
+import logging
+import os
+import socket
+import struct
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+NETLINK_RDMA = 20
+RDMA_NL_NLDEV = 5
+
+# struct nlmsghdr
+_NLMSG_HDR = struct.Struct("=IHHII")
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_MULTI = 0x2
+NLM_F_DUMP = 0x300
+
+# struct nlattr
+_NLA_HDR = struct.Struct("=HH")
+NLA_TYPE_MASK = 0x3FFF
+
+# enum rdma_nldev_command
+RDMA_NLDEV_CMD_GET = 1
+RDMA_NLDEV_CMD_PORT_GET = 5
+RDMA_NLDEV_CMD_SYS_GET = 6
+
+# enum rdma_nldev_attr (subset)
+RDMA_NLDEV_ATTR_DEV_INDEX = 1
+RDMA_NLDEV_ATTR_DEV_NAME = 2
+RDMA_NLDEV_ATTR_PORT_INDEX = 3
+RDMA_NLDEV_ATTR_CAP_FLAGS = 4
+RDMA_NLDEV_ATTR_FW_VERSION = 5
+RDMA_NLDEV_ATTR_NODE_GUID = 6
+RDMA_NLDEV_ATTR_SYS_IMAGE_GUID = 7
+RDMA_NLDEV_ATTR_SUBNET_PREFIX = 8
+RDMA_NLDEV_ATTR_LID = 9
+RDMA_NLDEV_ATTR_SM_LID = 10
+RDMA_NLDEV_ATTR_LMC = 11
+RDMA_NLDEV_ATTR_PORT_STATE = 12
+RDMA_NLDEV_ATTR_PORT_PHYS_STATE = 13
+RDMA_NLDEV_ATTR_DEV_NODE_TYPE = 14
+RDMA_NLDEV_ATTR_NDEV_INDEX = 50
+RDMA_NLDEV_ATTR_NDEV_NAME = 51
+RDMA_NLDEV_ATTR_LINK_TYPE = 65
+RDMA_NLDEV_SYS_ATTR_NETNS_MODE = 66
+RDMA_NLDEV_ATTR_DEV_PROTOCOL = 67
+RDMA_NLDEV_SYS_ATTR_COPY_ON_FORK = 93
+
+
+def _u8(b: bytes) -> int:
+    return b[0]
+
+
+def _u32(b: bytes) -> int:
+    return struct.unpack_from("=I", b)[0]
+
+
+def _u64(b: bytes) -> int:
+    return struct.unpack_from("=Q", b)[0]
+
+
+def _str(b: bytes) -> str:
+    return bytes(b).split(b"\0", 1)[0].decode(errors="replace")
+
+
+_DECODERS: dict[int, Callable[[bytes], Any]] = {
+    RDMA_NLDEV_ATTR_DEV_INDEX: _u32,
+    RDMA_NLDEV_ATTR_DEV_NAME: _str,
+    RDMA_NLDEV_ATTR_PORT_INDEX: _u32,
+    RDMA_NLDEV_ATTR_CAP_FLAGS: _u64,
+    RDMA_NLDEV_ATTR_FW_VERSION: _str,
+    RDMA_NLDEV_ATTR_NODE_GUID: _u64,
+    RDMA_NLDEV_ATTR_SYS_IMAGE_GUID: _u64,
+    RDMA_NLDEV_ATTR_SUBNET_PREFIX: _u64,
+    RDMA_NLDEV_ATTR_LID: _u32,
+    RDMA_NLDEV_ATTR_SM_LID: _u32,
+    RDMA_NLDEV_ATTR_LMC: _u8,
+    RDMA_NLDEV_ATTR_PORT_STATE: _u8,
+    RDMA_NLDEV_ATTR_PORT_PHYS_STATE: _u8,
+    RDMA_NLDEV_ATTR_DEV_NODE_TYPE: _u8,
+    RDMA_NLDEV_ATTR_NDEV_INDEX: _u32,
+    RDMA_NLDEV_ATTR_NDEV_NAME: _str,
+    RDMA_NLDEV_ATTR_LINK_TYPE: _str,
+    RDMA_NLDEV_SYS_ATTR_NETNS_MODE: _u8,
+    RDMA_NLDEV_ATTR_DEV_PROTOCOL: _str,
+    RDMA_NLDEV_SYS_ATTR_COPY_ON_FORK: _u8,
+}
+
+# Names as printed by iproute2's ``rdma link show``
+PORT_STATES = {
+    0: "NOP", 1: "DOWN", 2: "INIT", 3: "ARMED", 4: "ACTIVE", 5: "ACTIVE_DEFER",
+}
+PHYS_STATES = {
+    1: "SLEEP", 2: "POLLING", 3: "DISABLED", 4: "PORT_CONFIGURATION_TRAINING",
+    5: "LINK_UP", 6: "LINK_ERROR_RECOVERY", 7: "PHY_TEST",
+}
+NODE_TYPES = {1: "ca", 2: "switch", 3: "router", 4: "rnic", 5: "usnic",
+              6: "usnic_udp", 7: "unspecified"}
+
+
+def _guid(value: int) -> str:
+    h = f"{value:016x}"
+    return ":".join(h[i:i + 4] for i in range(0, 16, 4))
+
+
+@dataclass
+class NldevDevice:
+    """One RDMA device, as in ``rdma dev show``."""
+    index: int
+    name: str
+    node_type: str = ""
+    fw_version: str = ""
+    node_guid: str = ""
+    sys_image_guid: str = ""
+    protocol: str = ""
+
+
+@dataclass
+class NldevPort:
+    """One RDMA port / link, as in ``rdma link show``."""
+    dev_index: int
+    dev_name: str
+    port: int
+    state: str = ""
+    phys_state: str = ""
+    netdev: str = ""
+    netdev_index: int = 0
+    lid: int | None = None
+    sm_lid: int | None = None
+    lmc: int | None = None
+    subnet_prefix: str = ""
+    cap_flags: int = 0
+
+    def link_line(self) -> str:
+        """Render the port the way ``rdma link show`` prints it."""
+        line = (f"link {self.dev_name}/{self.port} state {self.state} "
+                f"physical_state {self.phys_state}")
+        if self.netdev:
+            line += f" netdev {self.netdev}"
+        return line
+
+
+@dataclass
+class NldevSystem:
+    """Global RDMA subsystem settings, as in ``rdma system show``."""
+    netns_mode: str = ""
+    copy_on_fork: str = ""
+
+    def system_line(self) -> str:
+        """Render the settings the way ``rdma system show`` prints them."""
+        parts = []
+        if self.netns_mode:
+            parts.append(f"netns {self.netns_mode}")
+        if self.copy_on_fork:
+            parts.append(f"copy-on-fork {self.copy_on_fork}")
+        return " ".join(parts)
+
+
+# ----------------------------------------------------------------------
+# Wire format
+# ----------------------------------------------------------------------
+
+def nldev_type(cmd: int) -> int:
+    """Netlink message type for an NLDEV command (RDMA_NL_GET_TYPE)."""
+    return (RDMA_NL_NLDEV << 10) + cmd
+
+
+def build_request(cmd: int, seq: int, dump: bool) -> bytes:
+    """Build an attribute-less NLDEV request message."""
+    flags = NLM_F_REQUEST | (NLM_F_DUMP if dump else 0)
+    return _NLMSG_HDR.pack(_NLMSG_HDR.size, nldev_type(cmd), flags, seq, 0)
+
+
+def iter_messages(data: bytes) -> Iterator[tuple[int, int, int, int]]:
+    """Walk the netlink messages of a datagram.
+
+    Yields:
+        ``(msg_type, flags, body, end)`` per message, where
+        ``data[body:end]`` is the payload after the nlmsghdr.  A truncated
+        or malformed header ends the walk.
+    """
+    offset = 0
+    while offset + _NLMSG_HDR.size <= len(data):
+        length, mtype, flags, _seq, _pid = _NLMSG_HDR.unpack_from(data, offset)
+        if length < _NLMSG_HDR.size:
+            return
+        yield mtype, flags, offset + _NLMSG_HDR.size, min(offset + length, len(data))
+        offset += (length + 3) & ~3
+
+
+def iter_attrs(buf: bytes, offset: int, end: int) -> Iterator[tuple[int, bytes]]:
+    """Walk the netlink attributes (nlattr / rtattr) in ``buf[offset:end]``.
+
+    Yields:
+        ``(type, payload)`` per attribute, with the nested/byte-order flag
+        bits masked off the type.
+    """
+    while offset + _NLA_HDR.size <= end:
+        nla_len, nla_type = _NLA_HDR.unpack_from(buf, offset)
+        if nla_len < _NLA_HDR.size:
+            return
+        yield nla_type & NLA_TYPE_MASK, buf[offset + _NLA_HDR.size:offset + nla_len]
+        offset += (nla_len + 3) & ~3
+
+
+def parse_attrs(buf: bytes, offset: int, end: int) -> dict[int, Any]:
+    """Decode the netlink attributes in ``buf[offset:end]``.
+
+    Attributes without a known decoder are kept as raw bytes.
+    """
+    attrs: dict[int, Any] = {}
+    for atype, payload in iter_attrs(buf, offset, end):
+        decoder = _DECODERS.get(atype)
+        try:
+            attrs[atype] = decoder(payload) if decoder else bytes(payload)
+        except (struct.error, IndexError):
+            pass
+    return attrs
+
+
+def parse_messages(data: bytes) -> tuple[list[tuple[int, dict[int, Any]]], bool]:
+    """Split a netlink datagram into ``(msg_type, attrs)`` pairs.
+
+    Returns:
+        (messages, done) where *done* is True once NLMSG_DONE (or a
+        non-multipart reply) has been seen.
+
+    Raises:
+        OSError: if the kernel replied with an NLMSG_ERROR carrying a
+                 non-zero error code.
+    """
+    messages: list[tuple[int, dict[int, Any]]] = []
+    done = False
+    for mtype, flags, body, end in iter_messages(data):
+        if mtype == NLMSG_DONE:
+            done = True
+        elif mtype == NLMSG_ERROR:
+            err = struct.unpack_from("=i", data, body)[0]
+            if err:
+                raise OSError(-err, os.strerror(-err))
+            done = True
+        else:
+            messages.append((mtype, parse_attrs(data, body, end)))
+            if not flags & NLM_F_MULTI:
+                done = True
+    return messages, done
+
+
+def device_from_attrs(attrs: dict[int, Any]) -> NldevDevice:
+    return NldevDevice(
+        index=attrs.get(RDMA_NLDEV_ATTR_DEV_INDEX, 0),
+        name=attrs.get(RDMA_NLDEV_ATTR_DEV_NAME, ""),
+        node_type=NODE_TYPES.get(attrs.get(RDMA_NLDEV_ATTR_DEV_NODE_TYPE, 0), ""),
+        fw_version=attrs.get(RDMA_NLDEV_ATTR_FW_VERSION, ""),
+        node_guid=(_guid(attrs[RDMA_NLDEV_ATTR_NODE_GUID])
+                   if RDMA_NLDEV_ATTR_NODE_GUID in attrs else ""),
+        sys_image_guid=(_guid(attrs[RDMA_NLDEV_ATTR_SYS_IMAGE_GUID])
+                        if RDMA_NLDEV_ATTR_SYS_IMAGE_GUID in attrs else ""),
+        protocol=attrs.get(RDMA_NLDEV_ATTR_DEV_PROTOCOL, ""),
+    )
+
+
+def port_from_attrs(attrs: dict[int, Any]) -> NldevPort:
+    state = attrs.get(RDMA_NLDEV_ATTR_PORT_STATE)
+    phys = attrs.get(RDMA_NLDEV_ATTR_PORT_PHYS_STATE)
+    return NldevPort(
+        dev_index=attrs.get(RDMA_NLDEV_ATTR_DEV_INDEX, 0),
+        dev_name=attrs.get(RDMA_NLDEV_ATTR_DEV_NAME, ""),
+        port=attrs.get(RDMA_NLDEV_ATTR_PORT_INDEX, 0),
+        state=PORT_STATES.get(state, str(state)) if state is not None else "",
+        phys_state=PHYS_STATES.get(phys, str(phys)) if phys is not None else "",
+        netdev=attrs.get(RDMA_NLDEV_ATTR_NDEV_NAME, ""),
+        netdev_index=attrs.get(RDMA_NLDEV_ATTR_NDEV_INDEX, 0),
+        lid=attrs.get(RDMA_NLDEV_ATTR_LID),
+        sm_lid=attrs.get(RDMA_NLDEV_ATTR_SM_LID),
+        lmc=attrs.get(RDMA_NLDEV_ATTR_LMC),
+        subnet_prefix=(_guid(attrs[RDMA_NLDEV_ATTR_SUBNET_PREFIX])
+                       if RDMA_NLDEV_ATTR_SUBNET_PREFIX in attrs else ""),
+        cap_flags=attrs.get(RDMA_NLDEV_ATTR_CAP_FLAGS, 0),
+    )
+
+
+def system_from_attrs(attrs: dict[int, Any]) -> NldevSystem:
+    sysinfo = NldevSystem()
+    if RDMA_NLDEV_SYS_ATTR_NETNS_MODE in attrs:
+        sysinfo.netns_mode = ("shared" if attrs[RDMA_NLDEV_SYS_ATTR_NETNS_MODE]
+                              else "exclusive")
+    if RDMA_NLDEV_SYS_ATTR_COPY_ON_FORK in attrs:
+        sysinfo.copy_on_fork = ("on" if attrs[RDMA_NLDEV_SYS_ATTR_COPY_ON_FORK]
+                                else "off")
+    return sysinfo
+
+
+# ----------------------------------------------------------------------
+# Client
+# ----------------------------------------------------------------------
+
+Transport = Callable[[bytes], list[bytes]]
+
+
+class NldevClient:
+    """Queries the kernel RDMA subsystem over NETLINK_RDMA.
+
+    Args:
+        transport: Optional callable that sends one request and returns the
+                   reply datagrams; defaults to a real netlink socket.  Pass
+                   a function returning recorded datagrams to replay them.
+        timeout: Socket receive timeout in seconds.
+    """
+
+    def __init__(self, transport: Transport | None = None, timeout: float = 2.0):
+        self._transport = transport or self._socket_transport
+        self._timeout = timeout
+        self._sock: socket.socket | None = None
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _socket_transport(self, request: bytes) -> list[bytes]:
+        if self._sock is None:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_RDMA)
+            sock.settimeout(self._timeout)
+            sock.bind((0, 0))
+            self._sock = sock
+        self._sock.send(request)
+        replies: list[bytes] = []
+        while True:
+            data = self._sock.recv(65536)
+            replies.append(data)
+            _, done = parse_messages(data)
+            if done:
+                return replies
+
+    def _query(self, cmd: int, dump: bool) -> list[dict[int, Any]]:
+        with self._lock:
+            self._seq += 1
+            try:
+                replies = self._transport(build_request(cmd, self._seq, dump))
+            except OSError:
+                self.close()
+                raise
+        result: list[dict[int, Any]] = []
+        for data in replies:
+            messages, _ = parse_messages(data)
+            result.extend(attrs for _, attrs in messages)
+        return result
+
+    def devices(self) -> list[NldevDevice]:
+        """Dump every RDMA device (``rdma dev show``)."""
+        return [device_from_attrs(a) for a in self._query(RDMA_NLDEV_CMD_GET, True)]
+
+    def ports(self) -> list[NldevPort]:
+        """Dump every RDMA port with its netdev (``rdma link show``)."""
+        return [port_from_attrs(a)
+                for a in self._query(RDMA_NLDEV_CMD_PORT_GET, True)]
+
+    def system(self) -> NldevSystem:
+        """Read global subsystem settings (``rdma system show``)."""
+        replies = self._query(RDMA_NLDEV_CMD_SYS_GET, False)
+        return system_from_attrs(replies[0] if replies else {})
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+_shared_client: NldevClient | None = None
+_shared_lock = threading.Lock()
+_unavailable = False
+
+
+def query(method: str) -> Any | None:
+    """Run ``NldevClient.<method>()`` on a shared client.
+
+    Returns None when NETLINK_RDMA is not available on this host, so the
+    caller can fall back to the ``rdma`` CLI.  After the first failure to
+    open the socket the netlink path is not tried again.
+    """
+    global _shared_client, _unavailable
+    with _shared_lock:
+        if _unavailable:
+            return None
+        if _shared_client is None:
+            _shared_client = NldevClient()
+        client = _shared_client
+    try:
+        return getattr(client, method)()
+    except OSError as exc:
+        logger.debug("RDMA netlink %s failed: %s", method, exc)
+        if exc.errno in (errno.EPROTONOSUPPORT, errno.EAFNOSUPPORT):
+            with _shared_lock:
+                _unavailable = True
+        return None
@@ -0,0 +1,316 @@
+"""Embedded columnar time-series store for long per-port history.
+
+Each collector gets a directory under ``<snapshot_dir>/tsdb/`` with three
+tiers: ``raw`` samples, ``1m`` and ``1h`` rollups.  A tier is a
+fixed-capacity ring of rows kept in memory-mapped ``.npy`` files: one
+timestamp column shared by the collector's series, and one fixed-width
+column per (port, metric) -- a float per row for ``raw``, and
+``(min, max, mean, last, count)`` per row for the rollup tiers.  Tier
+sizes are therefore bounded by their capacity from the first write.
+
+Writes are append-only from the main loop: every recorded sample is
+written to ``raw`` and folded into the current minute bucket; a closed
+minute becomes a ``1m`` row and is folded into the current hour.  Buckets
+still open at shutdown are lost.  Reads return NumPy views of the mapped
+files (a copy only when the requested range wraps around the ring).
+"""
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from rdma_monitor.utils.history import iter_numeric
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("raw", "1m", "1h")
+DEFAULT_CAPACITIES = {"raw": 8640, "1m": 20160, "1h": 4320}
+ROLLUP_FIELDS = ("min", "max", "mean", "last", "count")
+# Bucket width (seconds) of each rollup tier and the tier it is built from
+_ROLLUPS = {"1m": (60.0, "raw"), "1h": (3600.0, "1m")}
+
+
+def _open_column(path: Path, shape: tuple[int, ...], valid: int,
+                 fresh: bool = False) -> np.memmap:
+    """Map *path*, creating it with NaN in the first *valid* rows.
+
+    An existing file is reused unless *fresh* is set or its shape differs.
+    """
+    if path.exists() and not fresh:
+        col = np.lib.format.open_memmap(path, mode="r+")
+        if col.shape == shape:
+            return col
+        logger.warning("Discarding %s: shape %s, expected %s", path, col.shape, shape)
+        del col
+    col = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=shape)
+    # Rows past *valid* are never read before being written
+    col[:valid] = np.nan
+    return col
+
+
+class _Tier:
+    """One ring of rows: a timestamp column plus one column per series."""
+
+    def __init__(self, path: Path, capacity: int, width: int):
+        path.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.capacity = capacity
+        self.width = width
+        self.head = np.lib.format.open_memmap(
+            path / "head.npy", mode="r+" if (path / "head.npy").exists() else "w+",
+            dtype=np.int64, shape=(1,),
+        )
+        ts_path = path / "ts.npy"
+        # Rows are only meaningful together: when the timestamp column does
+        # not match (capacity changed, file missing) the tier starts over,
+        # and every series column is recreated with it.
+        self.fresh = True
+        if ts_path.exists():
+            ts = np.lib.format.open_memmap(ts_path, mode="r+")
+            self.fresh = ts.shape != (capacity,)
+            del ts
+        if self.fresh:
+            if self.rows:
+                logger.warning("Resetting %s: capacity changed to %d", path, capacity)
+            self.head[0] = 0
+        self.ts = _open_column(ts_path, (capacity,), 0, fresh=self.fresh)
+        self.columns: list[np.memmap] = []
+
+    @property
+    def rows(self) -> int:
+        """Rows written in total (the ring keeps the last *capacity*)."""
+        return int(self.head[0])
+
+    def _shape(self) -> tuple[int, ...]:
+        return (self.capacity,) if self.width == 1 else (self.capacity, self.width)
+
+    def add_column(self, idx: int) -> None:
+        valid = min(self.rows, self.capacity)
+        self.columns.append(_open_column(self.path / f"c{idx}.npy", self._shape(), valid,
+                                         fresh=self.fresh))
+
+    def append(self, ts: float, values: np.ndarray) -> None:
+        """Append one row; *values* has one entry (or width-row) per column."""
+        pos = self.rows % self.capacity
+        for col, value in zip(self.columns, values):
+            col[pos] = value
+        self.ts[pos] = ts
+        self.head[0] += 1
+
+    def window(self, start: float, end: float) -> list[slice]:
+        """Ring slices holding ``start <= ts <= end``, oldest first."""
+        n = min(self.rows, self.capacity)
+        split = self.rows % self.capacity if self.rows > self.capacity else 0
+        parts = [slice(split, n), slice(0, split)] if split else [slice(0, n)]
+        out = []
+        for part in parts:
+            ts = self.ts[part]
+            lo = int(np.searchsorted(ts, start, side="left"))
+            hi = int(np.searchsorted(ts, end, side="right"))
+            if hi > lo:
+                out.append(slice(part.start + lo, part.start + hi))
+        return out
+
+    def flush(self) -> None:
+        for arr in (self.ts, self.head, *self.columns):
+            arr.flush()
+
+
+class _Bucket:
+    """Running min/max/sum/count/last per series for one open bucket."""
+
+    def __init__(self):
+        self.start: float | None = None
+        self.acc = self._empty(0)
+
+    @staticmethod
+    def _empty(n: int) -> np.ndarray:
+        acc = np.full((n, 5), np.nan)
+        acc[:, 2] = 0.0     # sum
+        acc[:, 4] = 0.0     # count
+        return acc
+
+    def resize(self, n: int) -> None:
+        acc = self._empty(n)
+        acc[:len(self.acc)] = self.acc
+        self.acc = acc
+
+    def reset(self, start: float) -> None:
+        self.start = start
+        self.acc = self._empty(len(self.acc))
+
+    def add(self, rows: np.ndarray) -> None:
+        """Fold ``(min, max, mean, last, count)`` rows into the bucket."""
+        have = rows[:, 4] > 0
+        acc = self.acc[have]
+        r = rows[have]
+        acc[:, 0] = np.fmin(acc[:, 0], r[:, 0])
+        acc[:, 1] = np.fmax(acc[:, 1], r[:, 1])
+        acc[:, 2] += r[:, 2] * r[:, 4]
+        acc[:, 3] = r[:, 3]
+        acc[:, 4] += r[:, 4]
+        self.acc[have] = acc
+
+    def rows(self) -> np.ndarray:
+        out = self.acc.copy()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[:, 2] = np.where(out[:, 4] > 0, out[:, 2] / out[:, 4], np.nan)
+        return out
+
+
+class _CollectorStore:
+    """All tiers and series of one collector."""
+
+    def __init__(self, path: Path, capacities: dict[str, int]):
+        self.path = path
+        path.mkdir(parents=True, exist_ok=True)
+        self.tiers = {
+            name: _Tier(path / name, capacities[name], 1 if name == "raw" else 5)
+            for name in TIERS
+        }
+        self.series: dict[tuple[str, str], int] = {}
+        self.buckets = {name: _Bucket() for name in _ROLLUPS}
+        series_file = path / "series.json"
+        if series_file.exists():
+            for port, metric in json.loads(series_file.read_text()):
+                self._add_series(port, metric)
+
+    def _add_series(self, port: str, metric: str) -> int:
+        idx = len(self.series)
+        self.series[(port, metric)] = idx
+        for tier in self.tiers.values():
+            tier.add_column(idx)
+        for bucket in self.buckets.values():
+            bucket.resize(idx + 1)
+        return idx
+
+    def _save_series(self) -> None:
+        tmp = self.path / ".series.json.tmp"
+        tmp.write_text(json.dumps([list(k) for k in self.series]))
+        os.replace(tmp, self.path / "series.json")
+
+    def append(self, ts: float, sample: dict[tuple[str, str], float]) -> None:
+        added = False
+        for key in sample:
+            if key not in self.series:
+                self._add_series(*key)
+                added = True
+        if added:
+            self._save_series()
+
+        values = np.full(len(self.series), np.nan)
+        for key, value in sample.items():
+            values[self.series[key]] = value
+        self.tiers["raw"].append(ts, values)
+
+        have = ~np.isnan(values)
+        rows = np.stack([values, values, values, values, have.astype(float)], axis=1)
+        self._roll("1m", ts, rows)
+
+    def _roll(self, tier: str, ts: float, rows: np.ndarray) -> None:
+        width, _ = _ROLLUPS[tier]
+        bucket = self.buckets[tier]
+        start = ts - ts % width
+        if bucket.start is not None and start != bucket.start:
+            closed = bucket.rows()
+            self.tiers[tier].append(bucket.start, closed)
+            if tier == "1m":
+                self._roll("1h", bucket.start, closed)
+            bucket.reset(start)
+        elif bucket.start is None:
+            bucket.reset(start)
+        bucket.add(rows)
+
+    def flush(self) -> None:
+        for tier in self.tiers.values():
+            tier.flush()
+
+
+class TimeSeriesStore:
+    """Per-collector columnar history with raw / 1 min / 1 h tiers.
+
+    Args:
+        root: Store directory (``<snapshot_dir>/tsdb``).
+        capacities: Rows kept per tier (``raw``, ``1m``, ``1h``).
+        exclude: Top-level per-device keys not recorded (e.g. the very wide
+                 ``ethtool_stats`` dict).
+    """
+
+    def __init__(self, root: str | Path, capacities: dict[str, int] | None = None,
+                 exclude: list[str] | None = None):
+        self.root = Path(root)
+        self.capacities = {**DEFAULT_CAPACITIES, **(capacities or {})}
+        self.exclude = set(exclude or [])
+        self._stores: dict[str, _CollectorStore] = {}
+        self._lock = threading.Lock()
+
+    def _store(self, collector: str, create: bool = True) -> _CollectorStore | None:
+        store = self._stores.get(collector)
+        if store is None:
+            path = self.root / collector
+            if not create and not path.is_dir():
+                return None
+            store = _CollectorStore(path, self.capacities)
+            self._stores[collector] = store
+        return store
+
+    def record(self, collector: str, data: dict[str, Any], ts: float) -> None:
+        """Append one collector result (its ``devices`` subtree) at *ts*."""
+        devices = data.get("devices")
+        if not isinstance(devices, dict):
+            return
+        sample: dict[tuple[str, str], float] = {}
+        for port, dev_data in devices.items():
+            if not isinstance(dev_data, dict):
+                continue
+            for metric, value in iter_numeric(
+                {k: v for k, v in dev_data.items() if k not in self.exclude}
+            ):
+                sample[(port, metric)] = value
+        if not sample:
+            return
+        with self._lock:
+            self._store(collector).append(ts, sample)
+
+    def series(self, collector: str) -> list[tuple[str, str]]:
+        """``(port, metric)`` pairs recorded for *collector*."""
+        with self._lock:
+            store = self._store(collector, create=False)
+            return list(store.series) if store else []
+
+    def read(self, collector: str, port: str, metric: str,
+             start: float = float("-inf"), end: float = float("inf"),
+             tier: str = "raw") -> tuple[np.ndarray, np.ndarray]:
+        """Timestamps and values of one series in ``[start, end]``.
+
+        ``raw`` values are 1-D; rollup tiers return ``(n, 5)`` rows of
+        :data:`ROLLUP_FIELDS`.  Both arrays are views into the mapped
+        files unless the range wraps around the ring.
+        """
+        if tier not in TIERS:
+            raise ValueError(f"Unknown tier: {tier}")
+        with self._lock:
+            store = self._store(collector, create=False)
+            idx = store.series.get((port, metric)) if store else None
+            if idx is None:
+                return np.empty(0), np.empty((0,) if tier == "raw" else (0, 5))
+            t = store.tiers[tier]
+            parts = t.window(start, end)
+            column = t.columns[idx]
+        if not parts:
+            return np.empty(0), column[:0]
+        if len(parts) == 1:
+            return t.ts[parts[0]], column[parts[0]]
+        return (np.concatenate([t.ts[p] for p in parts]),
+                np.concatenate([column[p] for p in parts]))
+
+    def flush(self) -> None:
+        """Write dirty pages of every mapped file back to disk."""
+        with self._lock:
+            for store in self._stores.values():
+                store.flush()